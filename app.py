@@ -1,18 +1,34 @@
+import time
+_started = time.perf_counter()
+
+import logging
+
+from dotenv import load_dotenv
+
+# Before the modules below read their settings from the environment
+load_dotenv(override=True)
+
 from tools import tools
 from state import State
-from nodes import generate_invoice_worker, attendance_worker, email_worker, route_task
+from nodes import generate_invoice_worker, attendance_worker, email_worker, route_task, workflow_stage, unified_worker
+from router import routing_mode
+from checkpointer import make_checkpointer
+from telemetry import configure_logging, start_metrics_server, logger, metrics
+from startup import check_budget
+from turn_telemetry import TurnTelemetry
+from tool_node import make_tool_node
 
-from langgraph.prebuilt import ToolNode
-from langgraph.checkpoint.memory import MemorySaver
+from langchain_core.messages import AIMessage, AIMessageChunk
 from langgraph.graph import StateGraph, START, END
-import gradio as gr
 
 
 def tools_or_next(state: State) -> str:
-    """If the last message has tool calls, route to the tools node. Otherwise, end."""
+    """If the last message has tool calls, route to the tools node. Otherwise, continue a planned workflow or end."""
     messages = state.get("messages", [])
     if messages and hasattr(messages[-1], "tool_calls") and messages[-1].tool_calls:
         return "tools"
+    if state.get("plan"):
+        return "workflow"
     return "END"
 
 # --- 3. Build The Graph ---
@@ -24,7 +40,9 @@ graph_builder.add_node("route_task", route_task)
 graph_builder.add_node("attendance_worker", attendance_worker)
 graph_builder.add_node("generate_invoice_worker", generate_invoice_worker)
 graph_builder.add_node("email_worker", email_worker)  # <-- ADDED
-graph_builder.add_node("tools", ToolNode(tools=tools))
+graph_builder.add_node("tools", make_tool_node(tools))
+graph_builder.add_node("workflow", workflow_stage)
+graph_builder.add_node("unified_worker", unified_worker)
 
 # 3b. Set the entry point
 graph_builder.set_entry_point("route_task")
@@ -39,19 +57,32 @@ graph_builder.add_conditional_edges(
         "attendance_worker": "attendance_worker",
         "generate_invoice_worker": "generate_invoice_worker",
         "email_worker": "email_worker",  # <-- ADDED
+        "workflow": "workflow",
+        "unified_worker": "unified_worker",
         "END": END,
     },
 )
 
-# Individual workers to tools or end
+# Individual workers to tools, the rest of a planned workflow, or end
+graph_builder.add_conditional_edges(
+    "attendance_worker", tools_or_next, {"tools": "tools", "workflow": "workflow", "END": END}
+)
 graph_builder.add_conditional_edges(
-    "attendance_worker", tools_or_next, {"tools": "tools", "END": END}
+    "generate_invoice_worker", tools_or_next, {"tools": "tools", "workflow": "workflow", "END": END}
 )
 graph_builder.add_conditional_edges(
-    "generate_invoice_worker", tools_or_next, {"tools": "tools", "END": END}
+    "email_worker", tools_or_next, {"tools": "tools", "workflow": "workflow", "END": END} # <-- ADDED
 )
+# Single-call routing: its tools hand over to the worker it picked (see `next`)
 graph_builder.add_conditional_edges(
-    "email_worker", tools_or_next, {"tools": "tools", "END": END} # <-- ADDED
+    "unified_worker", tools_or_next, {"tools": "tools", "workflow": "workflow", "END": END}
+)
+
+# Compiled workflow stages to the next planned worker or end
+graph_builder.add_conditional_edges(
+    "workflow",
+    lambda s: s.get("next", "END"),
+    {"attendance_worker": "attendance_worker", "END": END},
 )
 
 # Tools node back to the correct worker
@@ -67,14 +98,93 @@ graph_builder.add_conditional_edges(
 )
 
 # --- 4. Compile the graph ---
-memory = MemorySaver()
+memory = make_checkpointer()
 graph = graph_builder.compile(checkpointer=memory)
 
-config = {"configurable": {"thread_id": "1"}}
+def session_config(request=None) -> dict:
+    """One conversation thread per browser session (`request` is Gradio's gr.Request)."""
+    thread_id = getattr(request, "session_hash", None) or "default"
+    return {"configurable": {"thread_id": thread_id}}
 
-async def chat(user_input: str, history):
-    result = await graph.ainvoke({"messages": [{"role": "user", "content": user_input}]}, config=config)
-    return result["messages"][-1].content
+# --- 5. Streaming chat handler ---
+
+WORKERS = {"attendance_worker", "generate_invoice_worker", "email_worker", "unified_worker"}
+
+TOOL_PROGRESS = {
+    "read_invoice_data": "Reading timesheet…",
+    "save_or_update_timesheet": "Updating timesheet…",
+    "save_or_update_timesheet_bulk": "Updating timesheet…",
+    "generate_invoice": "Writing invoice…",
+    "create_invoice_document": "Writing invoice…",
+    "send_email_with_attachments": "Queuing email…",
+    "check_email_status": "Checking email status…",
+    "get_leave_balance": "Checking leave balance…",
+}
+
+def render_progress(progress: list, answer: str) -> str:
+    lines = [f"_{step}_" for step in progress]
+    return "\n\n".join(lines + ([answer] if answer else []))
+
+async def chat(user_input: str, history, request=None):
+    """Streams tool progress and the worker's answer tokens as they arrive."""
+    progress, answer = [], ""
+    config = session_config(request)
+    thread_id = config["configurable"]["thread_id"]
+    turn = TurnTelemetry(thread_id, routing_mode=routing_mode(thread_id))
+    config["callbacks"] = [turn]
+    try:
+        async for mode, chunk in graph.astream(
+            {"messages": [{"role": "user", "content": user_input}]},
+            config=config,
+            stream_mode=["messages", "updates"],
+        ):
+            if mode == "messages":
+                message, metadata = chunk
+                # Only worker tokens are user-facing; the router's classification call is not.
+                if metadata.get("langgraph_node") in WORKERS and isinstance(message, AIMessageChunk) and message.content:
+                    answer += str(message.content)
+                    yield render_progress(progress, answer)
+                continue
+
+            for node, update in chunk.items():
+                for message in (update or {}).get("messages", []):
+                    if not isinstance(message, AIMessage):
+                        continue
+                    if message.tool_calls:
+                        # Any text streamed before a tool call was a preamble, not the answer.
+                        answer = ""
+                        for call in message.tool_calls:
+                            step = TOOL_PROGRESS.get(call["name"], f"Running {call['name']}…")
+                            if step not in progress:
+                                progress.append(step)
+                        yield render_progress(progress, answer)
+                    elif node == "workflow":
+                        # Compiled stages report after the worker that ran before them.
+                        answer = "\n\n".join(part for part in (answer, str(message.content)) if part)
+                        yield render_progress(progress, answer)
+                    elif node in WORKERS or node == "route_task":
+                        answer = str(message.content)
+                        yield render_progress(progress, answer)
+    finally:
+        turn.finish()
+
+    yield answer
 
 if __name__ == "__main__":
-    gr.ChatInterface(chat, type="messages").launch(server_name="0.0.0.0", server_port=7860)
+    configure_logging()
+    start_metrics_server()
+    # Resume email queued before the last shutdown without waiting for the next send.
+    from outbox import get_outbox
+    get_outbox()
+    startup = check_budget(_started, time.perf_counter())
+    metrics.observe("invoice_startup_seconds", startup["seconds"], "Import and graph build time before launch")
+    logger.log(logging.INFO if startup["within_budget"] else logging.WARNING, "startup", extra={"fields": startup})
+
+    # Only the UI needs gradio (and the pandas it imports), so `import app` stays light.
+    import gradio as gr
+
+    async def respond(user_input: str, history, request: gr.Request):
+        async for update in chat(user_input, history, request):
+            yield update
+
+    gr.ChatInterface(respond, type="messages").launch(server_name="0.0.0.0", server_port=7860)
@@ -0,0 +1,151 @@
+"""
+Headless month-end billing run.
+
+Computes and renders invoices for a set of employees and months across a
+process pool, without the graph or any LLM calls, and writes a JSON manifest
+of the produced files, timings and failures.
+
+    python batch.py --months july august --employees 50391 --workers 4
+"""
+import os
+import json
+import time
+import argparse
+import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from billing import DEFAULT_PROFILE, compute_invoice
+from timesheet_store import DEFAULT_EMPLOYEE, TimesheetStore
+from leave_ledger import LeaveLedger, month_of
+from invoice_template import get_invoice_template
+
+_stores = {}
+
+
+def _worker_store(db_path: str, data_dir: str, employee: str) -> TimesheetStore:
+    # One connection per employee per worker process, reused across jobs.
+    key = (db_path, data_dir, employee)
+    if key not in _stores:
+        _stores[key] = TimesheetStore(db_path, data_dir, employee=employee)
+    return _stores[key]
+
+
+def employee_data_dir(data_dir: str, employee: str) -> str:
+    """Workbooks of the default employee live in `data_dir`, everyone else's in `data_dir/<employee>`."""
+    return data_dir if employee == DEFAULT_EMPLOYEE else os.path.join(data_dir, employee)
+
+
+def invoice_job(job: dict) -> dict:
+    """Computes and renders one invoice. Runs in a worker process; never raises."""
+    started = time.perf_counter()
+    result = {"employee": job["employee"], "month": job["month"], "file": None, "total": None, "error": None}
+    try:
+        store = _worker_store(job["db_path"], job["data_dir"], job["employee"])
+        rows = store.read(f"timesheet_{job['month']}.xlsx")
+        if not rows:
+            raise ValueError(f"no timesheet entries for {job['month']}")
+
+        data = compute_invoice(
+            rows,
+            carried_forward_leaves=job["carried_forward_leaves"],
+            invoice_date=datetime.date.fromisoformat(job["invoice_date"]),
+            profile=job["profile"],
+        )
+        get_invoice_template().render(data, job["output"])
+        result.update(file=job["output"], total=data["total"])
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["seconds"] = round(time.perf_counter() - started, 4)
+    return result
+
+
+def plan_jobs(args) -> list:
+    profiles = {}
+    if args.profiles:
+        with open(args.profiles) as f:
+            profiles = json.load(f)
+
+    several = len(args.employees) > 1
+    jobs = []
+    for employee in args.employees:
+        profile = {**DEFAULT_PROFILE, "employee_number": employee, **profiles.get(employee, {})}
+        for month in (m.lower() for m in args.months):
+            name = f"invoice_{employee}_{month}.docx" if several else f"invoice_{month}.docx"
+            jobs.append({
+                "employee": employee,
+                "month": month,
+                "profile": profile,
+                "carried_forward_leaves": args.carried_forward,
+                "invoice_date": args.invoice_date,
+                "db_path": args.db,
+                "data_dir": employee_data_dir(args.data_dir, employee),
+                "output": os.path.join(args.out_dir, name),
+            })
+    return jobs
+
+
+def run(args) -> dict:
+    os.makedirs(args.out_dir, exist_ok=True)
+    jobs = plan_jobs(args)
+
+    # Import any changed workbooks up front so the workers only read; the ledger
+    # supplies the carried-forward leaves unless --carried-forward is given.
+    for employee in args.employees:
+        store = TimesheetStore(args.db, employee_data_dir(args.data_dir, employee), employee=employee)
+        ledger = LeaveLedger(store)
+        for month in args.months:
+            store.sync(f"timesheet_{month.lower()}.xlsx")
+        for job in jobs:
+            if job["employee"] == employee and job["carried_forward_leaves"] is None:
+                period = month_of(store.read(f"timesheet_{job['month']}.xlsx"))
+                job["carried_forward_leaves"] = float(ledger.carried_forward(period)) if period else 0.0
+
+    started_at = datetime.datetime.now().isoformat(timespec="seconds")
+    started = time.perf_counter()
+    results = []
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = [pool.submit(invoice_job, job) for job in jobs]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            status = result["file"] if not result["error"] else f"FAILED ({result['error']})"
+            print(f"{result['employee']} {result['month']}: {status} [{result['seconds']}s]")
+
+    results.sort(key=lambda r: (r["employee"], r["month"]))
+    return {
+        "started_at": started_at,
+        "wall_seconds": round(time.perf_counter() - started, 4),
+        "workers": args.workers,
+        "produced": sum(1 for r in results if r["file"]),
+        "failed": sum(1 for r in results if r["error"]),
+        "jobs": results,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate invoices for many employees and months without the LLM.")
+    parser.add_argument("--months", nargs="+", required=True, help="Month names as used in timesheet_<month>.xlsx")
+    parser.add_argument("--employees", nargs="+", default=[DEFAULT_EMPLOYEE], help="Employee IDs in the timesheet store")
+    parser.add_argument("--profiles", help="JSON file mapping employee ID to name/department/bill_to overrides")
+    parser.add_argument("--carried-forward", type=float, help="Leaves carried into each month (default: from the leave ledger)")
+    parser.add_argument("--invoice-date", default=datetime.date.today().isoformat(), help="Date printed on the invoices")
+    parser.add_argument("--data-dir", default=os.getcwd(), help="Directory holding the timesheet workbooks")
+    parser.add_argument("--db", default=os.getenv("TIMESHEET_DB") or os.path.join(os.getcwd(), "timesheets.db"))
+    parser.add_argument("--out-dir", default=os.getcwd(), help="Where the .docx invoices are written")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Worker processes")
+    parser.add_argument("--manifest", default="invoice_manifest.json", help="Path of the JSON manifest")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    manifest = run(args)
+    with open(args.manifest, "w") as f:
+        json.dump(manifest, f, indent=2)
+    print(f"Produced {manifest['produced']} invoice(s), {manifest['failed']} failure(s) "
+          f"in {manifest['wall_seconds']}s. Manifest: {args.manifest}")
+    return 1 if manifest["failed"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,372 @@
+"""
+Microbenchmarks for the tools and the graph.
+
+Generates timesheets of 30, 1k and 100k rows in a scratch directory and times
+the tools against them, the email tool against a local mail stub, and full
+`graph.ainvoke` runs driven by a scripted fake chat model (no network, no API
+keys). Each benchmark reports wall time, peak traced allocations and the
+process' peak RSS, and is compared with the saved baselines.
+
+The committed bench_baseline.json holds the timings together with the machine
+they were taken on and the time of a fixed calibration workload. A comparison
+scales the baseline by how much faster or slower the calibration runs now, so
+it holds on other machines too, and notes when the machine differs.
+
+    python bench.py                        # run and compare with bench_baseline.json
+    python bench.py --save-baseline        # record a new baseline (commit it with the change)
+    python bench.py --sizes 30 1000        # skip the 100k-row sheet
+"""
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import asyncio
+import argparse
+import datetime
+import platform
+import tempfile
+import statistics
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+SIZES = [30, 1000, 100000]
+BASELINE = "bench_baseline.json"
+INVOICE = "invoice_bench.docx"
+STATUSES = ["P"] * 17 + ["L", "A", "HL"]
+
+
+def size_label(n: int) -> str:
+    return f"{n // 1000}k" if n >= 1000 and n % 1000 == 0 else str(n)
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere.
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def write_timesheet(path: str, rows: int, seed: int = 0) -> None:
+    """Writes a workbook of `rows` consecutive days with a realistic status mix."""
+    from openpyxl import Workbook
+
+    rng = random.Random(seed)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(["Date", "Status", "Remarks"])
+    day = datetime.date(2025, 7, 31) - datetime.timedelta(days=rows - 1)
+    for _ in range(rows):
+        status = rng.choice(STATUSES)
+        ws.append([day.isoformat(), status, "Worked on the invoice assistant" if status == "P" else "Leave"])
+        day += datetime.timedelta(days=1)
+    wb.save(path)
+
+
+def measure(name: str, fn, repeat: int, setup=None) -> dict:
+    """Times `repeat` calls of `fn`, then one more under tracemalloc for allocations."""
+    if setup is None:
+        # Lazy imports and one-time setup (e.g. compiling the invoice template) are not the steady state.
+        fn()
+    times = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - started) * 1000)
+
+    if setup:
+        setup()
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    result = {
+        "name": name,
+        "runs": repeat,
+        "wall_ms_min": round(min(times), 3),
+        "wall_ms_median": round(statistics.median(times), 3),
+        "alloc_peak_kb": round(peak / 1024, 1),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    print(f"{name:<56} {result['wall_ms_median']:>10.3f} ms  {result['alloc_peak_kb']:>10.1f} KiB  "
+          f"rss {result['peak_rss_mb']} MiB")
+    return result
+
+
+def calibrate(repeat: int = 5) -> float:
+    """Median ms of a fixed workload (hashing, sorting, JSON), a yardstick for this machine's speed."""
+    def workload():
+        rng = random.Random(0)
+        rows = [(rng.random(), hashlib.sha256(str(i).encode()).hexdigest()) for i in range(20000)]
+        rows.sort()
+        json.loads(json.dumps(rows))
+
+    workload()
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        workload()
+        times.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(times), 3)
+
+
+def machine() -> dict:
+    """What a baseline's timings depend on besides the code."""
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+
+# --- Scripted model for the graph runs ---
+
+def scripted_model(responses):
+    from langchain_core.language_models.fake_chat_models import FakeMessagesListChatModel
+
+    class ScriptedChatModel(FakeMessagesListChatModel):
+        """Replays predetermined messages (including tool calls); `bind_tools` is a no-op."""
+
+        def bind_tools(self, *args, **kwargs):
+            return self
+
+        def reset(self):
+            self.i = 0
+
+    return ScriptedChatModel(responses=responses)
+
+
+def sheet_for(rows: int) -> str:
+    return f"timesheet_bench_{size_label(rows)}.xlsx"
+
+
+def graph_script(sheet: str, date: str):
+    from langchain_core.messages import AIMessage
+
+    return [
+        AIMessage(content="", tool_calls=[
+            {"name": "read_invoice_data", "args": {"filename": sheet, "date": date}, "id": "call_read"},
+        ]),
+        AIMessage(content="", tool_calls=[
+            {"name": "save_or_update_timesheet",
+             "args": {"filename": sheet, "date": date, "status": "P", "remarks": "Benchmark"}, "id": "call_save"},
+        ]),
+        AIMessage(content=f"Done: {date} is marked P in {sheet}."),
+    ]
+
+
+# --- Benchmarks ---
+
+def bench_size(rows: int, repeat: int, worker_model, graph, loop) -> list:
+    import tools
+    from timesheet_store import get_store
+
+    label = size_label(rows)
+    sheet = sheet_for(rows)
+    path = os.path.abspath(sheet)
+    write_timesheet(path, rows)
+    results = []
+
+    def touch():
+        # A new mtime makes the store re-import the workbook, as after an edit in Excel.
+        stamp = os.path.getmtime(path) + 1
+        os.utime(path, (stamp, stamp))
+
+    # Imports are expensive at 100k rows; a couple of runs is enough to see a trend.
+    cold_repeat = min(repeat, 2) if rows >= 100000 else repeat
+    results.append(measure(f"read_invoice_data[{label}] cold", lambda: tools.read_invoice_data(sheet), cold_repeat, touch))
+
+    all_rows = get_store().read(sheet)
+    mid = all_rows[len(all_rows) // 2][0]
+    last = all_rows[-1][0]
+    results.append(measure(f"read_invoice_data[{label}] full", lambda: tools.read_invoice_data(sheet), repeat))
+    results.append(measure(f"read_invoice_data[{label}] date", lambda: tools.read_invoice_data(sheet, date=mid), repeat))
+    results.append(measure(f"read_invoice_data[{label}] summary", lambda: tools.read_invoice_data(sheet, summary=True), repeat))
+    results.append(measure(
+        f"save_or_update_timesheet[{label}]",
+        lambda: tools.save_or_update_timesheet(sheet, last, "P", "Benchmark"),
+        repeat,
+    ))
+    results.append(measure(
+        f"generate_invoice[{label}]",
+        lambda: tools.generate_invoice(sheet, INVOICE),
+        repeat,
+    ))
+
+    def mark_dirty():
+        tools.save_or_update_timesheet(sheet, last, "P", "Benchmark")
+
+    results.append(measure(
+        f"send_email_with_attachments[{label}] (export + enqueue)",
+        lambda: tools.send_email_with_attachments(sheet, INVOICE),
+        cold_repeat,
+        mark_dirty,
+    ))
+
+    async def turn(thread_id: str):
+        worker_model.reset()
+        return await graph.ainvoke(
+            {"messages": [{"role": "user", "content": f"mark {mid} as present in the timesheet"}]},
+            config={"configurable": {"thread_id": thread_id}},
+        )
+
+    worker_model.responses = graph_script(sheet, mid)
+    runs = iter(range(10 ** 9))
+    results.append(measure(
+        f"graph.ainvoke[{label}] read+save+answer",
+        lambda: loop.run_until_complete(turn(f"bench-{label}-{next(runs)}")),
+        repeat,
+    ))
+    return results
+
+
+def bench_invoice_document(repeat: int) -> dict:
+    import tools
+    from billing import compute_invoice
+
+    rows = [(f"2025-07-{d:02d}", "P" if d % 7 else "L", "") for d in range(1, 32)]
+    data = compute_invoice(rows)
+    return measure("create_invoice_document", lambda: tools.create_invoice_document(INVOICE, data), repeat)
+
+
+def bench_email_delivery(repeat: int) -> dict:
+    from outbox import get_outbox
+
+    outbox = get_outbox()
+
+    def send_and_wait():
+        outbox.enqueue(os.environ["FROM_EMAIL"], os.environ["TO_EMAIL"], "Bench", "Body", [INVOICE])
+        while outbox.pending():
+            time.sleep(0.001)
+
+    return measure("outbox delivery to local stub", send_and_wait, repeat)
+
+
+def run(args) -> list:
+    scratch = tempfile.mkdtemp(prefix="invoice_bench_")
+    os.chdir(scratch)
+    # Everything the tools touch lives in the scratch directory; no network, no caches from earlier runs.
+    os.environ.update({
+        "LLM_CACHE": "off",
+        "CHECKPOINTER": "memory",
+        "TIMESHEET_COMPACT_INTERVAL": "0",
+        "OUTBOX_DB": os.path.join(scratch, "outbox.db"),
+        "OUTBOX_RATE_PER_SEC": "0",
+        "SENDGRID_API_KEY": "bench",
+        "FROM_EMAIL": "bench@example.com",
+        "TO_EMAIL": "review@example.com",
+        "GOOGLE_API_KEY": os.getenv("GOOGLE_API_KEY") or "bench",
+    })
+    os.environ.pop("TIMESHEET_DB", None)
+    from outbox import LocalMailServer
+
+    with LocalMailServer() as server:
+        os.environ["MAIL_API_HOST"] = server.url
+
+        import llm
+        from langchain_core.messages import AIMessage
+
+        worker_model = scripted_model(graph_script(sheet_for(SIZES[0]), "2025-07-01"))
+        llm.llm_with_tools = worker_model
+        llm.llm = scripted_model([AIMessage(content="attendance")])
+        from app import graph
+
+        loop = asyncio.new_event_loop()
+        results = [bench_invoice_document(args.repeat)]
+        for rows in args.sizes:
+            results += bench_size(rows, args.repeat, worker_model, graph, loop)
+        results.append(bench_email_delivery(args.repeat))
+        loop.close()
+        print(f"Local mail stub received {len(server.received)} request(s).")
+    return results
+
+
+def compare(results: list, baseline: dict, tolerance: float, scale: float = 1.0, min_delta_ms: float = 0.5) -> list:
+    """
+    Returns the names of benchmarks whose median wall time regressed beyond `tolerance`.
+
+    Baseline medians are multiplied by `scale` (this machine's calibration time
+    over the baseline's) first. Slowdowns of less than `min_delta_ms` are
+    timer noise and never count.
+    """
+    regressions = []
+    for r in results:
+        base = baseline.get(r["name"])
+        if not base:
+            continue
+        expected = base["wall_ms_median"] * scale
+        ratio = r["wall_ms_median"] / expected if expected else 1.0
+        if ratio > 1 + tolerance and r["wall_ms_median"] - expected >= min_delta_ms:
+            regressions.append(r["name"])
+            print(f"REGRESSION {r['name']}: {expected:.3f} -> {r['wall_ms_median']} ms ({ratio:.2f}x)")
+    return regressions
+
+
+def load_baseline(path: str, calibration_ms: float):
+    """
+    Returns (benchmarks, scale) for comparing this run with the baseline at
+    `path`, or None when there is nothing comparable.
+    """
+    if not os.path.exists(path):
+        print("No baseline to compare with; run with --save-baseline to record one.")
+        return None
+    with open(path) as f:
+        baseline = json.load(f)
+    if not baseline.get("calibration_ms"):
+        print(f"{path} has no calibration time; run with --save-baseline to record it again.")
+        return None
+    if baseline.get("machine") != machine():
+        print(f"Baseline was recorded on another machine ({baseline.get('machine')}); "
+              "comparing against its timings scaled by the calibration workload.")
+    scale = calibration_ms / baseline["calibration_ms"]
+    print(f"Calibration: {calibration_ms} ms now, {baseline['calibration_ms']} ms in the baseline ({scale:.2f}x).")
+    return baseline["benchmarks"], scale
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the tools and the graph with a fake model.")
+    parser.add_argument("--sizes", nargs="+", type=int, default=SIZES, help="Timesheet sizes in rows")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per benchmark")
+    parser.add_argument("--baseline", default=os.path.abspath(BASELINE), help="Baseline JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help="Overwrite the baseline with this run")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="Allowed slowdown before a regression (0.5 = 50%%)")
+    parser.add_argument("--min-delta-ms", type=float, default=0.5, help="Slowdowns smaller than this are noise")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    calibration_ms = calibrate()
+    results = run(args)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump({
+                "machine": machine(),
+                "calibration_ms": calibration_ms,
+                "recorded_at": datetime.datetime.now().isoformat(timespec="seconds"),
+                "benchmarks": {r["name"]: r for r in results},
+            }, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    loaded = load_baseline(args.baseline, calibration_ms)
+    if loaded is None:
+        return 0
+    baseline, scale = loaded
+    return 1 if compare(results, baseline, args.tolerance, scale, args.min_delta_ms) else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
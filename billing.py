@@ -0,0 +1,184 @@
+from decimal import Decimal, ROUND_HALF_UP
+from collections import Counter
+from typing import Iterable, Optional, Sequence
+import datetime
+
+# --- Billing Constants ---
+
+PER_DAY_COST = Decimal("1036.8571")
+LEAVES_PER_MONTH = Decimal("2")
+
+# Status weights: how much of a day's cost is billed, and how much of a leave is used.
+BILLABLE_WEIGHTS = {"P": Decimal("1"), "HL": Decimal("0.5")}
+LEAVE_WEIGHTS = {"L": Decimal("1"), "A": Decimal("1"), "HL": Decimal("0.5")}
+
+DEFAULT_PROFILE = {
+    "name": "PRAVEN KUMAR D",
+    "employee_number": "50391",
+    "department": "R&D",
+    "bill_to": [
+        "PROD SOFTWARE INDIA PRIVATE LIMITED",
+        "Kalyani Platina, Ground Floor, Block I, No 24",
+        "EPIP Zone Phase II, Whitefield",
+        "Bangalore, Karnataka, 560 066",
+    ],
+}
+
+_ONES = [
+    "", "One", "Two", "Three", "Four", "Five", "Six", "Seven", "Eight", "Nine",
+    "Ten", "Eleven", "Twelve", "Thirteen", "Fourteen", "Fifteen", "Sixteen",
+    "Seventeen", "Eighteen", "Nineteen",
+]
+_TENS = ["", "", "Twenty", "Thirty", "Forty", "Fifty", "Sixty", "Seventy", "Eighty", "Ninety"]
+
+
+def _below_hundred(n: int) -> str:
+    if n < 20:
+        return _ONES[n]
+    return f"{_TENS[n // 10]} {_ONES[n % 10]}".strip()
+
+
+def _below_thousand(n: int) -> str:
+    hundreds, rest = divmod(n, 100)
+    parts = []
+    if hundreds:
+        parts.append(f"{_ONES[hundreds]} Hundred")
+    if rest:
+        parts.append(_below_hundred(rest))
+    return " ".join(parts)
+
+
+def number_to_words(n: int) -> str:
+    """Spells out a non-negative integer using the Indian system (thousand, lakh, crore)."""
+    if n == 0:
+        return "Zero"
+
+    crores, n = divmod(n, 10_000_000)
+    lakhs, n = divmod(n, 100_000)
+    thousands, n = divmod(n, 1_000)
+
+    parts = []
+    if crores:
+        parts.append(f"{number_to_words(crores)} Crore")
+    if lakhs:
+        parts.append(f"{_below_hundred(lakhs)} Lakh")
+    if thousands:
+        parts.append(f"{_below_hundred(thousands)} Thousand")
+    if n:
+        parts.append(_below_thousand(n))
+    return " ".join(parts)
+
+
+def amount_in_words(amount: Decimal) -> str:
+    """Returns e.g. 'Rs. Fourteen Thousand Five Hundred Sixteen Only'."""
+    amount = Decimal(amount).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+    rupees = int(amount)
+    paise = int((amount - rupees) * 100)
+    words = f"Rs. {number_to_words(rupees)}"
+    if paise:
+        words += f" and {_below_hundred(paise)} Paise"
+    return words + " Only"
+
+
+def format_inr(amount: Decimal) -> str:
+    """Formats a whole-rupee amount with Indian digit grouping, e.g. 1234567 -> '12,34,567'."""
+    digits = str(int(amount))
+    if len(digits) <= 3:
+        return digits
+    head, tail = digits[:-3], digits[-3:]
+    groups = []
+    while len(head) > 2:
+        groups.insert(0, head[-2:])
+        head = head[:-2]
+    if head:
+        groups.insert(0, head)
+    return ",".join(groups + [tail])
+
+
+def format_days(days: Decimal) -> str:
+    """Day counts without trailing zeros: '21', '1.5'."""
+    return format(days.normalize(), "f")
+
+
+def _normalize_status(status) -> Optional[str]:
+    if status is None:
+        return None
+    status = str(status).strip().upper()
+    if not status or status == "NAN":
+        return None
+    return status
+
+
+def parse_date(value) -> Optional[datetime.date]:
+    """A date from a date/datetime or a 'YYYY-MM-DD[ ...]' string; None if it is not one."""
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    try:
+        return datetime.date.fromisoformat(str(value).split(" ")[0])
+    except ValueError:
+        return None
+
+
+def invoice_period(rows: Iterable[Sequence], invoice_date: Optional[datetime.date] = None) -> str:
+    """The month billed for ('July 2025'): that of the earliest dated row, else that of `invoice_date` (today)."""
+    dates = [d for d in (parse_date(row[0]) for row in rows) if d]
+    period = min(dates) if dates else invoice_date or datetime.date.today()
+    return period.strftime("%B %Y")
+
+
+def count_statuses(rows: Iterable[Sequence]) -> Counter:
+    """Counts normalized statuses over (date, status, ...) rows. Blank statuses are skipped."""
+    counts = Counter()
+    for row in rows:
+        status = _normalize_status(row[1])
+        if status:
+            counts[status] += 1
+    return counts
+
+
+def compute_invoice(
+    rows: Iterable[Sequence],
+    carried_forward_leaves=0,
+    invoice_date: Optional[datetime.date] = None,
+    profile: Optional[dict] = None,
+    per_day_cost: Decimal = PER_DAY_COST,
+) -> dict:
+    """
+    Computes the invoice for one month of timesheet rows and returns the `data`
+    dictionary expected by `create_invoice_document`.
+
+    Rows are (date, status, remarks) sequences. 'P' days are billed in full,
+    'HL' days at half cost. 'L' and 'A' days use up leave ('HL' uses half a day);
+    2 leaves accrue per month on top of `carried_forward_leaves`.
+    """
+    rows = list(rows)
+    profile = {**DEFAULT_PROFILE, **(profile or {})}
+    invoice_date = invoice_date or datetime.date.today()
+
+    counts = count_statuses(rows)
+    working_days = sum((BILLABLE_WEIGHTS[s] * counts[s] for s in BILLABLE_WEIGHTS), Decimal(0))
+    leaves_taken = sum((LEAVE_WEIGHTS[s] * counts[s] for s in LEAVE_WEIGHTS), Decimal(0))
+    balance_leaves = Decimal(str(carried_forward_leaves)) + LEAVES_PER_MONTH - leaves_taken
+
+    total = (working_days * per_day_cost).quantize(Decimal("1"), rounding=ROUND_HALF_UP)
+
+    month_label = invoice_period(rows, invoice_date)
+
+    return {
+        "name": f"NAME: {profile['name']}",
+        "date": f"Date: {invoice_date.isoformat()}",
+        "bill_to": list(profile["bill_to"]),
+        "salary_description": f'Salary for the month of "{month_label}" payroll',
+        "details": [
+            f"Employee Number: {profile['employee_number']}",
+            f"Department: {profile['department']}",
+            f"Month: {month_label}",
+            f"Working Days: {format_days(working_days)}",
+            f"Cumulative Leaves Taken: {format_days(leaves_taken)} days",
+            f"Balance Leaves: {format_days(balance_leaves)} days",
+        ],
+        "total": f"{format_inr(total)}/-",
+        "total_words": amount_in_words(total),
+    }
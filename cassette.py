@@ -0,0 +1,465 @@
+"""
+Record/replay transport for the model clients.
+
+With `LLM_CASSETTE` set, llm.py builds its ChatOpenAI clients on top of a
+`CassetteTransport` (the httpx layer under the openai SDK), so the graph, the
+nodes and the tool node run unchanged:
+
+    LLM_CASSETTE=session.jsonl LLM_CASSETTE_MODE=record uv run app.py   # live; every call is saved
+    LLM_CASSETTE=session.jsonl uv run app.py                             # offline replay
+
+Each recorded request/response pair (tool calls included, API keys not) is one
+JSON line. Replays answer from the cassette with the recorded latency, a
+scaled or a fixed one (`LLM_CASSETTE_LATENCY`). Requests that are not in the
+cassette, e.g. because a prompt drifted, get the most similar recording
+(`LLM_CASSETTE_ON_MISS=error` fails them instead) and are listed with their
+first difference in `<cassette>.mismatches.json`.
+
+    python cassette.py replay session.jsonl --repeat 3   # re-run the recorded turns offline, timed
+    python cassette.py show session.jsonl
+"""
+import os
+import re
+import sys
+import json
+import time
+import atexit
+import shutil
+import asyncio
+import difflib
+import hashlib
+import argparse
+import tempfile
+import threading
+from collections import defaultdict
+from typing import List, Optional
+
+import httpx
+
+from telemetry import metrics, logger
+
+LLM_CASSETTE = os.getenv("LLM_CASSETTE")
+LLM_CASSETTE_MODE = os.getenv("LLM_CASSETTE_MODE", "replay").lower()
+# "recorded", "recorded*0.5" (scaled), or a fixed number of seconds.
+LLM_CASSETTE_LATENCY = os.getenv("LLM_CASSETTE_LATENCY", "recorded")
+LLM_CASSETTE_ON_MISS = os.getenv("LLM_CASSETTE_ON_MISS", "nearest").lower()
+
+# Prompt parts that change from run to run (the date, outbox job numbers) without changing the request.
+_MASKS = [
+    (re.compile(r"today's date is \d{4}-\d{2}-\d{2}"), "today's date is <date>"),
+    (re.compile(r"\bjob #\d+"), "job #<id>"),
+]
+_PASSED_HEADERS = {"content-type"}
+
+
+class CassetteMiss(httpx.TransportError):
+    """A replayed request has no recording (with LLM_CASSETTE_ON_MISS=error)."""
+
+
+def _mask(text: str) -> str:
+    for pattern, replacement in _MASKS:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+def _messages_text(body: dict) -> List[str]:
+    return [_mask(json.dumps(m, sort_keys=True, ensure_ascii=False)) for m in body.get("messages", [])]
+
+
+def request_key(body: dict) -> str:
+    """Hash of the request body with the day-to-day variations masked."""
+    return hashlib.sha256(_mask(json.dumps(body, sort_keys=True, ensure_ascii=False)).encode("utf-8")).hexdigest()
+
+
+def parse_latency(spec: str):
+    """Returns (scale of the recorded latency, fixed seconds); exactly one applies."""
+    spec = spec.strip().lower()
+    if spec.startswith("recorded"):
+        _, _, scale = spec.partition("*")
+        return float(scale or 1), None
+    return None, float(spec)
+
+
+def _first_difference(recorded: dict, actual: dict) -> dict:
+    old, new = _messages_text(recorded), _messages_text(actual)
+    for i in range(max(len(old), len(new))):
+        a = old[i] if i < len(old) else ""
+        b = new[i] if i < len(new) else ""
+        if a != b:
+            start = next((j for j, (x, y) in enumerate(zip(a, b)) if x != y), min(len(a), len(b)))
+            lo = max(0, start - 60)
+            return {"message": i, "recorded": a[lo:start + 120], "actual": b[lo:start + 120]}
+    return {"message": None, "recorded": "", "actual": "(same messages; other request fields differ)"}
+
+
+class _ReplayStream(httpx.AsyncByteStream, httpx.SyncByteStream):
+    """Replays a streamed (SSE) body event by event, spreading `spread` seconds over the events."""
+
+    def __init__(self, body: bytes, spread: float):
+        self.events = [e + b"\n\n" for e in body.split(b"\n\n") if e.strip()]
+        self.pause = spread / max(1, len(self.events))
+
+    def __iter__(self):
+        for event in self.events:
+            if self.pause:
+                time.sleep(self.pause)
+            yield event
+
+    async def __aiter__(self):
+        for event in self.events:
+            if self.pause:
+                await asyncio.sleep(self.pause)
+            yield event
+
+
+class CassetteTransport(httpx.BaseTransport, httpx.AsyncBaseTransport):
+    """
+    httpx transport that records model requests to a JSON-lines cassette, or
+    replays them from it. Repeated identical requests are answered with their
+    recordings in order (the last one is reused once they run out); a copy of
+    a request that is still being answered, such as a hedged duplicate, gets
+    the same recording instead of the next one.
+    """
+
+    def __init__(self, path: str, mode: str = LLM_CASSETTE_MODE, latency: str = LLM_CASSETTE_LATENCY,
+                 on_miss: str = LLM_CASSETTE_ON_MISS):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"LLM_CASSETTE_MODE must be 'record' or 'replay', not {mode!r}")
+        self.path = path
+        self.mode = mode
+        self.scale, self.fixed = parse_latency(latency)
+        self.on_miss = on_miss
+        self.mismatches: List[dict] = []
+        self._lock = threading.Lock()
+        self._sync = httpx.HTTPTransport() if mode == "record" else None
+        self._async = httpx.AsyncHTTPTransport() if mode == "record" else None
+        self.interactions = load(path) if mode == "replay" else []
+        self._by_key = defaultdict(list)
+        for interaction in self.interactions:
+            self._by_key[interaction["key"]].append(interaction)
+        self._served = defaultdict(int)
+        self._in_flight = defaultdict(int)
+
+    def rewind(self) -> None:
+        """Starts every request's sequence of recordings over, for the next run of a session."""
+        with self._lock:
+            self._served.clear()
+            self._in_flight.clear()
+
+    # --- Recording ---
+
+    def _save(self, request: httpx.Request, response: httpx.Response, body: bytes, ttfb: float, seconds: float) -> None:
+        payload = json.loads(request.content or b"{}")
+        interaction = {
+            "key": request_key(payload),
+            "model": payload.get("model"),
+            "stream": bool(payload.get("stream")),
+            "path": request.url.path,
+            "request": payload,
+            "response": {
+                "status": response.status_code,
+                "headers": {k: v for k, v in response.headers.items() if k.lower() in _PASSED_HEADERS},
+                "body": body.decode("utf-8"),
+            },
+            "ttfb": round(ttfb, 4),
+            "seconds": round(seconds, 4),
+            "recorded_at": time.time(),
+        }
+        with self._lock:
+            self.interactions.append(interaction)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(interaction, ensure_ascii=False) + "\n")
+        metrics.inc("invoice_cassette_requests_total", 1, "Model requests seen by the cassette", result="recorded")
+
+    def _recorded_response(self, response: httpx.Response, body: bytes) -> httpx.Response:
+        # The body is already decoded; drop the headers that described the wire format.
+        headers = [(k, v) for k, v in response.headers.items() if k.lower() not in ("content-encoding", "content-length", "transfer-encoding")]
+        return httpx.Response(response.status_code, headers=headers, content=body)
+
+    # --- Replay ---
+
+    def _lookup(self, request: httpx.Request):
+        """(key, recording) for the request; release the key with `_answered` once the response is out."""
+        payload = json.loads(request.content or b"{}")
+        key = request_key(payload)
+        with self._lock:
+            recorded = self._by_key.get(key)
+            if recorded:
+                if self._in_flight[key]:
+                    n = self._served[key] - 1
+                else:
+                    n = self._served[key]
+                    self._served[key] += 1
+                self._in_flight[key] += 1
+                metrics.inc("invoice_cassette_requests_total", 1, "Model requests seen by the cassette", result="hit")
+                return key, recorded[min(n, len(recorded) - 1)]
+
+            nearest, similarity = self._nearest(payload)
+            mismatch = {
+                "key": key,
+                "model": payload.get("model"),
+                "nearest": nearest["key"] if nearest else None,
+                "similarity": round(similarity, 3),
+                "difference": _first_difference(nearest["request"], payload) if nearest else None,
+            }
+            self.mismatches.append(mismatch)
+        metrics.inc("invoice_cassette_requests_total", 1, "Model requests seen by the cassette", result="miss")
+        logger.warning("cassette miss", extra={"fields": {k: mismatch[k] for k in ("key", "model", "nearest", "similarity")}})
+        if nearest is None or self.on_miss == "error":
+            raise CassetteMiss(f"No recording for request {key[:12]} ({payload.get('model')}) in {self.path}", request=request)
+        return None, nearest
+
+    def _answered(self, key: Optional[str]) -> None:
+        if key is not None:
+            with self._lock:
+                self._in_flight[key] -= 1
+
+    def _nearest(self, payload: dict):
+        """The recording for the same model, stream flag and tools whose messages are most alike."""
+        text = "\n".join(_messages_text(payload))
+        tools = sorted(t.get("function", {}).get("name", "") for t in payload.get("tools", []))
+        best, best_ratio = None, 0.0
+        for interaction in self.interactions:
+            recorded = interaction["request"]
+            if (recorded.get("model"), bool(recorded.get("stream"))) != (payload.get("model"), bool(payload.get("stream"))):
+                continue
+            if sorted(t.get("function", {}).get("name", "") for t in recorded.get("tools", [])) != tools:
+                continue
+            matcher = difflib.SequenceMatcher(None, "\n".join(_messages_text(recorded)), text, autojunk=False)
+            if matcher.quick_ratio() <= best_ratio:
+                continue
+            ratio = matcher.ratio()
+            if ratio > best_ratio:
+                best, best_ratio = interaction, ratio
+        return best, best_ratio
+
+    def _timing(self, interaction: dict):
+        """(seconds before the response starts, seconds spread over a streamed body)."""
+        if self.fixed is not None:
+            return self.fixed, 0.0
+        ttfb = interaction.get("ttfb", interaction["seconds"]) * self.scale
+        return ttfb, max(0.0, interaction["seconds"] * self.scale - ttfb)
+
+    def _replayed_response(self, interaction: dict, spread: float) -> httpx.Response:
+        recorded = interaction["response"]
+        body = recorded["body"].encode("utf-8")
+        if interaction.get("stream"):
+            return httpx.Response(recorded["status"], headers=recorded["headers"], stream=_ReplayStream(body, spread))
+        return httpx.Response(recorded["status"], headers=recorded["headers"], content=body)
+
+    # --- httpx transport API ---
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        if self.mode == "record":
+            started = time.perf_counter()
+            response = self._sync.handle_request(request)
+            ttfb = time.perf_counter() - started
+            body = httpx.Response(response.status_code, headers=response.headers, stream=response.stream).read()
+            self._save(request, response, body, ttfb, time.perf_counter() - started)
+            return self._recorded_response(response, body)
+
+        key, interaction = self._lookup(request)
+        try:
+            ttfb, spread = self._timing(interaction)
+            time.sleep(ttfb)
+            return self._replayed_response(interaction, spread)
+        finally:
+            self._answered(key)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if self.mode == "record":
+            started = time.perf_counter()
+            response = await self._async.handle_async_request(request)
+            ttfb = time.perf_counter() - started
+            body = await httpx.Response(response.status_code, headers=response.headers, stream=response.stream).aread()
+            self._save(request, response, body, ttfb, time.perf_counter() - started)
+            return self._recorded_response(response, body)
+
+        key, interaction = self._lookup(request)
+        try:
+            ttfb, spread = self._timing(interaction)
+            await asyncio.sleep(ttfb)
+            return self._replayed_response(interaction, spread)
+        finally:
+            self._answered(key)
+
+    def write_report(self) -> Optional[str]:
+        """Writes the mismatches of this replay next to the cassette. Returns the path, or None if all matched."""
+        with self._lock:
+            mismatches = list(self.mismatches)
+        if not mismatches:
+            return None
+        path = f"{os.path.splitext(self.path)[0]}.mismatches.json"
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"cassette": self.path, "mismatches": mismatches}, f, indent=2, ensure_ascii=False)
+        return path
+
+    def close(self) -> None:
+        if self._sync:
+            self._sync.close()
+
+    async def aclose(self) -> None:
+        if self._async:
+            await self._async.aclose()
+
+
+def load(path: str) -> List[dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+_transport = None
+_transport_lock = threading.Lock()
+
+
+def get_transport(path: str = None) -> Optional[CassetteTransport]:
+    """The process-wide cassette transport for LLM_CASSETTE, or None when no cassette is configured."""
+    global _transport
+    path = path or LLM_CASSETTE
+    if not path:
+        return None
+    with _transport_lock:
+        if _transport is None:
+            _transport = CassetteTransport(path, LLM_CASSETTE_MODE, LLM_CASSETTE_LATENCY, LLM_CASSETTE_ON_MISS)
+            if _transport.mode == "replay":
+                atexit.register(_transport.write_report)
+        return _transport
+
+
+def http_clients(path: str = None) -> dict:
+    """`http_client`/`http_async_client` arguments for ChatOpenAI; empty without a cassette."""
+    transport = get_transport(path)
+    if transport is None:
+        return {}
+    return {
+        "http_client": httpx.Client(transport=transport, timeout=None),
+        "http_async_client": httpx.AsyncClient(transport=transport, timeout=None),
+    }
+
+
+# --- CLI ---
+
+def recorded_turns(interactions: List[dict]) -> List[str]:
+    """The user messages of the recorded session, in order, from the worker requests (those with a system prompt)."""
+    turns = []
+    for interaction in interactions:
+        messages = interaction["request"].get("messages", [])
+        if not any(m.get("role") == "system" for m in messages):
+            continue
+        for m in messages:
+            if m.get("role") == "user" and isinstance(m.get("content"), str) and m["content"] not in turns:
+                turns.append(m["content"])
+    return turns
+
+
+def show(path: str) -> int:
+    interactions = load(path)
+    by_model = defaultdict(list)
+    for interaction in interactions:
+        by_model[interaction["model"]].append(interaction["seconds"])
+    for model, seconds in sorted(by_model.items()):
+        print(f"{model:<24} {len(seconds):>5} requests  mean {sum(seconds) / len(seconds) * 1000:8.1f} ms")
+    for i, turn in enumerate(recorded_turns(interactions), 1):
+        print(f"turn {i}: {turn[:100]}")
+    return 0
+
+
+def replay(args) -> int:
+    """Re-runs the recorded user turns through the graph offline and times them like bench.py does."""
+    cassette = os.path.abspath(args.cassette)
+    turns = recorded_turns(load(cassette))
+    if not turns:
+        print("The cassette has no worker requests to take user turns from.")
+        return 1
+
+    # Work on copies of the timesheets: the replayed turns write to them.
+    data_dir = os.path.abspath(args.data_dir)
+    scratch = tempfile.mkdtemp(prefix="invoice_replay_")
+    for name in os.listdir(data_dir):
+        if name.endswith((".xlsx", ".docx")):
+            shutil.copy2(os.path.join(data_dir, name), scratch)
+    os.chdir(scratch)
+    os.environ.update({
+        "LLM_CASSETTE": cassette,
+        "LLM_CASSETTE_MODE": "replay",
+        "LLM_CASSETTE_LATENCY": args.latency,
+        "LLM_CACHE": "off",
+        "CHECKPOINTER": "memory",
+        "TIMESHEET_COMPACT_INTERVAL": "0",
+        "OUTBOX_DB": os.path.join(scratch, "outbox.db"),
+        "OUTBOX_RATE_PER_SEC": "0",
+        "SENDGRID_API_KEY": "replay",
+        "FROM_EMAIL": "replay@example.com",
+        "TO_EMAIL": "review@example.com",
+    })
+    # The clients want a key even though nothing leaves the machine.
+    os.environ.setdefault("GOOGLE_API_KEY", "replay")
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    import outbox
+    with outbox.LocalMailServer() as server:
+        os.environ["MAIL_API_HOST"] = server.url
+        # app.py reloads .env, which may hold the real mail settings; the
+        # outbox is built here so that replayed emails reach the stub.
+        outbox._outbox = outbox.Outbox(
+            outbox.HttpTransport("replay", server.url), db_path=os.path.join(scratch, "outbox.db"), rate_per_second=0
+        )
+        result, transport = _replay_session(cassette, turns, args.repeat)
+        outbox._outbox.flush(timeout=5)
+        print(f"Local mail stub received {len(server.received)} request(s).")
+
+    report = transport.write_report()
+    print(f"{len(transport.mismatches)} request(s) did not match the cassette" + (f"; see {report}" if report else "."))
+    if args.json:
+        print(json.dumps(result))
+    return 0
+
+
+def _replay_session(cassette: str, turns: List[str], repeat: int):
+    # Imported after the environment is set: llm.py builds its clients on the cassette.
+    from bench import measure
+    from cassette import get_transport
+    import app
+
+    transport = get_transport(cassette)
+    loop = asyncio.new_event_loop()
+    runs = iter(range(10 ** 9))
+
+    async def run_turn(turn: str, thread: str) -> None:
+        # Streamed like app.chat, so the requests match the recorded ones.
+        async for _ in app.graph.astream(
+            {"messages": [{"role": "user", "content": turn}]},
+            config={"configurable": {"thread_id": thread}},
+            stream_mode=["messages", "updates"],
+        ):
+            pass
+
+    def session():
+        # Every run replays the recordings from the start, as in the recorded session.
+        transport.rewind()
+        thread = f"replay-{next(runs)}"
+        for turn in turns:
+            loop.run_until_complete(run_turn(turn, thread))
+
+    result = measure(f"replayed session ({len(turns)} turns)", session, repeat)
+    loop.close()
+    return result, transport
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Inspect cassettes and replay recorded sessions offline.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    show_parser = sub.add_parser("show", help="Summarize a cassette")
+    show_parser.add_argument("cassette")
+    replay_parser = sub.add_parser("replay", help="Re-run the recorded turns through the graph, offline")
+    replay_parser.add_argument("cassette")
+    replay_parser.add_argument("--repeat", type=int, default=3, help="Timed runs of the session")
+    replay_parser.add_argument("--latency", default=LLM_CASSETTE_LATENCY, help="'recorded', 'recorded*0.5' or seconds")
+    replay_parser.add_argument("--data-dir", default=os.getcwd(), help="Directory with the timesheets of the recording")
+    replay_parser.add_argument("--json", action="store_true", help="Also print the timing as JSON")
+    args = parser.parse_args(argv)
+    return show(args.cassette) if args.command == "show" else replay(args)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,540 @@
+import os
+import time
+import asyncio
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from langgraph.checkpoint.memory import MemorySaver
+
+from telemetry import metrics
+
+MAX_CHECKPOINTS_PER_THREAD = int(os.getenv("CHECKPOINT_MAX_PER_THREAD", "10"))
+MAX_THREADS = int(os.getenv("CHECKPOINT_MAX_THREADS", "256"))
+IDLE_TTL_SECONDS = float(os.getenv("CHECKPOINT_IDLE_TTL", "3600"))
+
+
+class BoundedMemorySaver(MemorySaver):
+    """
+    MemorySaver that keeps only the newest checkpoints of each thread and evicts
+    whole threads once they sit idle past a TTL or exceed the resident-thread cap
+    (least recently used first).
+    """
+
+    def __init__(
+        self,
+        max_checkpoints_per_thread: int = MAX_CHECKPOINTS_PER_THREAD,
+        max_threads: int = MAX_THREADS,
+        idle_ttl: float = IDLE_TTL_SECONDS,
+    ):
+        super().__init__()
+        # The newest checkpoint has to stay, and so does its parent for in-flight writes.
+        self.max_checkpoints_per_thread = max(2, max_checkpoints_per_thread)
+        self.max_threads = max_threads
+        self.idle_ttl = idle_ttl
+        self._last_used = OrderedDict()  # thread_id -> monotonic time of last access
+        self._versions = {}  # (thread_id, ns, checkpoint_id) -> channel_versions
+        self._lock = threading.RLock()
+        self.evicted_threads = 0
+        self.pruned_checkpoints = 0
+
+    # --- Access tracking ---
+
+    def _touch(self, thread_id: str) -> None:
+        self._last_used[thread_id] = time.monotonic()
+        self._last_used.move_to_end(thread_id)
+
+    def _evict_idle(self, keep: str = None) -> None:
+        now = time.monotonic()
+        while self._last_used:
+            thread_id, last_used = next(iter(self._last_used.items()))
+            if thread_id == keep:
+                break
+            if now - last_used < self.idle_ttl and len(self._last_used) <= self.max_threads:
+                break
+            self.delete_thread(thread_id)
+            self.evicted_threads += 1
+
+    # --- Overrides ---
+
+    def get_tuple(self, config):
+        with self._lock:
+            thread_id = config["configurable"]["thread_id"]
+            if thread_id in self._last_used:
+                self._touch(thread_id)
+            return super().get_tuple(config)
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        with self._lock:
+            result = super().put(config, checkpoint, metadata, new_versions)
+            thread_id = config["configurable"]["thread_id"]
+            checkpoint_ns = config["configurable"]["checkpoint_ns"]
+            self._versions[(thread_id, checkpoint_ns, checkpoint["id"])] = dict(checkpoint["channel_versions"])
+            self._touch(thread_id)
+            self._prune(thread_id, checkpoint_ns)
+            self._evict_idle(keep=thread_id)
+            return result
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        with self._lock:
+            return super().put_writes(config, writes, task_id, task_path)
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            super().delete_thread(thread_id)
+            self._last_used.pop(thread_id, None)
+            for key in [k for k in self._versions if k[0] == thread_id]:
+                del self._versions[key]
+
+    # --- Pruning ---
+
+    def _prune(self, thread_id: str, checkpoint_ns: str) -> None:
+        checkpoints = self.storage[thread_id][checkpoint_ns]
+        excess = len(checkpoints) - self.max_checkpoints_per_thread
+        if excess <= 0:
+            return
+        # Checkpoint IDs are time-ordered, so the smallest ones are the oldest.
+        for checkpoint_id in sorted(checkpoints)[:excess]:
+            del checkpoints[checkpoint_id]
+            self.writes.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+            self._versions.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+            self.pruned_checkpoints += 1
+
+        # Drop channel blobs no retained checkpoint points at any more.
+        referenced = {
+            (channel, version)
+            for (t, ns, _), versions in self._versions.items()
+            if t == thread_id and ns == checkpoint_ns
+            for channel, version in versions.items()
+        }
+        for key in [
+            k for k in self.blobs
+            if k[0] == thread_id and k[1] == checkpoint_ns and (k[2], k[3]) not in referenced
+        ]:
+            del self.blobs[key]
+
+    # --- Metrics ---
+
+    def stats(self) -> dict:
+        """Resident threads, checkpoints, blobs and the serialized bytes they hold."""
+        with self._lock:
+            checkpoint_bytes = sum(
+                len(c[1]) + len(m[1])
+                for namespaces in self.storage.values()
+                for checkpoints in namespaces.values()
+                for c, m, _ in checkpoints.values()
+            )
+            write_bytes = sum(len(w[2][1]) for writes in self.writes.values() for w in writes.values())
+            blob_bytes = sum(len(b[1]) for b in self.blobs.values())
+            return {
+                "resident_threads": len(self._last_used),
+                "checkpoints": sum(len(c) for ns in self.storage.values() for c in ns.values()),
+                "blobs": len(self.blobs),
+                "bytes": checkpoint_bytes + write_bytes + blob_bytes,
+                "evicted_threads": self.evicted_threads,
+                "pruned_checkpoints": self.pruned_checkpoints,
+            }
+
+
+# --- Durable SQLite Checkpointer ---
+
+CHECKPOINT_DB = os.getenv("CHECKPOINT_DB", "checkpoints.db")
+KEEP_CHECKPOINTS_PER_THREAD = int(os.getenv("CHECKPOINT_KEEP_PER_THREAD", "10"))
+COMPACT_EVERY_PUTS = int(os.getenv("CHECKPOINT_COMPACT_EVERY", "200"))
+MAX_DELTA_CHAIN = 32
+TAIL_CACHE_SIZE = 256
+
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id     TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    checkpoint_id TEXT NOT NULL,
+    parent_id     TEXT,
+    type          TEXT,
+    checkpoint    BLOB,
+    metadata_type TEXT,
+    metadata      BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS blobs (
+    thread_id     TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    channel       TEXT NOT NULL,
+    version       TEXT NOT NULL,
+    type          TEXT NOT NULL,
+    value         BLOB,
+    base_version  TEXT,
+    depth         INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (thread_id, checkpoint_ns, channel, version)
+);
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id     TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    checkpoint_id TEXT NOT NULL,
+    task_id       TEXT NOT NULL,
+    idx           INTEGER NOT NULL,
+    channel       TEXT NOT NULL,
+    type          TEXT,
+    value         BLOB,
+    task_path     TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+"""
+
+
+class SqliteCheckpointSaver(BaseCheckpointSaver):
+    """
+    Durable checkpointer backed by SQLite in WAL mode.
+
+    List-valued channels (the message history) are stored as deltas: when a new
+    version only appends to the previous one, just the appended items are
+    written, with a pointer to the base version; chains are capped at
+    MAX_DELTA_CHAIN before a full snapshot is written again. Every
+    `compact_every` puts, compaction keeps only the newest `keep_per_thread`
+    checkpoints of each thread plus the blobs (and delta bases) they reference.
+    Nothing is loaded until a thread is resumed.
+    """
+
+    def __init__(
+        self,
+        db_path: str = CHECKPOINT_DB,
+        keep_per_thread: int = KEEP_CHECKPOINTS_PER_THREAD,
+        compact_every: int = COMPACT_EVERY_PUTS,
+        serde=None,
+    ):
+        super().__init__(serde=serde)
+        self.db_path = db_path
+        self.keep_per_thread = max(2, keep_per_thread)
+        self.compact_every = compact_every
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SQLITE_SCHEMA)
+        # (thread_id, ns, channel) -> (version, items, depth) of the newest list value seen
+        self._tails = OrderedDict()
+        self._puts = 0
+
+    # --- Blob encoding ---
+
+    def _remember_tail(self, key, version, items, depth) -> None:
+        self._tails[key] = (version, list(items), depth)
+        self._tails.move_to_end(key)
+        while len(self._tails) > TAIL_CACHE_SIZE:
+            self._tails.popitem(last=False)
+
+    def _put_blob(self, thread_id, checkpoint_ns, channel, version, values) -> None:
+        key = (thread_id, checkpoint_ns, channel)
+        if channel not in values:
+            row = (thread_id, checkpoint_ns, channel, str(version), "empty", b"", None, 0)
+        else:
+            value = values[channel]
+            tail = self._tails.get(key) if isinstance(value, list) else None
+            if (
+                tail is not None
+                and tail[2] < MAX_DELTA_CHAIN
+                and len(value) >= len(tail[1])
+                and all(a is b or a == b for a, b in zip(tail[1], value))
+            ):
+                base, depth = tail[0], tail[2] + 1
+                type_, data = self.serde.dumps_typed(value[len(tail[1]):])
+            else:
+                base, depth = None, 0
+                type_, data = self.serde.dumps_typed(value)
+            row = (thread_id, checkpoint_ns, channel, str(version), type_, data, base, depth)
+            if isinstance(value, list):
+                self._remember_tail(key, str(version), value, depth)
+        self._conn.execute("INSERT OR REPLACE INTO blobs VALUES (?, ?, ?, ?, ?, ?, ?, ?)", row)
+
+    def _load_blob(self, thread_id, checkpoint_ns, channel, version):
+        """Materializes one channel value, following its delta chain back to a full snapshot."""
+        chain = []
+        current = str(version)
+        while current is not None:
+            row = self._conn.execute(
+                "SELECT type, value, base_version, depth FROM blobs "
+                "WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?",
+                (thread_id, checkpoint_ns, channel, current),
+            ).fetchone()
+            if row is None:
+                return None, 0
+            chain.append(row)
+            current = row[2]
+        type_, data, _, depth = chain[0]
+        if type_ == "empty":
+            return None, 0
+        value = self.serde.loads_typed((chain[-1][0], chain[-1][1]))
+        for delta_type, delta, _, _ in reversed(chain[:-1]):
+            value = value + self.serde.loads_typed((delta_type, delta))
+        return value, depth
+
+    def _load_channel_values(self, thread_id, checkpoint_ns, versions) -> dict:
+        values = {}
+        for channel, version in versions.items():
+            value, depth = self._load_blob(thread_id, checkpoint_ns, channel, version)
+            if value is None:
+                continue
+            values[channel] = value
+            if isinstance(value, list):
+                self._remember_tail((thread_id, checkpoint_ns, channel), str(version), value, depth)
+        return values
+
+    # --- Reads ---
+
+    def _to_tuple(self, thread_id, checkpoint_ns, row) -> CheckpointTuple:
+        checkpoint_id, parent_id, type_, data, metadata_type, metadata = row
+        checkpoint = self.serde.loads_typed((type_, data))
+        writes = self._conn.execute(
+            "SELECT task_id, channel, type, value FROM writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id),
+        ).fetchall()
+        return CheckpointTuple(
+            config={"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id}},
+            checkpoint={
+                **checkpoint,
+                "channel_values": self._load_channel_values(thread_id, checkpoint_ns, checkpoint["channel_versions"]),
+            },
+            metadata=self.serde.loads_typed((metadata_type, metadata)),
+            parent_config=(
+                {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": parent_id}}
+                if parent_id
+                else None
+            ),
+            pending_writes=[(task_id, channel, self.serde.loads_typed((t, v))) for task_id, channel, t, v in writes],
+        )
+
+    def get_tuple(self, config):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        query = (
+            "SELECT checkpoint_id, parent_id, type, checkpoint, metadata_type, metadata FROM checkpoints "
+            "WHERE thread_id = ? AND checkpoint_ns = ?"
+        )
+        params = [thread_id, checkpoint_ns]
+        if checkpoint_id := get_checkpoint_id(config):
+            query += " AND checkpoint_id = ?"
+            params.append(checkpoint_id)
+        with self._lock:
+            row = self._conn.execute(query + " ORDER BY checkpoint_id DESC LIMIT 1", params).fetchone()
+            return self._to_tuple(thread_id, checkpoint_ns, row) if row else None
+
+    def list(self, config, *, filter=None, before=None, limit=None):
+        query = (
+            "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_id, type, checkpoint, metadata_type, metadata "
+            "FROM checkpoints WHERE 1 = 1"
+        )
+        params = []
+        if config:
+            query += " AND thread_id = ?"
+            params.append(config["configurable"]["thread_id"])
+            if (checkpoint_ns := config["configurable"].get("checkpoint_ns")) is not None:
+                query += " AND checkpoint_ns = ?"
+                params.append(checkpoint_ns)
+            if checkpoint_id := get_checkpoint_id(config):
+                query += " AND checkpoint_id = ?"
+                params.append(checkpoint_id)
+        if before and (before_id := get_checkpoint_id(before)):
+            query += " AND checkpoint_id < ?"
+            params.append(before_id)
+        with self._lock:
+            rows = self._conn.execute(query + " ORDER BY checkpoint_id DESC", params).fetchall()
+        for thread_id, checkpoint_ns, *row in rows:
+            if limit is not None and limit <= 0:
+                break
+            if filter:
+                metadata = self.serde.loads_typed((row[4], row[5]))
+                if not all(metadata.get(k) == v for k, v in filter.items()):
+                    continue
+            if limit is not None:
+                limit -= 1
+            with self._lock:
+                checkpoint_tuple = self._to_tuple(thread_id, checkpoint_ns, row)
+            # Yield outside the lock: the caller may put() while it iterates.
+            yield checkpoint_tuple
+
+    # --- Writes ---
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        c = checkpoint.copy()
+        values = c.pop("channel_values")
+        type_, data = self.serde.dumps_typed(c)
+        metadata_type, metadata_data = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for channel, version in new_versions.items():
+                    self._put_blob(thread_id, checkpoint_ns, channel, version, values)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (thread_id, checkpoint_ns, checkpoint["id"], config["configurable"].get("checkpoint_id"),
+                     type_, data, metadata_type, metadata_data),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                self._tails.clear()
+                raise
+            self._puts += 1
+            if self.compact_every and self._puts % self.compact_every == 0:
+                self.compact()
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint["id"]}}
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        # Special channels (errors, interrupts) overwrite; regular writes are kept from the first attempt.
+        rows = {"INSERT OR REPLACE": [], "INSERT OR IGNORE": []}
+        for idx, (channel, value) in enumerate(writes):
+            type_, data = self.serde.dumps_typed(value)
+            verb = "INSERT OR REPLACE" if channel in WRITES_IDX_MAP else "INSERT OR IGNORE"
+            rows[verb].append((thread_id, checkpoint_ns, checkpoint_id, task_id, WRITES_IDX_MAP.get(channel, idx),
+                               channel, type_, data, task_path))
+        with self._lock:
+            for verb, batch in rows.items():
+                self._conn.executemany(f"{verb} INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", batch)
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            for table in ("checkpoints", "blobs", "writes"):
+                self._conn.execute(f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,))
+            for key in [k for k in self._tails if k[0] == thread_id]:
+                del self._tails[key]
+
+    # --- Compaction ---
+
+    def compact(self) -> None:
+        """Keeps the newest checkpoints per thread and the blobs they need, and drops the rest."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "DELETE FROM checkpoints WHERE rowid IN ("
+                    " SELECT rowid FROM ("
+                    "  SELECT rowid, ROW_NUMBER() OVER ("
+                    "   PARTITION BY thread_id, checkpoint_ns ORDER BY checkpoint_id DESC) AS n"
+                    "  FROM checkpoints) WHERE n > ?)",
+                    (self.keep_per_thread,),
+                )
+                self._conn.execute(
+                    "DELETE FROM writes WHERE NOT EXISTS (SELECT 1 FROM checkpoints c WHERE "
+                    "c.thread_id = writes.thread_id AND c.checkpoint_ns = writes.checkpoint_ns "
+                    "AND c.checkpoint_id = writes.checkpoint_id)"
+                )
+
+                referenced = set()
+                for thread_id, checkpoint_ns, type_, data in self._conn.execute(
+                    "SELECT thread_id, checkpoint_ns, type, checkpoint FROM checkpoints"
+                ).fetchall():
+                    versions = self.serde.loads_typed((type_, data))["channel_versions"]
+                    referenced.update((thread_id, checkpoint_ns, ch, str(v)) for ch, v in versions.items())
+
+                # Keep every blob a retained checkpoint needs, including the bases of its delta chain.
+                keep = set()
+                for key in referenced:
+                    while key not in keep:
+                        row = self._conn.execute(
+                            "SELECT base_version FROM blobs WHERE thread_id = ? AND checkpoint_ns = ? "
+                            "AND channel = ? AND version = ?", key,
+                        ).fetchone()
+                        if row is None:
+                            break
+                        keep.add(key)
+                        if row[0] is None:
+                            break
+                        key = (*key[:3], row[0])
+                existing = self._conn.execute(
+                    "SELECT thread_id, checkpoint_ns, channel, version FROM blobs"
+                ).fetchall()
+                self._conn.executemany(
+                    "DELETE FROM blobs WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?",
+                    [key for key in existing if key not in keep],
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            finally:
+                self._tails.clear()
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    # --- Async ---
+
+    async def aget_tuple(self, config):
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        items = await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for item in items:
+            yield item
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        return await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        return await asyncio.to_thread(self.delete_thread, thread_id)
+
+    def get_next_version(self, current, channel):
+        return MemorySaver.get_next_version(self, current, channel)
+
+    # --- Metrics ---
+
+    def stats(self) -> dict:
+        with self._lock:
+            count = lambda table: self._conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            page_count = self._conn.execute("PRAGMA page_count").fetchone()[0]
+            page_size = self._conn.execute("PRAGMA page_size").fetchone()[0]
+            return {
+                "threads": self._conn.execute("SELECT COUNT(DISTINCT thread_id) FROM checkpoints").fetchone()[0],
+                "checkpoints": count("checkpoints"),
+                "blobs": count("blobs"),
+                "delta_blobs": self._conn.execute("SELECT COUNT(*) FROM blobs WHERE base_version IS NOT NULL").fetchone()[0],
+                "blob_bytes": self._conn.execute("SELECT COALESCE(SUM(LENGTH(value)), 0) FROM blobs").fetchone()[0],
+                "db_bytes": page_count * page_size,
+            }
+
+
+_STATS_HELP = {
+    "resident_threads": "Conversation threads held in memory",
+    "threads": "Conversation threads in the checkpoint database",
+    "checkpoints": "Stored checkpoints",
+    "blobs": "Stored channel blobs",
+    "delta_blobs": "Channel blobs stored as deltas",
+    "bytes": "Serialized bytes held by the checkpointer",
+    "blob_bytes": "Bytes of stored channel blobs",
+    "db_bytes": "Size of the checkpoint database",
+    "evicted_threads": "Threads evicted since start (idle or over the cap)",
+    "pruned_checkpoints": "Checkpoints pruned since start",
+}
+
+
+def publish_stats(saver, kind: str) -> None:
+    """Exports the saver's stats() as invoice_checkpoint_* gauges whenever the metrics are scraped."""
+    def collect():
+        for name, value in saver.stats().items():
+            metrics.set(f"invoice_checkpoint_{name}", value, _STATS_HELP.get(name, ""), checkpointer=kind)
+
+    metrics.add_collector(collect)
+
+
+def make_checkpointer():
+    """Builds the checkpointer selected by CHECKPOINTER ('sqlite', the default, or 'memory')."""
+    if os.getenv("CHECKPOINTER", "sqlite") == "memory":
+        saver, kind = BoundedMemorySaver(), "memory"
+    else:
+        saver, kind = SqliteCheckpointSaver(), "sqlite"
+    publish_stats(saver, kind)
+    return saver
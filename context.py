@@ -0,0 +1,125 @@
+import os
+from typing import List, Tuple
+
+from langchain_core.messages import AIMessage, HumanMessage, RemoveMessage, SystemMessage, ToolMessage
+
+KEEP_TURNS = int(os.getenv("CONTEXT_KEEP_TURNS", "3"))
+TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "6000"))
+STALE_TOOL_CHARS = int(os.getenv("CONTEXT_STALE_TOOL_CHARS", "200"))
+DIGEST_MAX_CHARS = int(os.getenv("CONTEXT_DIGEST_MAX_CHARS", "2000"))
+DIGEST_LINE_CHARS = 160
+
+
+def estimate_tokens(messages: List) -> int:
+    """Rough token count (~4 characters per token) including tool call arguments."""
+    chars = 0
+    for m in messages:
+        chars += len(str(m.content)) + 16
+        for call in getattr(m, "tool_calls", None) or []:
+            chars += len(call["name"]) + len(str(call.get("args", "")))
+    return chars // 4
+
+
+def _split_turns(messages: List) -> List[List]:
+    """Groups the conversation into turns, each starting at a user message."""
+    turns = []
+    for m in messages:
+        if isinstance(m, SystemMessage):
+            continue
+        if isinstance(m, HumanMessage) or not turns:
+            turns.append([])
+        turns[-1].append(m)
+    return turns
+
+
+def _clip(text: str, limit: int) -> str:
+    text = " ".join(str(text).split())
+    return text if len(text) <= limit else text[: limit - 1] + "…"
+
+
+def _digest_lines(turn: List) -> List[str]:
+    lines = []
+    for m in turn:
+        if isinstance(m, HumanMessage):
+            lines.append(f"User: {_clip(m.content, DIGEST_LINE_CHARS)}")
+        elif isinstance(m, AIMessage) and m.tool_calls:
+            calls = ", ".join(call["name"] for call in m.tool_calls)
+            lines.append(f"Assistant called: {calls}")
+        elif isinstance(m, AIMessage) and m.content:
+            lines.append(f"Assistant: {_clip(m.content, DIGEST_LINE_CHARS)}")
+    return lines
+
+
+def _fold(digest: str, turns: List[List]) -> str:
+    lines = digest.splitlines() if digest else []
+    for turn in turns:
+        lines += _digest_lines(turn)
+    # Keep the newest lines within the digest budget.
+    while lines and sum(len(line) + 1 for line in lines) > DIGEST_MAX_CHARS:
+        lines.pop(0)
+    return "\n".join(lines)
+
+
+def _collapse_tool_output(m):
+    if not isinstance(m, ToolMessage) or len(str(m.content)) <= STALE_TOOL_CHARS:
+        return m
+    content = str(m.content)
+    head = content.splitlines()[0] if content else ""
+    return m.model_copy(update={"content": f"{_clip(head, STALE_TOOL_CHARS)} [{len(content)} chars of earlier tool output elided]"})
+
+
+def build_context(
+    state: dict,
+    system_message: str,
+    keep_turns: int = KEEP_TURNS,
+    token_budget: int = TOKEN_BUDGET,
+) -> Tuple[List, dict]:
+    """
+    Builds the bounded prompt for a worker's model call.
+
+    The last `keep_turns` turns are kept verbatim (tool outputs from earlier
+    turns are collapsed), older turns are folded into a rolling digest held in
+    `state["summary"]`, and more turns are folded while the prompt exceeds
+    `token_budget`. Returns (prompt messages, state update) where the update
+    removes folded messages from the thread and stores the new digest.
+    """
+    turns = _split_turns(state.get("messages", []))
+    keep = max(1, keep_turns)
+    folded, recent = turns[:-keep], turns[-keep:]
+
+    def render(digest: str, recent: List[List]) -> List:
+        content = system_message
+        if digest:
+            content += "\n\nSummary of the earlier conversation:\n" + digest
+        body = [
+            m if i == len(recent) - 1 else _collapse_tool_output(m)
+            for i, turn in enumerate(recent)
+            for m in turn
+        ]
+        return [SystemMessage(content=content)] + body
+
+    digest = _fold(state.get("summary") or "", folded)
+    prompt = render(digest, recent)
+    while len(recent) > 1 and estimate_tokens(prompt) > token_budget:
+        folded.append(recent.pop(0))
+        digest = _fold(state.get("summary") or "", folded)
+        prompt = render(digest, recent)
+
+    if estimate_tokens(prompt) > token_budget:
+        # Only the current turn is left: collapse all but its latest tool results.
+        current = recent[-1]
+        last_ai = max((i for i, m in enumerate(current) if isinstance(m, AIMessage)), default=len(current))
+        prompt = prompt[:1] + [
+            _collapse_tool_output(m) if i < last_ai else m for i, m in enumerate(current)
+        ]
+
+    removals = [RemoveMessage(id=m.id) for turn in folded for m in turn if m.id]
+    removals += [
+        RemoveMessage(id=m.id)
+        for m in state.get("messages", [])
+        if isinstance(m, SystemMessage) and m.id
+    ]
+    update = {"messages": removals}
+    if folded:
+        update["summary"] = digest
+    return prompt, update
@@ -0,0 +1,280 @@
+import io
+import os
+import copy
+import zipfile
+import threading
+from typing import BinaryIO, Union
+
+from docx import Document
+from docx.shared import Pt, Inches
+from docx.enum.table import WD_TABLE_ALIGNMENT
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.oxml.ns import qn
+from docx.oxml import OxmlElement
+from lxml import etree
+
+from telemetry import span
+
+DOCUMENT_PART = "word/document.xml"
+
+# Placeholder text written into the template and replaced at render time.
+NAME = "{{name}}"
+DATE = "{{date}}"
+BILL_TO = "{{bill_to}}"
+SALARY_DESCRIPTION = "{{salary_description}}"
+DETAIL_DESCRIPTION = "{{detail_description}}"
+DETAIL_AMOUNT = "{{detail_amount}}"
+TOTAL = "{{total}}"
+TOTAL_WORDS = "{{total_words}}"
+
+_W_T = qn("w:t")
+_W_BR = qn("w:br")
+_W_TR = qn("w:tr")
+_XML_SPACE = "{http://www.w3.org/XML/1998/namespace}space"
+
+
+def set_cell_border(cell, **kwargs):
+    """
+    Set cell border properties.
+    Usage: set_cell_border(cell, top={"sz": 12, "val": "single", "color": "000000"})
+    """
+    tc = cell._tc
+    tcPr = tc.get_or_add_tcPr()
+    tcBorders = OxmlElement('w:tcBorders')
+    for edge in ('top', 'left', 'bottom', 'right', 'insideH', 'insideV'):
+        if edge in kwargs:
+            edge_data = kwargs[edge]
+            element = OxmlElement(f'w:{edge}')
+            for key in ["sz", "val", "color", "space"]:
+                if key in edge_data:
+                    element.set(qn(f'w:{key}'), str(edge_data[key]))
+            tcBorders.append(element)
+    tcPr.append(tcBorders)
+
+
+def build_invoice_layout() -> Document:
+    """Builds the static invoice layout with placeholders in place of the variable fields."""
+    doc = Document()
+
+    # --- Set Default Font Style ---
+    style = doc.styles['Normal']
+    font = style.font
+    font.name = 'Times New Roman'
+    font.size = Pt(11)
+
+    # --- Main Table (1 column, used for layout) ---
+    table = doc.add_table(rows=1, cols=1)
+    table.autofit = False
+    table.allow_autofit = False
+    table.columns[0].width = Inches(6.5)
+
+    # --- Row 1: INVOICE Title ---
+    cell = table.cell(0, 0)
+    p = cell.paragraphs[0]
+    run = p.add_run("INVOICE")
+    run.font.name = "Arial Black"
+    run.font.size = Pt(28)
+    p.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    set_cell_border(cell, bottom={"val": "nil"}, left={"sz": 6, "val": "single"}, right={"sz": 6, "val": "single"}, top={"sz": 6, "val": "single"})
+
+    # --- Row 2: Name (left) and Date (right) ---
+    row_cell = table.add_row().cells[0]
+    inner_table = row_cell.add_table(rows=1, cols=2)
+    inner_table.columns[0].width = Inches(4.0)
+    inner_table.columns[1].width = Inches(2.5)
+
+    left_cell = inner_table.cell(0, 0)
+    left_cell.paragraphs[0].add_run(NAME).bold = True
+    left_cell.paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.LEFT
+
+    right_cell = inner_table.cell(0, 1)
+    right_cell.paragraphs[0].add_run(DATE)
+    right_cell.paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.RIGHT
+    for cell in inner_table._cells:
+        set_cell_border(cell, top={"val": "nil"}, bottom={"val": "nil"}, left={"val": "nil"}, right={"val": "nil"})
+    set_cell_border(row_cell, bottom={"val": "nil"}, left={"sz": 6, "val": "single"}, right={"sz": 6, "val": "single"}, top={"val": "nil"})
+
+    # --- Row 3: Bill To Block ---
+    cell = table.add_row().cells[0]
+    p = cell.paragraphs[0]
+    p.add_run("Bill To:\n").bold = True
+    p.add_run(BILL_TO)
+    p.alignment = WD_ALIGN_PARAGRAPH.LEFT
+    set_cell_border(cell, top={"val": "nil"}, bottom={"val": "nil"}, left={"sz": 6, "val": "single"}, right={"sz": 6, "val": "single"})
+
+    # --- Row 4: Details Table Headers ---
+    row_cell = table.add_row().cells[0]
+    header_table = row_cell.add_table(rows=1, cols=2)
+    header_table.columns[0].width = Inches(5.0)
+    header_table.columns[1].width = Inches(1.5)
+    desc_cell = header_table.cell(0, 0)
+    amt_cell = header_table.cell(0, 1)
+    header_table.alignment = WD_TABLE_ALIGNMENT.LEFT
+    header_table.autofit = False
+
+    desc_cell.text = "DESCRIPTION"
+    amt_cell.text = "AMOUNT"
+
+    for cell in [desc_cell, amt_cell]:
+        p = cell.paragraphs[0]
+        p.alignment = WD_ALIGN_PARAGRAPH.CENTER
+        p.runs[0].bold = True
+        shading_elm = OxmlElement('w:shd')
+        shading_elm.set(qn('w:fill'), "ff99cc")
+        cell._tc.get_or_add_tcPr().append(shading_elm)
+    set_cell_border(row_cell, left={"sz": 6, "val": "single"}, right={"sz": 6, "val": "single"})
+
+    # --- Row 5: Details Table Content (salary row plus one prototype detail row) ---
+    row_cell = table.add_row().cells[0]
+    details_table = row_cell.add_table(rows=0, cols=2)
+    details_table.columns[0].width = Inches(5.0)
+    details_table.columns[1].width = Inches(1.5)
+
+    cells = details_table.add_row().cells
+    cells[0].text = SALARY_DESCRIPTION
+    cells[1].text = ""
+
+    cells = details_table.add_row().cells
+    cells[0].text = DETAIL_DESCRIPTION
+    cells[1].text = DETAIL_AMOUNT
+    cells[1].paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.RIGHT
+
+    set_cell_border(row_cell, top={"val": "nil"}, bottom={"sz": 6, "val": "single"}, left={"sz": 6, "val": "single"}, right={"sz": 6, "val": "single"})
+
+    # --- Row 6: TOTAL Row ---
+    row_cell = table.add_row().cells[0]
+    total_table = row_cell.add_table(rows=1, cols=2)
+    total_table.columns[0].width = Inches(5.0)
+    total_table.columns[1].width = Inches(1.5)
+    left = total_table.cell(0, 0)
+    right = total_table.cell(0, 1)
+
+    left.paragraphs[0].add_run("TOTAL").bold = True
+    left.paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.RIGHT
+
+    right.paragraphs[0].add_run(TOTAL).bold = True
+    right.paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.RIGHT
+
+    shading_elm = OxmlElement('w:shd')
+    shading_elm.set(qn('w:fill'), "ffcc99")
+    right._tc.get_or_add_tcPr().append(shading_elm)
+
+    set_cell_border(row_cell, top={"sz": 6, "val": "single"}, bottom={"val": "nil"}, left={"sz": 6, "val": "single"}, right={"sz": 6, "val": "single"})
+    set_cell_border(right, left={"sz": 6, "val": "single"}, bottom={"sz": 6, "val": "single"})
+
+    # --- Row 7: Amount in Words ---
+    cell = table.add_row().cells[0]
+    p = cell.paragraphs[0]
+    p.add_run("Amount in Words: ").bold = True
+    p.add_run(TOTAL_WORDS)
+    p.alignment = WD_ALIGN_PARAGRAPH.LEFT
+    set_cell_border(cell, top={"val": "nil"}, bottom={"sz": 6, "val": "single"}, left={"sz": 6, "val": "single"}, right={"sz": 6, "val": "single"})
+
+    return doc
+
+
+class InvoiceTemplate:
+    """
+    The invoice layout compiled once into a .docx package. Every part except
+    document.xml is compressed once into a base archive; rendering clones only
+    the parsed document.xml tree, fills in the placeholders and appends it.
+    """
+
+    def __init__(self, doc: Document = None):
+        buffer = io.BytesIO()
+        (doc or build_invoice_layout()).save(buffer)
+        base = io.BytesIO()
+        with zipfile.ZipFile(io.BytesIO(buffer.getvalue())) as package, \
+                zipfile.ZipFile(base, "w", zipfile.ZIP_DEFLATED) as static:
+            for info in package.infolist():
+                if info.filename == DOCUMENT_PART:
+                    self._document = etree.fromstring(package.read(info.filename))
+                else:
+                    static.writestr(info, package.read(info.filename))
+        self._base = base.getvalue()
+
+    @staticmethod
+    def _set_text(t, text: str) -> None:
+        """Sets a w:t element's text, turning newlines into w:br breaks within the same run."""
+        lines = str(text).split("\n")
+        t.text = lines[0]
+        t.set(_XML_SPACE, "preserve")
+        anchor = t
+        for line in lines[1:]:
+            br = etree.Element(_W_BR)
+            anchor.addnext(br)
+            anchor = br
+            if line:
+                nt = etree.Element(_W_T)
+                nt.text = line
+                nt.set(_XML_SPACE, "preserve")
+                anchor.addnext(nt)
+                anchor = nt
+
+    @staticmethod
+    def _detail_cells(item):
+        # Handle both dict and string formats for robustness
+        if isinstance(item, dict):
+            return item.get("description", ""), item.get("amount", "")
+        if isinstance(item, str) and ':' in item:
+            key, value = item.split(":", 1)
+            return key.strip(), value.strip()
+        return str(item), ""
+
+    def render(self, data: dict, out: Union[str, BinaryIO]) -> None:
+        """Fills the template with `data` and writes the .docx to a path or a binary file object."""
+        values = {
+            NAME: data["name"],
+            DATE: f"{data['date']}",
+            BILL_TO: "".join(f"    {line}\n" for line in data["bill_to"]),
+            SALARY_DESCRIPTION: data["salary_description"],
+            TOTAL: data["total"],
+            TOTAL_WORDS: data["total_words"],
+        }
+        details = [self._detail_cells(item) for item in data["details"]]
+
+        root = copy.deepcopy(self._document)
+        prototype = None
+        for t in list(root.iter(_W_T)):
+            if t.text in values:
+                self._set_text(t, values[t.text])
+            elif t.text == DETAIL_DESCRIPTION:
+                prototype = next(t.iterancestors(_W_TR))
+
+        for description, amount in details:
+            row = copy.deepcopy(prototype)
+            # Snapshot first: _set_text adds w:t nodes for extra lines, which are not placeholders.
+            cells = {DETAIL_DESCRIPTION: description, DETAIL_AMOUNT: amount}
+            for t in list(row.iter(_W_T)):
+                if t.text in cells:
+                    self._set_text(t, cells[t.text])
+            prototype.addprevious(row)
+        prototype.getparent().remove(prototype)
+
+        document_xml = etree.tostring(root, xml_declaration=True, encoding="UTF-8", standalone=True)
+        with span("io", "docx_render", details=len(details)) as fields:
+            if isinstance(out, (str, os.PathLike)):
+                with open(out, "w+b") as f:
+                    self._write(f, document_xml)
+                    fields["bytes_written"] = f.tell()
+            else:
+                self._write(out, document_xml)
+
+    def _write(self, f: BinaryIO, document_xml: bytes) -> None:
+        f.write(self._base)
+        with zipfile.ZipFile(f, "a", zipfile.ZIP_DEFLATED) as package:
+            package.writestr(DOCUMENT_PART, document_xml)
+
+
+_template = None
+_template_lock = threading.Lock()
+
+
+def get_invoice_template() -> InvoiceTemplate:
+    """Returns the process-wide compiled invoice template, building it on first use."""
+    global _template
+    if _template is None:
+        with _template_lock:
+            if _template is None:
+                _template = InvoiceTemplate()
+    return _template
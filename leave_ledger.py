@@ -0,0 +1,188 @@
+import os
+import bisect
+import threading
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from billing import LEAVES_PER_MONTH, LEAVE_WEIGHTS, parse_date
+from timesheet_cache import file_stamp
+from timesheet_store import TimesheetStore, get_store
+
+OPENING_BALANCE = Decimal(os.getenv("LEAVE_OPENING_BALANCE", "0"))
+TIMESHEET_PATTERN = ("timesheet_", ".xlsx")
+
+Month = str  # 'YYYY-MM'
+
+
+def _index(month: Month) -> int:
+    year, mm = month.split("-")
+    return int(year) * 12 + int(mm) - 1
+
+
+def _month(index: int) -> Month:
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+
+def month_of(rows: Iterable[Sequence]) -> Optional[Month]:
+    """The month ('YYYY-MM') of the earliest dated row, as used for the invoice period."""
+    dates = [d for d in (parse_date(row[0]) for row in rows) if d]
+    return min(dates).strftime("%Y-%m") if dates else None
+
+
+class LeaveLedger:
+    """
+    Running leave balances per calendar month, from the first month with
+    timesheet entries to the last one.
+
+    Each month carries forward the previous month's balance, accrues
+    LEAVES_PER_MONTH and uses up leave by the same weights as `compute_invoice`
+    ('L'/'A' a day, 'HL' half a day). Months without any entries still accrue.
+
+    The ledger is built from the store's entries (every `timesheet_*.xlsx` in
+    the data directory is imported once) and kept in memory. The store reports
+    the months each write or import touched; the next query recomputes only
+    from the earliest such month onwards. Queries are dictionary lookups.
+    """
+
+    def __init__(self, store: TimesheetStore, opening_balance: Decimal = OPENING_BALANCE):
+        self.store = store
+        self.opening_balance = Decimal(opening_balance)
+        self._lock = threading.Lock()
+        self._months: List[Month] = []
+        self._rows: Dict[Month, dict] = {}
+        self._stale_from: Optional[Month] = None
+        self._built = False
+        self._files = None
+        store.listeners.append(self._touched)
+
+    def _touched(self, months) -> None:
+        months = [m for m in months if len(m) == 7]
+        if not months:
+            return
+        with self._lock:
+            first = min(months)
+            if self._stale_from is None or first < self._stale_from:
+                self._stale_from = first
+
+    # --- Maintenance ---
+
+    def _scan(self) -> None:
+        """Imports any timesheet workbook that is new or changed on disk since the last scan."""
+        data_dir = self.store.data_dir
+        names = sorted(
+            n for n in os.listdir(data_dir)
+            if n.startswith(TIMESHEET_PATTERN[0]) and n.endswith(TIMESHEET_PATTERN[1])
+        )
+        files = tuple((n, file_stamp(os.path.join(data_dir, n))) for n in names)
+        if files == self._files:
+            return
+        for name in names:
+            self.store.sync(name)  # a no-op for workbooks the store already has
+        self._files = files
+
+    def _taken_since(self, start: Optional[Month]) -> Dict[Month, Decimal]:
+        """Leave used per month, for months from `start` on (all months when None)."""
+        taken: Dict[Month, Decimal] = {}
+        for month, status, count in self.store.status_counts_since(start):
+            taken[month] = taken.get(month, Decimal(0)) + LEAVE_WEIGHTS.get(status, Decimal(0)) * count
+        return taken
+
+    def _recompute(self, start: Optional[Month]) -> None:
+        """Rebuilds the rows from `start` on, keeping the ones before it."""
+        if start is None or not self._months or start <= self._months[0]:
+            start, keep = None, 0
+        else:
+            keep = bisect.bisect_left(self._months, start)
+        taken = self._taken_since(start)
+        kept = self._months[:keep]
+        for month in self._months[keep:]:
+            del self._rows[month]
+
+        months = sorted(set(taken) | set(kept))
+        if not months:
+            self._months = []
+            return
+        balance = self._rows[kept[-1]]["balance"] if kept else self.opening_balance
+        first = _index(kept[-1]) + 1 if kept else _index(months[0])
+        for i in range(first, _index(months[-1]) + 1):
+            month = _month(i)
+            used = taken.get(month, Decimal(0))
+            row = {
+                "month": month,
+                "carried_forward": balance,
+                "accrued": LEAVES_PER_MONTH,
+                "taken": used,
+                "balance": balance + LEAVES_PER_MONTH - used,
+            }
+            self._rows[month] = row
+            kept.append(month)
+            balance = row["balance"]
+        self._months = kept
+
+    def refresh(self) -> None:
+        """Brings the ledger up to date with the workbooks and the writes since the last query."""
+        self._scan()
+        with self._lock:
+            if not self._built:
+                self._recompute(None)
+                self._built = True
+            elif self._stale_from is not None:
+                self._recompute(self._stale_from)
+            self._stale_from = None
+
+    def rebuild(self) -> None:
+        with self._lock:
+            self._built = False
+            self._files = None
+        self.refresh()
+
+    # --- Queries ---
+
+    def month(self, month: Month) -> dict:
+        """The ledger row for `month`: carried_forward, accrued, taken and balance (Decimals)."""
+        self.refresh()
+        with self._lock:
+            row = self._rows.get(month)
+            if row is not None:
+                return dict(row)
+            if not self._months or month < self._months[0]:
+                balance = self.opening_balance
+            else:
+                # After the last month with entries nothing is taken, so the balance just accrues.
+                last = self._rows[self._months[-1]]
+                balance = last["balance"] + LEAVES_PER_MONTH * (_index(month) - _index(last["month"]) - 1)
+        return {
+            "month": month,
+            "carried_forward": balance,
+            "accrued": LEAVES_PER_MONTH,
+            "taken": Decimal(0),
+            "balance": balance + LEAVES_PER_MONTH,
+        }
+
+    def carried_forward(self, month: Month) -> Decimal:
+        """Leaves carried into `month` from the months before it."""
+        return self.month(month)["carried_forward"]
+
+    def balance(self, month: Month) -> Decimal:
+        """Leaves left at the end of `month`."""
+        return self.month(month)["balance"]
+
+    def months(self, year: Optional[str] = None) -> List[dict]:
+        """Every ledger row, or just those of `year`."""
+        self.refresh()
+        with self._lock:
+            return [dict(self._rows[m]) for m in self._months if not year or m.startswith(f"{year}-")]
+
+
+_ledgers = {}
+_ledgers_lock = threading.Lock()
+
+
+def get_ledger(store: TimesheetStore = None) -> LeaveLedger:
+    """Returns the process-wide ledger for `store` (defaults to `get_store()`)."""
+    store = store or get_store()
+    with _ledgers_lock:
+        ledger = _ledgers.get(id(store))
+        if ledger is None:
+            ledger = _ledgers[id(store)] = LeaveLedger(store)
+        return ledger
@@ -1,22 +1,85 @@
-from langchain_openai import ChatOpenAI
 import os
+import threading
 from dotenv import load_dotenv
-from tools import tools
 
-load_dotenv(override=True)
-# groq_api_key = os.getenv('GROQ_API_KEY')
-google_api_key = os.getenv('GOOGLE_API_KEY')
+# The clients (and langchain_openai/openai behind them) are built on first use,
+# not at import: `llm.llm`, `llm.pro_llm` and `llm.llm_with_tools` resolve
+# through the module-level __getattr__ below. Graph nodes go through the
+# get_* functions so that compiling the graph does not build them either.
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com/v1beta/openai/")
+# Deadlines, hedging, fallback and circuit breaking (see resilient_llm.py); "off" uses the bare clients.
+LLM_RESILIENT = os.getenv("LLM_RESILIENT", "on").lower() not in ("off", "0", "false")
 
-llm = ChatOpenAI(
-    model_name="gemini-1.5-flash",
-    openai_api_key=google_api_key,
-    base_url="https://generativelanguage.googleapis.com/v1beta/openai/"
-)
+_clients = {}
+_clients_lock = threading.Lock()
 
-pro_llm = ChatOpenAI(
-    model_name="gemini-2.0-flash",
-    openai_api_key=google_api_key,
-    base_url="https://generativelanguage.googleapis.com/v1beta/openai/"
-)
 
-llm_with_tools = pro_llm.bind_tools(tools)
\ No newline at end of file
+def _build() -> dict:
+    from langchain_openai import ChatOpenAI
+    from tools import tools
+    from llm_cache import get_llm_cache
+    from resilient_llm import ResilientModel
+    from cassette import http_clients
+
+    load_dotenv(override=True)
+    # groq_api_key = os.getenv('GROQ_API_KEY')
+    google_api_key = os.getenv('GOOGLE_API_KEY')
+    # Identical prompts over unchanged timesheets are answered from disk
+    llm_cache = get_llm_cache()
+    # With LLM_CASSETTE set, requests are recorded to or replayed from a cassette file
+    transport = http_clients()
+
+    llm = ChatOpenAI(
+        model_name="gemini-1.5-flash",
+        openai_api_key=google_api_key,
+        base_url=GEMINI_BASE_URL,
+        cache=llm_cache,
+        stream_usage=True,
+        # Retries are left to ResilientModel, which knows the deadline.
+        max_retries=0 if LLM_RESILIENT else None,
+        **transport,
+    )
+
+    pro_llm = ChatOpenAI(
+        model_name="gemini-2.0-flash",
+        openai_api_key=google_api_key,
+        base_url=GEMINI_BASE_URL,
+        cache=llm_cache,
+        stream_usage=True,
+        max_retries=0 if LLM_RESILIENT else None,
+        **transport,
+    )
+
+    llm_with_tools = pro_llm.bind_tools(tools)
+    if not LLM_RESILIENT:
+        return {"llm": llm, "pro_llm": pro_llm, "llm_with_tools": llm_with_tools}
+
+    return {
+        "llm": ResilientModel(llm, name="gemini-1.5-flash"),
+        "pro_llm": ResilientModel(pro_llm, name="gemini-2.0-flash", fallback=llm, fallback_name="gemini-1.5-flash"),
+        "llm_with_tools": ResilientModel(
+            llm_with_tools, name="gemini-2.0-flash", fallback=llm.bind_tools(tools), fallback_name="gemini-1.5-flash"
+        ),
+    }
+
+
+def __getattr__(name: str):
+    if name not in ("llm", "pro_llm", "llm_with_tools"):
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    if not _clients:
+        with _clients_lock:
+            if not _clients:
+                _clients.update(_build())
+    # Cache on the module so later lookups (and test overrides) bypass __getattr__
+    globals()[name] = _clients[name]
+    return _clients[name]
+
+
+def get_llm():
+    """The routing model."""
+    return globals().get("llm") or __getattr__("llm")
+
+
+def get_llm_with_tools():
+    """The worker model with every tool bound."""
+    return globals().get("llm_with_tools") or __getattr__("llm_with_tools")
@@ -0,0 +1,192 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import List, Optional
+
+from langchain_core.caches import BaseCache
+from langchain_core.load import dumps, loads
+
+from timesheet_cache import file_stamp
+
+LLM_CACHE_DB = os.getenv("LLM_CACHE_DB") or os.path.join(os.getcwd(), "llm_cache.db")
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "3600"))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1000"))
+
+# Message fields that differ between otherwise identical prompts.
+_VOLATILE_KEYS = {"id", "response_metadata", "usage_metadata"}
+_SHEET_RE = re.compile(r"[\w\-]+\.xlsx")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key         TEXT PRIMARY KEY,
+    created_at  REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    value       TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_by_access ON responses (accessed_at);
+CREATE TABLE IF NOT EXISTS dependencies (
+    sheet TEXT NOT NULL,
+    key   TEXT NOT NULL,
+    PRIMARY KEY (sheet, key)
+) WITHOUT ROWID;
+"""
+
+
+def _strip(value):
+    if isinstance(value, dict):
+        return {
+            k: _strip(v) for k, v in value.items()
+            if not (k in _VOLATILE_KEYS and not isinstance(v, list))
+        }
+    if isinstance(value, list):
+        return [_strip(v) for v in value]
+    if isinstance(value, str):
+        return " ".join(value.split())
+    return value
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Serialized messages without message ids/metadata and with whitespace collapsed."""
+    try:
+        return json.dumps(_strip(json.loads(prompt)), sort_keys=True, ensure_ascii=False)
+    except ValueError:
+        return " ".join(prompt.split())
+
+
+def referenced_sheets(prompt: str) -> List[str]:
+    return sorted(set(_SHEET_RE.findall(prompt)))
+
+
+class SqliteLLMCache(BaseCache):
+    """
+    On-disk cache of model responses.
+
+    The key covers the normalized prompt, the model configuration (`llm_string`,
+    which includes the model name and bound tools) and the mtime/size of every
+    timesheet workbook named in the prompt. Entries expire after `ttl` seconds,
+    the least recently used are evicted above `max_entries`, and
+    `invalidate_sheet` drops every entry whose prompt named that sheet.
+    """
+
+    def __init__(
+        self,
+        db_path: str = LLM_CACHE_DB,
+        ttl: float = LLM_CACHE_TTL,
+        max_entries: int = LLM_CACHE_MAX_ENTRIES,
+        data_dir: str = None,
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.data_dir = data_dir
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def _key(self, prompt: str, llm_string: str):
+        normalized = normalize_prompt(prompt)
+        sheets = referenced_sheets(normalized)
+        data_dir = self.data_dir or os.getcwd()
+        stamps = [(sheet, file_stamp(os.path.join(data_dir, sheet))) for sheet in sheets]
+        digest = hashlib.sha256(json.dumps([normalized, llm_string, stamps]).encode("utf-8")).hexdigest()
+        return digest, sheets
+
+    def lookup(self, prompt: str, llm_string: str):
+        key, _ = self._key(prompt, llm_string)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT created_at, value FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or (self.ttl and now - row[0] > self.ttl):
+                if row is not None:
+                    self._delete([key])
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        return [loads(g) for g in json.loads(row[1])]
+
+    def update(self, prompt: str, llm_string: str, return_val) -> None:
+        key, sheets = self._key(prompt, llm_string)
+        value = json.dumps([dumps(g) for g in return_val])
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, created_at, accessed_at, value) VALUES (?, ?, ?, ?)",
+                    (key, now, now, value),
+                )
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO dependencies (sheet, key) VALUES (?, ?)", [(s, key) for s in sheets]
+                )
+                self._evict(now)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _evict(self, now: float) -> None:
+        expired = [k for (k,) in self._conn.execute(
+            "SELECT key FROM responses WHERE created_at < ?", (now - self.ttl,)
+        )] if self.ttl else []
+        count = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0] - len(expired)
+        if count > self.max_entries:
+            expired += [k for (k,) in self._conn.execute(
+                "SELECT key FROM responses ORDER BY accessed_at LIMIT ?", (count - self.max_entries,)
+            )]
+        self._delete(expired)
+
+    def _delete(self, keys: List[str]) -> None:
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", [(k,) for k in keys])
+        self._conn.executemany("DELETE FROM dependencies WHERE key = ?", [(k,) for k in keys])
+
+    def invalidate_sheet(self, sheet: str) -> int:
+        """Drops every cached response whose prompt referenced `sheet`. Returns the number dropped."""
+        with self._lock:
+            keys = [k for (k,) in self._conn.execute("SELECT key FROM dependencies WHERE sheet = ?", (sheet,))]
+            self._delete(keys)
+        return len(keys)
+
+    def clear(self, **kwargs) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.execute("DELETE FROM dependencies")
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> Optional[SqliteLLMCache]:
+    """Returns the process-wide response cache, or None when LLM_CACHE=off."""
+    global _cache
+    if os.getenv("LLM_CACHE", "on").lower() in ("off", "0", "false"):
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = SqliteLLMCache()
+        return _cache
+
+
+def invalidate_sheet(sheet: str) -> int:
+    """Drops cached responses that depend on `sheet`; a no-op when the cache is off."""
+    cache = get_llm_cache()
+    return cache.invalidate_sheet(sheet) if cache else 0
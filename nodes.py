@@ -1,11 +1,16 @@
 from state import State
-from llm import llm_with_tools, llm
-from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from llm import get_llm, get_llm_with_tools
+from router import router, parse_stages, route_from_tools, routing_mode
+from context import build_context
+from workflow import COMPILED_STAGES, run_stages, summarize
+from telemetry import logger, metrics
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.runnables import RunnableConfig
 from typing import List
 
 import datetime
 
-def generate_invoice_worker(state: dict) -> dict:
+async def generate_invoice_worker(state: dict) -> dict:
     
     today = str(datetime.date.today())
 
@@ -13,76 +18,36 @@ def generate_invoice_worker(state: dict) -> dict:
 You are an invoice generation assistant. Your job is to create a monthly invoice using data in an Excel timesheet file.
 
 You can use these tools:
-- read_invoice_data: to read timesheet rows (date, status, remarks). The filename of the timesheet will usually be timesheet_<month>.xlsx
-- create_invoice_document: to save the final invoice to a .docx file. The format for using the create_invoice_document tool is: 
+- generate_invoice: computes the invoice from the timesheet and saves it to a .docx file in one step. The format for using the generate_invoice tool is:
     {
-        "filename": "invoice_<current month>", 
-        "data": "<generated invoice dictionary>"
+        "timesheet_filename": "timesheet_<month>.xlsx",
+        "invoice_filename": "invoice_<month>.docx",
+        "carried_forward_leaves": <accumulated remaining leaves, if provided>
     }
+- read_invoice_data: to read timesheet rows (date, status, remarks), only if the user asks about the data itself.
+- get_leave_balance: to report leave balances for a 'month' ('YYYY-MM') or a whole 'year', if the user asks about leaves.
 
 Task Instructions:
-1. Use read_invoice_data to get the timesheet data from the Excel file.
-2. From the data:
-   - Count the number of days with Status = 'P' (Present)
-   - 'L' (Leave) days are not counted.
-   - 'WO' (Work from Office) days are not counted.
-   - 'H' (Holiday) days are not counted.
-   - 'HL' (Half Day Leave) days are counted but the per-day cost is halved.
-   - A total of 2 leaves are available per month. Any remaining leaves are carried forward for the next month.
-   - The accumulated remaining leaves are provided. If not, consider the remaining leaves as 0.
-3. Assume the per-day cost is ₹1036.8571.
-4. Generate the invoice in the following dictionary format:
+1. Call generate_invoice once with the timesheet for the requested month. The filename of the timesheet will usually be timesheet_<month>.xlsx
+2. The tool does all the counting, leave carry-forward and totals. Do not compute or change any amounts yourself.
+3. If the user provides the accumulated remaining leaves, pass them as carried_forward_leaves. If not, leave it out; the tool takes them from the leave ledger built from all timesheets.
+4. Report the total and the saved filename from the tool's output back to the user.
 
-    {
-        "name": "NAME: PRAVEN KUMAR D",
-        "date": "Date: <current date>",
-        "bill_to": [
-            "PROD SOFTWARE INDIA PRIVATE LIMITED",
-            "Kalyani Platina, Ground Floor, Block I, No 24",
-            "EPIP Zone Phase II, Whitefield",
-            "Bangalore, Karnataka, 560 066"
-        ],
-        "salary_description": 'Salary for the month of "<current month> <current year>" payroll',
-        "details": [
-            "Employee Number: 50391",
-            "Department: R&D",
-            "Month: <the month of invoice>",
-            "Working Days: <number of P days>",
-            "Cumulative Leaves Taken: <number of A days> days",
-            "Balance Leaves: <number of remaining leaves> days"
-        ],
-        "total": "<computed total>/-",
-        "total_words": "Rs. <computed total in words>"
-    }
-
-5. Save the invoice using create_invoice_document with:
-   - filename: invoice_<month>.docx
-   - data: the generated dictionary (no extra info)
-
-Only call tools as needed. Do not include any additional commentary or explanation in the invoice file. Don't ask the user for any additional information or clarification. Just generate the invoice based on the information provided.
+Only call tools as needed. Don't ask the user for any additional information or clarification. Just generate the invoice based on the information provided.
 If month not specified, use today's date to find the month.
 """ + f"\n\nFor your information, today's date is {today}."
 
 
-    messages = state.get("messages", [])
-    found = False
-
-    for i, m in enumerate(messages):
-        if isinstance(m, SystemMessage):
-            messages[i] = SystemMessage(content=system_message)
-            found = True
-    if not found:
-        messages.insert(0, SystemMessage(content=system_message))
-
-    # print("Messages after system prompt injection:", messages)
-    response = llm_with_tools.invoke(messages)
-    # print("Response from LLM:", response)
+    # Only a bounded window of the conversation goes to the model
+    prompt, update = build_context(state, system_message)
+    response = await get_llm_with_tools().ainvoke(prompt)
 
     return {
-        "messages": messages + [response]
+        **update,
+        "messages": update["messages"] + [response]
     }
 
-def attendance_worker(state: dict) -> dict:
+async def attendance_worker(state: dict) -> dict:
     """
     Worker node for managing timesheet entries. It can read, add, or update
     entries based on user requests by using the appropriate tools.
@@ -93,7 +58,8 @@ def attendance_worker(state: dict) -> dict:
 You are a meticulous timesheet management assistant. Your job is to view, add, or update entries in an Excel timesheet file based on user requests.
 
 You have these tools:
-- `read_invoice_data`: To read the entire contents of a timesheet. Use this to check the current data before making changes. The filename will usually be in the format `timesheet_<month>.xlsx`.
+- `read_invoice_data`: To read the contents of a timesheet. Use this to check the current data before making changes. The filename will usually be in the format `timesheet_<month>.xlsx`.
+    Only read what you need: pass `date` for a single day, `start_date`/`end_date` for a range, `week` (e.g. '2025-W30') for a week, `status` to filter by status codes, and `summary: true` for counts instead of rows.
 - `save_or_update_timesheet`: To add a new entry or update an existing one for a specific date. The filename will usually be in the format `timesheet_<month>.xlsx`. The date must be in 'YYYY-MM-DD' format, and the status can be 'P' (Present), 'A' (Absent), 'L' (Leave), 'WO' (Week Off), 'H' (Holiday), or 'HL' (Half Day Leave). Remarks are optional.
     The format for using the save_or_update_timesheet tool is:
     {
@@ -102,17 +68,31 @@ You have these tools:
     "status": "<status>",
     "remarks": "<remarks if any>"
     }
-- `save_or_update_timesheet_entry`can be called any number of times to add or update entries in the timesheet if multiple dates are provided in the request.
+- `save_or_update_timesheet_bulk`: To add or update several dates in ONE call. Use it whenever the request covers more than one date.
+    Pass either a list of entries or a date range with a default status (weekends in a range are skipped unless `include_weekends` is true):
+    {
+    "filename": "timesheet_<month>.xlsx",
+    "entries": [{"date": "<date>", "status": "<status>", "remarks": "<remarks if any>"}, ...]
+    }
+    or
+    {
+    "filename": "timesheet_<month>.xlsx",
+    "start_date": "<first date>",
+    "end_date": "<last date>",
+    "status": "<status>",
+    "remarks": "<remarks if any>"
+    }
 
 Your Instructions:
 
 1. For Read/View Requests: If the user wants to see their attendance or get a summary, use the `read_invoice_data` tool and present the information clearly.
-    If the user asks for a specific date, ensure to read the timesheet for that date and present the status and remarks clearly for that date alone.
-    If the user asks for the week's report, present the status and remarks for each day of that week and summarize the week.
+    If the user asks for a specific date, read the timesheet with `date` set and present the status and remarks clearly for that date alone.
+    If the user asks for the week's report, read the timesheet with `week` or a date range, present the status and remarks for each day of that week and summarize the week.
+    If the user only wants counts or an overview, use `summary: true` instead of reading every row.
 
 2. For Add/Update Requests: If the user asks to log time or change an entry (e.g., "Mark July 26th as P (Present)"), you must follow this two-step process:
-    a. First, call `read_invoice_data` to get the current state of the timesheet. And handle any overlapping dates or existing entries appropriately. No 2 entries should exist for the same date.
-    b. Then, call `save_or_update_timesheet_entry` with the correct `filename`, `date`, `status`, and `remarks`.
+    a. First, call `read_invoice_data` for just the dates being changed (with `date` or a range) to get the current state of the timesheet. And handle any overlapping dates or existing entries appropriately. No 2 entries should exist for the same date.
+    b. Then, call `save_or_update_timesheet` with the correct `filename`, `date`, `status`, and `remarks` for a single date, or `save_or_update_timesheet_bulk` once for multiple dates.
     c. `remarks` should only be 3 to 5 word summary of the work done that day (if any)
     d. Even if status is not explicitly mentioned, infer it from context.
 
@@ -120,23 +100,22 @@ Your Instructions:
 4. Confirm your actions back to the user based on the tool's output. Also display the information that was entered or updated in the timesheet.
 """ + f"\n\nFor your information, today's date is {today}."
 
-    messages = state.get("messages", [])
-
-    # Inject or replace system prompt
-    found = False
-    messages = [SystemMessage(content=system_message)] + [
-        m for m in messages if not isinstance(m, SystemMessage)
-    ]
+    if state.get("plan"):
+        system_message += (
+            "\n\nOnly handle the timesheet part of the request. The remaining steps "
+            f"({', '.join(state['plan'])}) run automatically after you."
+        )
 
-    # print("Messages after system prompt injection:", messages)
-    response = llm_with_tools.invoke(messages)
-    # print("Response from LLM:", response)
+    # Only a bounded window of the conversation goes to the model
+    prompt, update = build_context(state, system_message)
+    response = await get_llm_with_tools().ainvoke(prompt)
 
     return {
-        "messages": messages + [response]
+        **update,
+        "messages": update["messages"] + [response]
     }
 
-def email_worker(state: dict) -> dict:
+async def email_worker(state: dict) -> dict:
     """
     A worker node that sends an email with the timesheet and invoice attachments.
     It infers the filenames from the context and calls the email tool.
@@ -148,7 +127,8 @@ def email_worker(state: dict) -> dict:
 You are an email sending assistant. Your only job is to send an email with a timesheet and an invoice file attached.
 
 You must use this tool:
-- `send_email_with_attachments`: Sends an email with the required XLSX and DOCX files.
+- `send_email_with_attachments`: Queues an email with the required XLSX and DOCX files; it is sent in the background.
+- `check_email_status`: Checks whether a queued email job has been sent, only if the user asks.
 - The format for using the send_email_with_attachments tool is:
         {
             "xlsx_filename": "timesheet_<month>.xlsx",
@@ -164,47 +144,46 @@ Your Task Instructions:
     - For example, if the user asks to send the documents for July, you must use `timesheet_july.xlsx` and `invoice_july.docx`.
 3.  If the user provides a specific email address, use it. Otherwise, the tool will use a default address.
 4.  Do not ask for confirmation. Call the tool directly with the inferred filenames.
-5.  After the tool is called, confirm to the user that the email has been sent.
+5.  After the tool is called, confirm to the user that the email has been queued for sending, with its job number.
 6. Do not ask the user for any additional information or clarification. Just send the email with the files for the specified month. The names of the files should be inferred from the context or today's date.
 """ + f"\n\nFor your information, today's date is {today}."
 
-    # --- Inject the system prompt into the message history ---
-    messages = state.get("messages", [])
-    found = False
-    
-    # Replace the existing system message with the new one for this task
-    for i, m in enumerate(messages):
-        if isinstance(m, SystemMessage):
-            messages[i] = SystemMessage(content=system_message)
-            found = True
-            break # Stop after finding the first one
-            
-    if not found:
-        messages.insert(0, SystemMessage(content=system_message))
-
-    # print("Messages after email system prompt injection:", messages)
-    
-    # --- Invoke the LLM with the right instructions ---
-    response = llm_with_tools.invoke(messages)
-    # print("Response from LLM (email_worker):", response)
+    # --- Invoke the LLM with the right instructions and a bounded window of history ---
+    prompt, update = build_context(state, system_message)
+    response = await get_llm_with_tools().ainvoke(prompt)
 
     return {
-        "messages": messages + [response]
+        **update,
+        "messages": update["messages"] + [response]
     }
 
-def route_task(state: State) -> State:
-    print("🔀 Routing...")
+def _routed(source: str, choice: str, update: State) -> State:
+    metrics.inc("invoice_routes_total", 1, "Routing decisions", source=source, next=update["next"])
+    logger.debug("route", extra={"fields": {"source": source, "choice": choice, "next": update["next"]}})
+    return update
 
+async def route_task(state: State, config: RunnableConfig = None) -> State:
     messages: List = state["messages"]
 
     # Get latest user message
     last_user_msg = next((m for m in reversed(messages) if isinstance(m, HumanMessage)), None)
     if last_user_msg is None:
-        messages.append(AIMessage(content="❌ No user message found to route."))
-        return {"messages": messages}
+        return {"messages": [AIMessage(content="❌ No user message found to route.")], "next": "END"}
 
     user_input = last_user_msg.content
 
+    thread_id = ((config or {}).get("configurable") or {}).get("thread_id")
+    mode = routing_mode(thread_id)
+
+    # Obvious or repeated requests are routed locally, without a model call
+    choice = router.fast_route(user_input, mode)
+    if choice is not None:
+        return _routed("local", choice, _apply_route(choice))
+
+    if mode == "single":
+        # One call with every tool bound picks the task by the tools it uses; no classifier call
+        return _routed("single", "", {"next": "unified_worker", "plan": []})
+
     # Routing prompt
     system_prompt = f"""
 You are a routing assistant. Your task is to categorize the user's message.
@@ -214,28 +193,94 @@ Decide if the message is about:
 - email sending (e.g., "send an email to my manager")
 
 Reply with only one word: "attendance", "invoice", "email", or "unknown".
+If the message asks for several of these, reply with them in the order they should run, separated by commas (e.g. "attendance, invoice, email").
 
 User Message: "{user_input}"
 """
     
     # Get response from LLM
-    response = llm.invoke(system_prompt)
+    router.record_llm_call()
+    response = await get_llm().ainvoke(system_prompt)
     choice = response.content.strip().lower()
-    print(f"🔍 Router chose: {choice}")
+    router.remember(user_input, choice, mode)
+
+    return _routed("llm", choice, _apply_route(choice))
+
+# Stages that are run by a model-driven worker; the others are compiled (see workflow.py).
+STAGE_WORKERS = {"attendance": "attendance_worker"}
+
+def _apply_route(choice: str) -> State:
+    # The route lives in `next`; nothing is added to the message history
+    stages = parse_stages(choice)
+    if len(stages) > 1:
+        # A workflow: the stages after the first run back to back without routing again.
+        first = STAGE_WORKERS.get(stages[0], "workflow")
+        plan = stages[1:] if first != "workflow" else stages
+        return {"next": first, "plan": plan, "results": {}}
 
-    # Inject a system message based on routing
     if "invoice" in choice:
-        messages.append(SystemMessage(content="[ROUTE] invoice"))
-        return {"messages": messages, "next": "generate_invoice_worker"}
+        return {"next": "generate_invoice_worker", "plan": []}
     
     elif "attendance" in choice:
-        messages.append(SystemMessage(content="[ROUTE] attendance"))
-        return {"messages": messages, "next": "attendance_worker"}
+        return {"next": "attendance_worker", "plan": []}
     
     elif "email" in choice:
-        messages.append(SystemMessage(content="[ROUTE] email"))
-        return {"messages": messages, "next": "email_worker"}
+        return {"next": "email_worker", "plan": []}
     
     else:
-        messages.append(AIMessage(content="🤖 I can help with attendance logging, invoice generation, and sending emails. How can I assist you?"))
-        return {"messages": messages}
\ No newline at end of file
+        return {
+            "messages": [AIMessage(content="🤖 I can help with attendance logging, invoice generation, and sending emails. How can I assist you?")],
+            "next": "END",
+            "plan": [],
+        }
+
+async def unified_worker(state: State) -> State:
+    """
+    Single-call routing: one model call with every tool bound and a merged
+    prompt both picks the task and makes its first tool calls. The worker
+    for that task (derived from the tools called) takes over the tool loop.
+    """
+    today = str(datetime.date.today())
+
+    system_message = """
+You are an assistant for timesheets, invoices and emails. Handle the user's request with the tools:
+- Attendance: `read_invoice_data` to read `timesheet_<month>.xlsx` (narrow it with `date`, `start_date`/`end_date`, `week`, `status` or `summary`); `save_or_update_timesheet` for one date or `save_or_update_timesheet_bulk` for several. Dates are 'YYYY-MM-DD'; statuses are P, A, L, WO, H, HL; remarks are a 3 to 5 word summary of the work done. Read the dates being changed before saving them.
+- Invoice: `generate_invoice` with `timesheet_<month>.xlsx` (and `invoice_<month>.docx`); it does all the arithmetic. Pass `carried_forward_leaves` only if the user gives them. `get_leave_balance` for leave questions.
+- Email: `send_email_with_attachments` with `timesheet_<month>.xlsx` and `invoice_<month>.docx` (and `to_email` if given); `check_email_status` with a job id.
+Infer filenames and the month from the request or today's date. Do not ask for clarification; call the tools directly.
+If the request is none of these, reply briefly that you can help with attendance logging, invoice generation and sending emails.
+""" + f"\n\nFor your information, today's date is {today}."
+
+    prompt, update = build_context(state, system_message)
+    response = await get_llm_with_tools().ainvoke(prompt)
+
+    route = route_from_tools(response.tool_calls)
+    if route:
+        last_user_msg = next((m for m in reversed(state["messages"]) if isinstance(m, HumanMessage)), None)
+        if last_user_msg is not None:
+            router.remember(last_user_msg.content, route, "single")
+    return {
+        **update,
+        "messages": update["messages"] + [response],
+        "next": _apply_route(route)["next"] if route else "END",
+    }
+
+async def workflow_stage(state: State, config: RunnableConfig) -> State:
+    """
+    Runs the planned stages that need no model (invoice, email) back to back,
+    passing results between them through the state. Stops at the next stage
+    that needs a worker, if any.
+    """
+    plan = list(state.get("plan") or [])
+    stages = []
+    while plan and plan[0] in COMPILED_STAGES:
+        stages.append(plan.pop(0))
+
+    last_user_msg = next((m for m in reversed(state["messages"]) if isinstance(m, HumanMessage)), None)
+    results = await run_stages(stages, last_user_msg.content if last_user_msg else "", state.get("results"), config)
+
+    update = {"plan": plan[1:], "results": results, "next": STAGE_WORKERS[plan[0]] if plan else "END"}
+    report = summarize(stages, results)
+    if report:
+        update["messages"] = [AIMessage(content=report)]
+    return update
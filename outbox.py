@@ -0,0 +1,411 @@
+import os
+import json
+import time
+import base64
+import random
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, List, Optional
+
+import httpx
+from sendgrid.helpers.mail import (
+    Mail, Email, To, Content,
+    Attachment, FileContent, FileName, FileType, Disposition
+)
+
+OUTBOX_DB = os.getenv("OUTBOX_DB", "outbox.db")
+MAIL_API_HOST = os.getenv("MAIL_API_HOST", "https://api.sendgrid.com")
+RATE_PER_SECOND = float(os.getenv("OUTBOX_RATE_PER_SEC", "5"))
+MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "50"))
+BACKOFF_BASE_SECONDS = 2.0
+BACKOFF_MAX_SECONDS = 300.0
+# A claimed job whose sender has not reported back within this time is queued again.
+CLAIM_LEASE_SECONDS = float(os.getenv("OUTBOX_CLAIM_LEASE_SECONDS", "120"))
+
+MIME_TYPES = {
+    ".xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    ".docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id           INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at   REAL NOT NULL,
+    status       TEXT NOT NULL DEFAULT 'queued',
+    attempts     INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL,
+    from_email   TEXT NOT NULL,
+    to_email     TEXT NOT NULL,
+    subject      TEXT NOT NULL,
+    body         TEXT NOT NULL,
+    attachments  TEXT NOT NULL,
+    last_error   TEXT,
+    sent_at      REAL,
+    claimed_at   REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_due ON jobs (status, next_attempt);
+CREATE TABLE IF NOT EXISTS attachments (
+    digest TEXT PRIMARY KEY,
+    data   BLOB NOT NULL
+);
+"""
+
+
+class TransientSendError(Exception):
+    """A failure worth retrying (network error, 429, 5xx)."""
+
+
+# --- Transports ---
+
+class HttpTransport:
+    """Posts SendGrid v3 payloads over one pooled keep-alive HTTP client."""
+
+    def __init__(self, api_key: str, host: str = MAIL_API_HOST, timeout: float = 30.0):
+        self._client = httpx.Client(
+            base_url=host,
+            headers={"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"},
+            timeout=timeout,
+        )
+
+    def send(self, payload: dict) -> int:
+        try:
+            response = self._client.post("/v3/mail/send", content=json.dumps(payload))
+        except httpx.HTTPError as e:
+            raise TransientSendError(str(e)) from e
+        if response.status_code == 429 or response.status_code >= 500:
+            raise TransientSendError(f"mail API responded with status {response.status_code}")
+        if response.status_code >= 300:
+            raise ValueError(f"mail API responded with status {response.status_code}: {response.text[:200]}")
+        return response.status_code
+
+    def close(self) -> None:
+        self._client.close()
+
+
+class LocalMailServer:
+    """
+    Stand-in for the mail API on 127.0.0.1 for offline runs. Accepts POST
+    /v3/mail/send, records the payloads and can fail the first `fail_first`
+    requests with `fail_status`.
+    """
+
+    def __init__(self, port: int = 0, fail_first: int = 0, fail_status: int = 503):
+        self.received: List[dict] = []
+        self.fail_first = fail_first
+        self.fail_status = fail_status
+        outer = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if outer.fail_first > 0:
+                    outer.fail_first -= 1
+                    status = outer.fail_status
+                else:
+                    outer.received.append(json.loads(body))
+                    status = 202
+                self.send_response(status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}"
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+# --- Attachments ---
+
+class AttachmentCache:
+    """Base64-encoded attachments keyed by content hash, least recently used evicted first."""
+
+    def __init__(self, max_entries: int = 32):
+        self.max_entries = max_entries
+        self._encoded = OrderedDict()  # sha256 -> base64 text
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def encoded(self, digest: str, load: Callable[[str], bytes]) -> str:
+        with self._lock:
+            if digest in self._encoded:
+                self._encoded.move_to_end(digest)
+                self.hits += 1
+                return self._encoded[digest]
+        text = base64.b64encode(load(digest)).decode()
+        with self._lock:
+            self.misses += 1
+            self._encoded[digest] = text
+            while len(self._encoded) > self.max_entries:
+                self._encoded.popitem(last=False)
+        return text
+
+
+def _read_files(paths: List[str]) -> List[tuple]:
+    """(file name, sha256, bytes) for each path."""
+    files = []
+    for path in paths:
+        with open(path, "rb") as f:
+            data = f.read()
+        files.append((os.path.basename(path), hashlib.sha256(data).hexdigest(), data))
+    return files
+
+
+# --- Outbox ---
+
+class Outbox:
+    """
+    Durable email queue. `enqueue` stores the job in SQLite and returns at once;
+    a background worker sends due jobs through the transport with rate
+    limiting, exponential backoff on transient failures, and one request per
+    group of jobs that share sender, subject, body and attachments.
+    Attachments are copied into the database when the job is queued, so a
+    retry sends the files as they were at that moment.
+    """
+
+    def __init__(
+        self,
+        transport,
+        db_path: str = OUTBOX_DB,
+        rate_per_second: float = RATE_PER_SECOND,
+        max_attempts: int = MAX_ATTEMPTS,
+        batch_size: int = BATCH_SIZE,
+    ):
+        self.transport = transport
+        self.rate_per_second = rate_per_second
+        self.max_attempts = max_attempts
+        self.batch_size = batch_size
+        self.attachments = AttachmentCache()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._next_send_at = 0.0
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._worker = threading.Thread(target=self._run, name="outbox", daemon=True)
+        self._worker.start()
+
+    def enqueue(self, from_email: str, to_email: str, subject: str, body: str, attachments: List[str]) -> int:
+        now = time.time()
+        files = _read_files(attachments)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO attachments (digest, data) VALUES (?, ?)",
+                    [(digest, data) for _, digest, data in files],
+                )
+                job_id = self._conn.execute(
+                    "INSERT INTO jobs (created_at, next_attempt, from_email, to_email, subject, body, attachments) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (now, now, from_email, to_email, subject, body, json.dumps([[name, digest] for name, digest, _ in files])),
+                ).lastrowid
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        self._wake.set()
+        return job_id
+
+    def status(self, job_id: int) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, status, attempts, to_email, last_error, sent_at FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(["id", "status", "attempts", "to_email", "last_error", "sent_at"], row))
+
+    def pending(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'sending')").fetchone()[0]
+
+    def flush(self, timeout: float = 30.0) -> bool:
+        """Waits until no job is due right now. Returns False on timeout."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._lock:
+                due = self._conn.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'sending') AND next_attempt <= ?",
+                    (time.time(),),
+                ).fetchone()[0]
+            if not due:
+                return True
+            self._wake.set()
+            time.sleep(0.02)
+        return False
+
+    def close(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        self._worker.join(timeout=5)
+
+    # --- Worker ---
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            jobs = self._claim_due()
+            if not jobs:
+                self._wake.wait(timeout=self._seconds_until_next_due())
+                self._wake.clear()
+                continue
+            groups = OrderedDict()
+            for job in jobs:
+                groups.setdefault((job["from_email"], job["subject"], job["body"], job["attachments"]), []).append(job)
+            for group in groups.values():
+                self._throttle()
+                self._send_group(group)
+
+    def _claim_due(self) -> List[dict]:
+        """
+        Claims up to a batch of due jobs. Each claim is a conditional UPDATE, so
+        when several processes share the database only one of them gets a job.
+        """
+        columns = ["id", "attempts", "from_email", "to_email", "subject", "body", "attachments"]
+        now = time.time()
+        claimed = []
+        with self._lock:
+            # Jobs left mid-send by a crashed or restarted sender go back on the queue.
+            self._conn.execute(
+                "UPDATE jobs SET status = 'queued' WHERE status = 'sending' AND COALESCE(claimed_at, 0) < ?",
+                (now - CLAIM_LEASE_SECONDS,),
+            )
+            rows = self._conn.execute(
+                f"SELECT {', '.join(columns)} FROM jobs WHERE status = 'queued' AND next_attempt <= ? "
+                "ORDER BY id LIMIT ?",
+                (now, self.batch_size),
+            ).fetchall()
+            for row in rows:
+                cursor = self._conn.execute(
+                    "UPDATE jobs SET status = 'sending', claimed_at = ? WHERE id = ? AND status = 'queued'", (now, row[0])
+                )
+                if cursor.rowcount == 1:
+                    claimed.append(dict(zip(columns, row)))
+        return claimed
+
+    def _seconds_until_next_due(self) -> float:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MIN(due) FROM (SELECT next_attempt AS due FROM jobs WHERE status = 'queued' "
+                "UNION ALL SELECT claimed_at + ? FROM jobs WHERE status = 'sending')",
+                (CLAIM_LEASE_SECONDS,),
+            ).fetchone()
+        return 60.0 if row[0] is None else max(0.0, min(60.0, row[0] - time.time()))
+
+    def _attachment(self, digest: str) -> bytes:
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM attachments WHERE digest = ?", (digest,)).fetchone()
+        if row is None:
+            raise ValueError(f"attachment {digest[:12]} is missing from the outbox")
+        return row[0]
+
+    def _throttle(self) -> None:
+        if self.rate_per_second <= 0:
+            return
+        wait = self._next_send_at - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        self._next_send_at = max(self._next_send_at, time.monotonic()) + 1.0 / self.rate_per_second
+
+    def _payload(self, group: List[dict]) -> dict:
+        first = group[0]
+        message = Mail(
+            from_email=Email(first["from_email"]),
+            to_emails=[To(job["to_email"]) for job in group],
+            subject=first["subject"],
+            plain_text_content=Content("text/plain", first["body"]),
+            is_multiple=True,
+        )
+        message.attachment = [
+            Attachment(
+                FileContent(self.attachments.encoded(digest, self._attachment)),
+                FileName(name),
+                FileType(MIME_TYPES.get(os.path.splitext(name)[1], "application/octet-stream")),
+                Disposition("attachment"),
+            )
+            for name, digest in json.loads(first["attachments"])
+        ]
+        return message.get()
+
+    def _prune_attachments(self) -> None:
+        """Drops attachment copies that no unsent job refers to. Call with the lock held."""
+        self._conn.execute(
+            "DELETE FROM attachments WHERE digest NOT IN ("
+            "SELECT json_extract(file.value, '$[1]') FROM jobs, json_each(jobs.attachments) AS file "
+            "WHERE jobs.status IN ('queued', 'sending'))"
+        )
+
+    def _send_group(self, group: List[dict]) -> None:
+        try:
+            self.transport.send(self._payload(group))
+        except TransientSendError as e:
+            with self._lock:
+                gave_up = False
+                for job in group:
+                    attempts = job["attempts"] + 1
+                    if attempts >= self.max_attempts:
+                        self._conn.execute(
+                            "UPDATE jobs SET status = 'failed', attempts = ?, last_error = ? WHERE id = ?",
+                            (attempts, str(e), job["id"]),
+                        )
+                        gave_up = True
+                        continue
+                    delay = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** (attempts - 1))
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'queued', attempts = ?, next_attempt = ?, last_error = ? WHERE id = ?",
+                        (attempts, time.time() + delay * random.uniform(0.5, 1.0), str(e), job["id"]),
+                    )
+                if gave_up:
+                    self._prune_attachments()
+            return
+        except Exception as e:
+            if len(group) > 1:
+                # One bad address rejects the whole request; send one by one so only that job fails.
+                for job in group:
+                    self._throttle()
+                    self._send_group([job])
+                return
+            with self._lock:
+                self._conn.executemany(
+                    "UPDATE jobs SET status = 'failed', attempts = attempts + 1, last_error = ? WHERE id = ?",
+                    [(str(e), job["id"]) for job in group],
+                )
+                self._prune_attachments()
+            return
+        sent_at = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE jobs SET status = 'sent', attempts = attempts + 1, sent_at = ?, last_error = NULL WHERE id = ?",
+                [(sent_at, job["id"]) for job in group],
+            )
+            self._prune_attachments()
+
+
+_outbox = None
+_outbox_lock = threading.Lock()
+
+
+def get_outbox() -> Outbox:
+    """Returns the process-wide outbox, starting its worker on first use (app.py starts it at launch)."""
+    global _outbox
+    with _outbox_lock:
+        if _outbox is None:
+            _outbox = Outbox(HttpTransport(os.getenv("SENDGRID_API_KEY", ""), os.getenv("MAIL_API_HOST", MAIL_API_HOST)))
+        return _outbox
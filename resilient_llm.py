@@ -0,0 +1,443 @@
+"""
+Deadline-bounded, hedged model calls.
+
+`ResilientModel` wraps a chat model (or a model with tools bound) for the graph
+nodes. Every call gets a deadline picked by the calling node. If the first
+request is still running after the model's recent latency percentile, a
+duplicate is sent and whichever answers first wins; the other is cancelled.
+Transient errors are retried within the deadline. On timeout or repeated
+failure the call falls back to a second model (pro_llm -> llm) for whatever
+is left of the deadline, and a per-model circuit breaker sends calls straight to the fallback while the
+primary keeps failing.
+
+    python resilient_llm.py --calls 200 --slow-rate 0.02    # p50/p99 against a local fake server
+"""
+import os
+import json
+import time
+import random
+import asyncio
+import argparse
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+from langchain_core.callbacks import BaseCallbackManager
+from langchain_core.runnables import Runnable, RunnableConfig, ensure_config
+
+from telemetry import metrics, logger
+
+LLM_DEADLINE = float(os.getenv("LLM_DEADLINE", "30"))
+# Per-node overrides, e.g. "route_task=5,attendance_worker=30".
+LLM_DEADLINES = os.getenv("LLM_DEADLINES", "route_task=8")
+LLM_HEDGE = os.getenv("LLM_HEDGE", "on").lower() not in ("off", "0", "false")
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+LLM_HEDGE_DELAY = float(os.getenv("LLM_HEDGE_DELAY", "3.0"))  # until enough latencies are known
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "0.2"))
+LLM_RETRIES = int(os.getenv("LLM_RETRIES", "1"))
+# Share of the deadline the primary gets when there is a fallback to leave time for.
+LLM_PRIMARY_SHARE = float(os.getenv("LLM_PRIMARY_SHARE", "0.7"))
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+LATENCY_WINDOW = 200
+MIN_SAMPLES = 20
+
+_TRANSIENT_ERRORS = {"APIConnectionError", "APITimeoutError", "ConnectError", "ReadTimeout", "RemoteProtocolError"}
+
+
+class CircuitOpenError(Exception):
+    """The model's circuit breaker is open and there is no fallback."""
+
+
+def parse_deadlines(spec: str) -> Dict[str, float]:
+    deadlines = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        node, _, seconds = item.partition("=")
+        deadlines[node.strip()] = float(seconds)
+    return deadlines
+
+
+def _transient(error: Exception) -> bool:
+    status = getattr(error, "status_code", None)
+    return status == 429 or (status or 0) >= 500 or type(error).__name__ in _TRANSIENT_ERRORS
+
+
+def _without_streaming(config: RunnableConfig) -> RunnableConfig:
+    """The config minus the graph's token-streaming handler, so a hedged duplicate does not stream twice."""
+    callbacks = config.get("callbacks")
+    is_streamer = lambda h: type(h).__name__ == "StreamMessagesHandler"
+    if isinstance(callbacks, BaseCallbackManager):
+        callbacks = callbacks.copy()
+        for handler in [h for h in callbacks.handlers if is_streamer(h)]:
+            callbacks.remove_handler(handler)
+    elif callbacks:
+        callbacks = [h for h in callbacks if not is_streamer(h)]
+    return {**config, "callbacks": callbacks}
+
+
+# --- Per-model state ---
+
+class LatencyTracker:
+    """Recent successful call latencies of one model."""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, p: float) -> Optional[float]:
+        with self._lock:
+            if len(self._samples) < MIN_SAMPLES:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+class CircuitBreaker:
+    """
+    Opens after `failures` consecutive failed calls; while open, calls are
+    refused for `cooldown` seconds, then a single trial call is let through.
+    """
+
+    def __init__(self, failures: int = LLM_BREAKER_FAILURES, cooldown: float = LLM_BREAKER_COOLDOWN):
+        self.failures = failures
+        self.cooldown = cooldown
+        self._consecutive = 0
+        self._opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            return "half-open" if time.monotonic() - self._opened_at >= self.cooldown else "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at >= self.cooldown and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def release(self) -> None:
+        """Gives back a trial call that ended without a verdict (it was cancelled)."""
+        with self._lock:
+            self._trial = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._consecutive = 0
+            self._opened_at = None
+            self._trial = False
+
+    def record_failure(self) -> bool:
+        """Returns True if this failure opened the breaker."""
+        with self._lock:
+            self._consecutive += 1
+            self._trial = False
+            if self._consecutive >= self.failures and (self._opened_at is None or time.monotonic() - self._opened_at >= self.cooldown):
+                self._opened_at = time.monotonic()
+                return True
+            return False
+
+
+_trackers: Dict[str, LatencyTracker] = {}
+_breakers: Dict[str, CircuitBreaker] = {}
+_state_lock = threading.Lock()
+
+
+def tracker_for(model: str) -> LatencyTracker:
+    with _state_lock:
+        return _trackers.setdefault(model, LatencyTracker())
+
+
+def breaker_for(model: str) -> CircuitBreaker:
+    with _state_lock:
+        return _breakers.setdefault(model, CircuitBreaker())
+
+
+# --- Wrapper ---
+
+class ResilientModel(Runnable):
+    """
+    Runs `primary` under a per-node deadline with hedging and retries, falling
+    back to `fallback` on timeout, on failure or while the primary's breaker is open.
+    """
+
+    def __init__(
+        self,
+        primary,
+        name: str,
+        fallback=None,
+        fallback_name: str = None,
+        deadlines: Dict[str, float] = None,
+        default_deadline: float = LLM_DEADLINE,
+        hedge: bool = LLM_HEDGE,
+        hedge_percentile: float = LLM_HEDGE_PERCENTILE,
+        retries: int = LLM_RETRIES,
+    ):
+        self.primary = primary
+        self.model = name
+        self.fallback = fallback
+        self.fallback_model = fallback_name or f"{name}:fallback"
+        self.deadlines = parse_deadlines(LLM_DEADLINES) if deadlines is None else deadlines
+        self.default_deadline = default_deadline
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.retries = retries
+
+    def deadline_for(self, node: Optional[str]) -> float:
+        return self.deadlines.get(node, self.default_deadline)
+
+    def hedge_delay(self, model: str) -> float:
+        observed = tracker_for(model).percentile(self.hedge_percentile)
+        return LLM_HEDGE_DELAY if observed is None else max(LLM_HEDGE_MIN_DELAY, observed)
+
+    def invoke(self, input, config: RunnableConfig = None, **kwargs):
+        # Synchronous callers go straight to the primary; hedging and fallback need the event loop.
+        return self.primary.invoke(input, config, **kwargs)
+
+    async def ainvoke(self, input, config: RunnableConfig = None, **kwargs):
+        config = ensure_config(config)
+        node = config.get("metadata", {}).get("langgraph_node") or "none"
+        deadline = self.deadline_for(node)
+        started = time.perf_counter()
+        primary_deadline = deadline if self.fallback is None else deadline * LLM_PRIMARY_SHARE
+        try:
+            if breaker_for(self.model).allow():
+                try:
+                    return await asyncio.wait_for(
+                        self._attempt(self.primary, self.model, input, config, kwargs), primary_deadline
+                    )
+                except asyncio.CancelledError:
+                    # The caller went away; let the next call have the half-open trial.
+                    breaker_for(self.model).release()
+                    raise
+                except Exception as e:
+                    opened = breaker_for(self.model).record_failure()
+                    reason = "timeout" if isinstance(e, asyncio.TimeoutError) else "error"
+                    metrics.inc("invoice_llm_failures_total", 1, "Model calls that timed out or failed", model=self.model, reason=reason)
+                    if opened:
+                        metrics.inc("invoice_llm_circuit_opened_total", 1, "Circuit breaker trips", model=self.model)
+                        logger.warning("circuit opened", extra={"fields": {"model": self.model}})
+                    if self.fallback is None:
+                        raise
+                    logger.warning("model fallback", extra={"fields": {"model": self.model, "node": node, "reason": reason}})
+            elif self.fallback is None:
+                raise CircuitOpenError(f"{self.model} is unavailable (circuit open)")
+            else:
+                reason = "circuit_open"
+
+            # The fallback only gets what the primary left of the node's deadline.
+            remaining = deadline - (time.perf_counter() - started)
+            if remaining <= 0:
+                raise asyncio.TimeoutError(f"{node} deadline of {deadline}s used up by {self.model}")
+            metrics.inc("invoice_llm_fallbacks_total", 1, "Calls served by the fallback model", model=self.model, reason=reason)
+            return await asyncio.wait_for(
+                self._attempt(self.fallback, self.fallback_model, input, config, kwargs), remaining
+            )
+        finally:
+            metrics.observe(
+                "invoice_llm_call_seconds", time.perf_counter() - started,
+                "Model call latency seen by graph nodes, including hedging and fallback", model=self.model, node=node,
+            )
+
+    async def _attempt(self, model, name: str, input, config, kwargs):
+        """Retries transient errors; each try is hedged."""
+        for attempt in range(self.retries + 1):
+            try:
+                result = await self._hedged(model, name, input, config, kwargs)
+                breaker_for(name).record_success()
+                return result
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if attempt == self.retries or not _transient(e):
+                    raise
+                metrics.inc("invoice_llm_retries_total", 1, "Retried model requests", model=name)
+                await asyncio.sleep(0.25 * 2 ** attempt)
+
+    async def _hedged(self, model, name: str, input, config, kwargs):
+        async def request(kind: str, request_config):
+            started = time.perf_counter()
+            try:
+                result = await model.ainvoke(input, request_config, **kwargs)
+            except asyncio.CancelledError:
+                metrics.observe("invoice_llm_request_seconds", time.perf_counter() - started,
+                                "Latency of individual model requests", model=name, request=kind, outcome="cancelled")
+                raise
+            except Exception:
+                metrics.observe("invoice_llm_request_seconds", time.perf_counter() - started,
+                                "Latency of individual model requests", model=name, request=kind, outcome="error")
+                raise
+            seconds = time.perf_counter() - started
+            tracker_for(name).add(seconds)
+            metrics.observe("invoice_llm_request_seconds", seconds,
+                            "Latency of individual model requests", model=name, request=kind, outcome="ok")
+            return kind, result
+
+        tasks = [asyncio.ensure_future(request("primary", config))]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_delay(name) if self.hedge else None)
+            if not done:
+                metrics.inc("invoice_llm_hedges_total", 1, "Hedged duplicate requests sent", model=name)
+                tasks.append(asyncio.ensure_future(request("hedge", _without_streaming(config))))
+
+            error = None
+            while tasks:
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    tasks.remove(task)
+                    if task.exception() is None:
+                        kind, result = task.result()
+                        metrics.inc("invoice_llm_wins_total", 1, "Which request answered first", model=name, request=kind)
+                        return result
+                    error = task.exception()
+            raise error
+        finally:
+            # The loser (or both, on deadline) is cancelled, which closes its HTTP request.
+            for task in tasks:
+                task.cancel()
+
+
+# --- Local fake endpoint ---
+
+class FakeOpenAIServer:
+    """
+    OpenAI-compatible chat completions endpoint on 127.0.0.1 for offline
+    latency tests. Answers POST .../chat/completions (plain or streamed) with
+    `reply` after `delay` seconds; a `slow_rate` share of the requests takes
+    `slow_delay` instead, and the first `fail_first` requests get `fail_status`.
+    """
+
+    def __init__(self, port: int = 0, reply: str = "attendance", delay: float = 0.01,
+                 slow_rate: float = 0.0, slow_delay: float = 2.0, fail_first: int = 0,
+                 fail_status: int = 503, seed: int = 0):
+        self.reply = reply
+        self.delay = delay
+        self.slow_rate = slow_rate
+        self.slow_delay = slow_delay
+        self.fail_first = fail_first
+        self.fail_status = fail_status
+        self.requests = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        outer = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                with outer._lock:
+                    outer.requests += 1
+                    fail = outer.fail_first > 0
+                    outer.fail_first -= int(fail)
+                    slow = outer._rng.random() < outer.slow_rate
+                if fail:
+                    self._send(outer.fail_status, {"error": {"message": "injected failure"}})
+                    return
+                time.sleep(outer.slow_delay if slow else outer.delay)
+                try:
+                    if body.get("stream"):
+                        self._stream(body.get("model", "fake"))
+                    else:
+                        self._send(200, outer.completion(body.get("model", "fake")))
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # the client cancelled (e.g. the losing hedge)
+
+            def _send(self, status, payload):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _stream(self, model):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                chunk = {"id": "fake", "object": "chat.completion.chunk", "created": int(time.time()), "model": model}
+                for delta, finish in (({"role": "assistant", "content": outer.reply}, None), ({}, "stop")):
+                    event = {**chunk, "choices": [{"index": 0, "delta": delta, "finish_reason": finish}]}
+                    self.wfile.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+                usage = {**chunk, "choices": [], "usage": {"prompt_tokens": 10, "completion_tokens": 1, "total_tokens": 11}}
+                self.wfile.write(f"data: {json.dumps(usage)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+                self.close_connection = True
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self._server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}/v1"
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def completion(self, model: str) -> dict:
+        return {
+            "id": "fake", "object": "chat.completion", "created": int(time.time()), "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": self.reply}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 1, "total_tokens": 11},
+        }
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+# --- Latency comparison ---
+
+def _percentiles(samples) -> str:
+    ordered = sorted(samples)
+    pick = lambda p: ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] * 1000
+    return f"p50 {pick(50):8.1f} ms  p95 {pick(95):8.1f} ms  p99 {pick(99):8.1f} ms  max {ordered[-1] * 1000:8.1f} ms"
+
+
+async def _run_calls(model, calls: int) -> list:
+    timings = []
+    for _ in range(calls):
+        started = time.perf_counter()
+        await model.ainvoke("Reply with one word.")
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Compare plain and hedged model calls against a fake server with injected delays.")
+    parser.add_argument("--calls", type=int, default=200, help="Sequential calls per run")
+    parser.add_argument("--delay", type=float, default=0.02, help="Normal response delay in seconds")
+    parser.add_argument("--slow-rate", type=float, default=0.02, help="Share of requests that are slow")
+    parser.add_argument("--slow-delay", type=float, default=1.0, help="Delay of a slow request in seconds")
+    args = parser.parse_args(argv)
+
+    from langchain_openai import ChatOpenAI
+
+    with FakeOpenAIServer(delay=args.delay, slow_rate=args.slow_rate, slow_delay=args.slow_delay) as server:
+        client = ChatOpenAI(model_name="fake", openai_api_key="fake", base_url=server.url, max_retries=0)
+        plain = asyncio.run(_run_calls(client, args.calls))
+        hedged_model = ResilientModel(client, name="fake", deadlines={}, default_deadline=max(5.0, args.slow_delay * 3))
+        asyncio.run(_run_calls(hedged_model, MIN_SAMPLES))  # learn the latency percentile first
+        hedged = asyncio.run(_run_calls(hedged_model, args.calls))
+        print(f"plain   {_percentiles(plain)}")
+        print(f"hedged  {_percentiles(hedged)}")
+        print(f"hedges sent: {metrics.value('invoice_llm_hedges_total', model='fake')}, "
+              f"server requests: {server.requests}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,173 @@
+import os
+import re
+import zlib
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+# Minimum score and share of the total score a category needs before the
+# rules are trusted without asking the model.
+MIN_SCORE = 2.0
+MIN_CONFIDENCE = 0.75
+MEMO_SIZE = 1024
+
+# "two_hop": a classifier call picks the worker, which then calls the tools.
+# "single": one call with every tool bound picks the task by the tools it calls.
+# "split": each conversation thread gets one of the two, for comparing them on live traffic.
+ROUTING_MODE = os.getenv("ROUTING_MODE", "two_hop").lower()
+
+# Which worker continues the tool loop after the single-call router used a tool.
+TOOL_ROUTES = {
+    "read_invoice_data": "attendance",
+    "save_or_update_timesheet": "attendance",
+    "save_or_update_timesheet_bulk": "attendance",
+    "generate_invoice": "invoice",
+    "create_invoice_document": "invoice",
+    "get_leave_balance": "invoice",
+    "send_email_with_attachments": "email",
+    "check_email_status": "email",
+}
+
+_RULES = {
+    "attendance": [
+        (re.compile(r"\b(mark|marked|log|logged|update|change)\b"), 1.0),
+        (re.compile(r"\b(present|absent|leaves?|holiday|week ?off|half[- ]day|attendance|timesheet)\b"), 2.0),
+        (re.compile(r"\b(worked on|working on|i did|i worked|today i)\b"), 2.0),
+        (re.compile(r"\b(log|mark)\b.*\b(today|yesterday)\b"), 1.0),
+    ],
+    "invoice": [
+        (re.compile(r"\binvoices?\b"), 2.0),
+        (re.compile(r"\b(bill|billing|payroll)\b"), 1.0),
+        (re.compile(r"\b(generate|create|make|prepare)\b"), 0.5),
+    ],
+    "email": [
+        (re.compile(r"\b(e-?mail|mail)\b"), 2.0),
+        (re.compile(r"\b(send|forward)\b"), 1.0),
+        (re.compile(r"[\w.+-]+@[\w-]+\.[\w.]+"), 1.0),
+    ],
+}
+
+# Workflow stages in the order they depend on each other, and the verb that
+# shows a stage is asked for rather than just mentioned ("email the invoice").
+STAGES = ("attendance", "invoice", "email")
+_STAGE_VERBS = {
+    "attendance": re.compile(r"\b(mark|log|update|change|add)\b"),
+    "invoice": re.compile(r"\b(generate|create|make|prepare)\b"),
+    "email": re.compile(r"\b(e-?mail|mail|send|forward)\b"),
+}
+
+
+def normalize(text: str) -> str:
+    return " ".join(re.sub(r"[^\w@.+-]+", " ", text.lower()).split())
+
+
+def classify(text: str) -> Tuple[Optional[str], float]:
+    """Scores the message against keyword rules. Returns (category or None, confidence)."""
+    scores = _scores(normalize(text))
+    total = sum(scores.values())
+    if not total:
+        return None, 0.0
+    best = max(scores, key=scores.get)
+    confidence = scores[best] / total
+    if scores[best] < MIN_SCORE or confidence < MIN_CONFIDENCE:
+        return None, confidence
+    return best, confidence
+
+
+def _scores(text: str) -> dict:
+    return {
+        category: sum(weight for pattern, weight in rules if pattern.search(text))
+        for category, rules in _RULES.items()
+    }
+
+
+def plan_stages(text: str) -> Optional[List[str]]:
+    """The stages a message clearly asks for, in workflow order, when there are several; otherwise None."""
+    text = normalize(text)
+    scores = _scores(text)
+    stages = [s for s in STAGES if scores[s] >= MIN_SCORE and _STAGE_VERBS[s].search(text)]
+    return stages if len(stages) > 1 else None
+
+
+def routing_mode(thread_id: str = None, mode: str = None) -> str:
+    """The routing mode for a conversation: 'two_hop' or 'single'."""
+    mode = mode or ROUTING_MODE
+    if mode == "split":
+        return "single" if zlib.crc32(str(thread_id).encode("utf-8")) % 2 else "two_hop"
+    return "single" if mode == "single" else "two_hop"
+
+
+def route_from_tools(tool_calls) -> Optional[str]:
+    """The category of the first tool call that belongs to one, e.g. 'attendance' for a timesheet save."""
+    for call in tool_calls or []:
+        if call["name"] in TOOL_ROUTES:
+            return TOOL_ROUTES[call["name"]]
+    return None
+
+
+def parse_stages(choice: str) -> List[str]:
+    """Stages named in a routing decision such as "attendance, invoice, email", in the order given."""
+    found = [(choice.find(s), s) for s in STAGES if s in choice]
+    return [s for _, s in sorted(found)]
+
+
+class Router:
+    """
+    Local routing stage ahead of the LLM router: memoized decisions for repeated
+    inputs first, then keyword rules, and only then a model call. Decisions are
+    memoized per routing mode, so one mode's model calls never route the other's
+    traffic.
+    """
+
+    def __init__(self, memo_size: int = MEMO_SIZE):
+        self.memo_size = memo_size
+        self._memo = OrderedDict()
+        self._lock = threading.Lock()
+        self.memo_hits = 0
+        self.rule_hits = 0
+        self.llm_calls = 0
+
+    def fast_route(self, text: str, mode: str = "two_hop") -> Optional[str]:
+        """
+        Returns a category (or a comma-separated workflow of several) without a
+        model call, or None if the model has to decide.
+        """
+        key = (mode, normalize(text))
+        with self._lock:
+            if key in self._memo:
+                self._memo.move_to_end(key)
+                self.memo_hits += 1
+                return self._memo[key]
+        stages = plan_stages(text)
+        category = ", ".join(stages) if stages else classify(text)[0]
+        if category is None:
+            return None
+        with self._lock:
+            self.rule_hits += 1
+        self.remember(text, category, mode)
+        return category
+
+    def remember(self, text: str, category: str, mode: str = "two_hop") -> None:
+        key = (mode, normalize(text))
+        with self._lock:
+            self._memo[key] = category
+            self._memo.move_to_end(key)
+            while len(self._memo) > self.memo_size:
+                self._memo.popitem(last=False)
+
+    def record_llm_call(self) -> None:
+        with self._lock:
+            self.llm_calls += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.memo_hits + self.rule_hits + self.llm_calls
+            return {
+                "memo_hits": self.memo_hits,
+                "rule_hits": self.rule_hits,
+                "llm_calls": self.llm_calls,
+                "fast_path_rate": (self.memo_hits + self.rule_hits) / total if total else 0.0,
+            }
+
+
+router = Router()
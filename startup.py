@@ -0,0 +1,79 @@
+"""
+Cold-start report for app.py.
+
+Imports `app` in fresh interpreters: once plain to time the cold start against
+the budget, and once with `-X importtime` to break the import time down by
+top-level package.
+
+    python startup.py              # report, exit 1 if over STARTUP_BUDGET_SECONDS
+    python startup.py --top 25     # show more packages
+"""
+import os
+import sys
+import argparse
+import subprocess
+
+STARTUP_BUDGET_SECONDS = float(os.getenv("STARTUP_BUDGET_SECONDS", "6.0"))
+
+_PROBE = "import time; t = time.perf_counter(); import app; print(time.perf_counter() - t)"
+
+
+def measure_import(module_dir: str) -> float:
+    """Seconds taken by `import app` in a new interpreter."""
+    out = subprocess.run(
+        [sys.executable, "-c", _PROBE], cwd=module_dir, capture_output=True, text=True, check=True
+    )
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def import_breakdown(module_dir: str) -> dict:
+    """Self time in seconds of every imported module, summed per top-level package."""
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        cwd=module_dir, capture_output=True, text=True, check=True,
+    )
+    totals = {}
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        fields = line[len("import time:"):].split("|")
+        if not fields[0].strip().isdigit():
+            continue  # header line
+        package = fields[2].strip().split(".")[0]
+        totals[package] = totals.get(package, 0.0) + int(fields[0]) / 1e6
+    return totals
+
+
+def report(top: int = 15, budget: float = STARTUP_BUDGET_SECONDS) -> int:
+    module_dir = os.path.dirname(os.path.abspath(__file__))
+    seconds = measure_import(module_dir)
+    totals = import_breakdown(module_dir)
+    traced = sum(totals.values())
+
+    print(f"{'package':<28} {'ms':>10} {'share':>7}")
+    for package, spent in sorted(totals.items(), key=lambda kv: kv[1], reverse=True)[:top]:
+        print(f"{package:<28} {spent * 1000:>10.1f} {spent / traced:>7.1%}")
+    print(f"\nimport app: {seconds:.3f}s (budget {budget:.1f}s)")
+
+    if seconds > budget:
+        print("Over the cold-start budget.")
+        return 1
+    return 0
+
+
+def check_budget(started: float, now: float, budget: float = STARTUP_BUDGET_SECONDS) -> dict:
+    """Startup summary for the app to log right before it starts serving."""
+    seconds = now - started
+    return {"seconds": round(seconds, 3), "budget": budget, "within_budget": seconds <= budget}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Time the cold start of app.py and break it down by package.")
+    parser.add_argument("--top", type=int, default=15, help="Packages to list")
+    parser.add_argument("--budget", type=float, default=STARTUP_BUDGET_SECONDS, help="Cold-start budget in seconds")
+    args = parser.parse_args(argv)
+    return report(args.top, args.budget)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -4,4 +4,7 @@ from langgraph.graph.message import add_messages
 
 class State(TypedDict):
     messages: Annotated[List[Any], add_messages]
-    next: Optional[str]
\ No newline at end of file
+    next: Optional[str]
+    summary: Optional[str]
+    plan: Optional[List[str]]          # workflow stages still to run after the current one
+    results: Optional[Dict[str, Any]]  # outputs of finished workflow steps
\ No newline at end of file
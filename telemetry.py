@@ -0,0 +1,171 @@
+import os
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9464"))
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+TELEMETRY_LOG = os.getenv("TELEMETRY_LOG")
+TELEMETRY_LOG_LEVEL = os.getenv("TELEMETRY_LOG_LEVEL", "INFO")
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+logger = logging.getLogger("invoice_assistant.telemetry")
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: the event fields plus time and level."""
+
+    def format(self, record):
+        event = {"ts": round(record.created, 3), "level": record.levelname.lower(), "event": record.getMessage()}
+        event.update(getattr(record, "fields", {}))
+        return json.dumps(event, default=str)
+
+
+def configure_logging(path: str = TELEMETRY_LOG, level: str = TELEMETRY_LOG_LEVEL) -> None:
+    """Sends telemetry events as JSON lines to `path` (stderr when unset). Spans log at DEBUG, turns at INFO."""
+    if logger.handlers:
+        return
+    handler = logging.FileHandler(path) if path else logging.StreamHandler()
+    handler.setFormatter(JsonFormatter())
+    logger.addHandler(handler)
+    logger.setLevel(level.upper())
+    logger.propagate = False
+
+
+# --- Metrics ---
+
+def _labels(labels: dict) -> tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+class Metrics:
+    """
+    Process-wide counters, gauges and histograms, rendered in the Prometheus
+    text format. Collectors run before each render, to set gauges that are
+    cheaper to read on scrape than to keep current.
+    """
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._counters = {}    # name -> {labels: value}
+        self._histograms = {}  # name -> {labels: [bucket counts..., sum, count]}
+        self._gauges = {}      # name -> {labels: value}
+        self._help = {}
+        self._collectors = []
+
+    def inc(self, metric: str, value: float = 1, help: str = "", **labels) -> None:
+        with self._lock:
+            self._help.setdefault(metric, help)
+            series = self._counters.setdefault(metric, {})
+            key = _labels(labels)
+            series[key] = series.get(key, 0) + value
+
+    def set(self, metric: str, value: float, help: str = "", **labels) -> None:
+        with self._lock:
+            self._help.setdefault(metric, help)
+            self._gauges.setdefault(metric, {})[_labels(labels)] = value
+
+    def add_collector(self, collect) -> None:
+        """Registers a callable run before each render (e.g. one that `set`s gauges from a stats() dict)."""
+        with self._lock:
+            self._collectors.append(collect)
+
+    def observe(self, metric: str, value: float, help: str = "", **labels) -> None:
+        with self._lock:
+            self._help.setdefault(metric, help)
+            series = self._histograms.setdefault(metric, {})
+            state = series.setdefault(_labels(labels), [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def value(self, metric: str, **labels) -> float:
+        with self._lock:
+            series = self._counters.get(metric) or self._gauges.get(metric, {})
+            return series.get(_labels(labels), 0)
+
+    def render(self) -> str:
+        for collect in list(self._collectors):
+            try:
+                collect()
+            except Exception as e:
+                logger.warning("metrics collector failed", extra={"fields": {"error": str(e)}})
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                lines += [f"# HELP {name} {self._help.get(name, '')}", f"# TYPE {name} counter"]
+                lines += [f"{name}{_format_labels(k)} {v}" for k, v in sorted(series.items())]
+            for name, series in sorted(self._gauges.items()):
+                lines += [f"# HELP {name} {self._help.get(name, '')}", f"# TYPE {name} gauge"]
+                lines += [f"{name}{_format_labels(k)} {v}" for k, v in sorted(series.items())]
+            for name, series in sorted(self._histograms.items()):
+                lines += [f"# HELP {name} {self._help.get(name, '')}", f"# TYPE {name} histogram"]
+                for key, state in sorted(series.items()):
+                    for bound, count in zip(self.buckets, state):
+                        lines.append(f"{name}_bucket{_format_labels(key + (('le', str(bound)),))} {count}")
+                    lines.append(f"{name}_bucket{_format_labels(key + (('le', '+Inf'),))} {state[-1]}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {round(state[-2], 6)}")
+                    lines.append(f"{name}_count{_format_labels(key)} {state[-1]}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+def record_span(kind: str, name: str, seconds: float, **fields) -> None:
+    """Records a finished span: latency histogram, byte counters and a DEBUG JSON log line."""
+    metrics.observe("invoice_span_seconds", seconds, "Latency of graph nodes, model calls, tools and file I/O", kind=kind, name=name)
+    for direction in ("read", "written"):
+        if fields.get(f"bytes_{direction}"):
+            metrics.inc("invoice_io_bytes_total", fields[f"bytes_{direction}"], "Bytes read/written", name=name, direction=direction)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("span", extra={"fields": {"kind": kind, "name": name, "ms": round(seconds * 1000, 3), **fields}})
+
+
+@contextmanager
+def span(kind: str, name: str, **fields):
+    """Times a block. The yielded dict can be filled in with extra fields (e.g. bytes_written)."""
+    started = time.perf_counter()
+    try:
+        yield fields
+    finally:
+        record_span(kind, name, time.perf_counter() - started, **fields)
+
+
+# --- Endpoint ---
+
+def start_metrics_server(port: int = METRICS_PORT, host: str = METRICS_HOST):
+    """Serves GET /metrics in the Prometheus text format from a daemon thread. Returns the server, or None if disabled."""
+    if not port:
+        return None
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
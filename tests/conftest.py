@@ -0,0 +1,28 @@
+import os
+import sys
+import shutil
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Offline defaults: nothing here may reach a model, a mail API or a metrics port.
+os.environ.update({
+    "GOOGLE_API_KEY": "test",
+    "SENDGRID_API_KEY": "test",
+    "CHECKPOINTER": "memory",
+    "LLM_CACHE": "off",
+    "METRICS_PORT": "0",
+    "TIMESHEET_COMPACT_INTERVAL": "0",
+})
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """A scratch working directory holding copies of the sample timesheets."""
+    for name in os.listdir(ROOT):
+        if name.startswith("timesheet_") and name.endswith(".xlsx"):
+            shutil.copy2(os.path.join(ROOT, name), tmp_path)
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
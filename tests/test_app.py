@@ -0,0 +1,70 @@
+import json
+import asyncio
+
+from langchain_core.language_models.fake_chat_models import FakeMessagesListChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGenerationChunk
+
+import app
+import llm
+import nodes
+from router import Router
+
+
+class StreamedModel(FakeMessagesListChatModel):
+    """Streams each scripted reply word by word, then its tool calls."""
+
+    def bind_tools(self, *args, **kwargs):
+        return self
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        reply = self.responses[self.i % len(self.responses)]
+        self.i += 1
+        for word in reply.content.split(" "):
+            token = word if word == reply.content.split(" ")[-1] else word + " "
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+        if reply.tool_calls:
+            yield ChatGenerationChunk(message=AIMessageChunk(content="", tool_call_chunks=[
+                {"name": call["name"], "args": json.dumps(call["args"]), "id": call["id"], "index": i}
+                for i, call in enumerate(reply.tool_calls)
+            ]))
+
+
+def _chat(text, replies, monkeypatch, thread="test"):
+    monkeypatch.setattr(llm, "llm_with_tools", StreamedModel(responses=replies), raising=False)
+    monkeypatch.setattr(app, "session_config", lambda request=None: {"configurable": {"thread_id": thread}})
+
+    async def collect():
+        return [update async for update in app.chat(text, [])]
+
+    return asyncio.run(collect())
+
+
+def test_streams_answer_tokens_and_tool_progress(workdir, monkeypatch):
+    updates = _chat("Show the timesheet entry for 2025-07-05", [
+        AIMessage(content="Let me check.", tool_calls=[
+            {"name": "read_invoice_data", "args": {"filename": "timesheet_july.xlsx", "date": "2025-07-05"}, "id": "c1"},
+        ]),
+        AIMessage(content="July 5th is a week off."),
+    ], monkeypatch, thread="stream")
+
+    assert updates[:2] == ["Let ", "Let me "]  # the preamble arrives token by token
+    assert "_Reading timesheet…_" in updates  # and is replaced by progress once the tool is called
+    progress = updates.index("_Reading timesheet…_")
+    assert updates[progress + 1:progress + 3] == [
+        "_Reading timesheet…_\n\nJuly ",
+        "_Reading timesheet…_\n\nJuly 5th ",
+    ]
+    assert updates[-1] == "July 5th is a week off."
+
+
+def test_the_router_call_is_not_streamed(workdir, monkeypatch):
+    monkeypatch.setattr(nodes, "router", Router())
+    classifier = StreamedModel(responses=[AIMessage(content="attendance")])
+    monkeypatch.setattr(llm, "llm", classifier, raising=False)
+    updates = _chat("hmm, sort out the thing from before", [AIMessage(content="Done.")], monkeypatch, thread="router")
+    assert classifier.i == 1
+    assert set(updates) == {"Done."}
@@ -0,0 +1,62 @@
+import json
+import datetime
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+import batch
+
+
+class Clock(datetime.datetime):
+    """A clock that moves on a minute each time it is read."""
+    ticks = 0
+
+    @classmethod
+    def now(cls, tz=None):
+        cls.ticks += 1
+        return datetime.datetime(2025, 8, 1, 9, 0) + datetime.timedelta(minutes=cls.ticks)
+
+
+def _run(workdir, monkeypatch, *extra):
+    # Workers run in threads so that the patched clock and job hook apply to them too.
+    monkeypatch.setattr(batch, "ProcessPoolExecutor", ThreadPoolExecutor)
+    args = batch.parse_args([
+        "--months", "july", "august", "--workers", "2", "--invoice-date", "2025-08-01",
+        "--db", str(workdir / "timesheets.db"), "--out-dir", str(workdir / "out"), "--data-dir", str(workdir), *extra,
+    ])
+    return batch.run(args)
+
+
+def test_manifest_lists_every_invoice(workdir, monkeypatch):
+    manifest = _run(workdir, monkeypatch)
+    assert (manifest["produced"], manifest["failed"]) == (2, 0)
+    assert [(job["month"], job["file"]) for job in manifest["jobs"]] == [
+        ("august", str(workdir / "out" / "invoice_august.docx")),
+        ("july", str(workdir / "out" / "invoice_july.docx")),
+    ]
+    assert all((workdir / "out" / name).exists() for name in ("invoice_july.docx", "invoice_august.docx"))
+    json.dumps(manifest)
+
+
+def test_month_names_are_normalized_once(workdir):
+    args = batch.parse_args(["--months", "July", "--employees", "50391", "50392", "--out-dir", str(workdir)])
+    assert [(job["month"], job["output"]) for job in batch.plan_jobs(args)] == [
+        ("july", str(workdir / "invoice_50391_july.docx")),
+        ("july", str(workdir / "invoice_50392_july.docx")),
+    ]
+
+
+def test_started_at_is_taken_before_the_jobs_run(workdir, monkeypatch):
+    Clock.ticks = 0
+    monkeypatch.setattr(batch, "datetime", types.SimpleNamespace(datetime=Clock, date=datetime.date))
+    job_clock = []
+    invoice_job = batch.invoice_job
+    monkeypatch.setattr(batch, "invoice_job", lambda job: job_clock.append(Clock.now()) or invoice_job(job))
+
+    manifest = _run(workdir, monkeypatch)
+    assert manifest["started_at"] < min(job_clock).isoformat(timespec="seconds")
+
+
+def test_missing_timesheets_are_reported_not_raised(workdir, monkeypatch):
+    manifest = _run(workdir, monkeypatch, "--months", "march", "--carried-forward", "0")
+    assert (manifest["produced"], manifest["failed"]) == (0, 1)
+    assert manifest["jobs"][0]["error"] == "ValueError: no timesheet entries for march"
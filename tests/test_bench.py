@@ -0,0 +1,55 @@
+import os
+import json
+
+import bench
+
+
+def _result(name, median):
+    return {"name": name, "wall_ms_median": median}
+
+
+BASELINE = {
+    "cold": _result("cold", 6.744),
+    "tiny": _result("tiny", 0.028),
+}
+
+
+def test_slower_machines_are_not_regressions():
+    results = [_result("cold", 11.7), _result("tiny", 0.03)]
+    assert bench.compare(results, BASELINE, tolerance=0.5) == ["cold"]
+    # The same run on a machine whose calibration workload takes twice as long.
+    assert bench.compare(results, BASELINE, tolerance=0.5, scale=2.0) == []
+
+
+def test_sub_millisecond_noise_is_ignored():
+    assert bench.compare([_result("tiny", 0.08)], BASELINE, tolerance=0.5) == []
+    assert bench.compare([_result("tiny", 0.08)], BASELINE, tolerance=0.5, min_delta_ms=0) == ["tiny"]
+
+
+def _save(path, **baseline):
+    path.write_text(json.dumps({"benchmarks": BASELINE, **baseline}))
+    return str(path)
+
+
+def test_baselines_are_scaled_by_calibration(tmp_path, capsys):
+    path = _save(tmp_path / "baseline.json", machine=bench.machine(), calibration_ms=50.0)
+    assert bench.load_baseline(path, calibration_ms=75.0) == (BASELINE, 1.5)
+    assert "another machine" not in capsys.readouterr().out
+
+
+def test_other_machines_are_flagged(tmp_path, capsys):
+    path = _save(tmp_path / "baseline.json", machine={"machine": "arm64"}, calibration_ms=50.0)
+    assert bench.load_baseline(path, calibration_ms=50.0) == (BASELINE, 1.0)
+    assert "recorded on another machine" in capsys.readouterr().out
+
+
+def test_uncalibrated_or_missing_baselines_are_not_compared(tmp_path):
+    assert bench.load_baseline(_save(tmp_path / "old.json", python="3.11.7"), calibration_ms=50.0) is None
+    assert bench.load_baseline(str(tmp_path / "missing.json"), calibration_ms=50.0) is None
+
+
+def test_the_committed_baseline_is_calibrated():
+    path = os.path.join(os.path.dirname(bench.__file__), bench.BASELINE)
+    benchmarks, scale = bench.load_baseline(path, calibration_ms=40.0)
+    assert scale > 0
+    assert {"create_invoice_document", "graph.ainvoke[30] read+save+answer"} <= set(benchmarks)
@@ -0,0 +1,60 @@
+import datetime
+from decimal import Decimal
+
+import pytest
+
+from billing import (
+    amount_in_words, compute_invoice, count_statuses, format_days, format_inr, invoice_period, number_to_words, parse_date,
+)
+
+JULY = [(f"2025-07-{d:02d}", "P", "Worked") for d in range(1, 22)] + [
+    ("2025-07-22", "HL", None),
+    ("2025-07-23", "L", None),
+    ("2025-07-24", "a", None),
+    ("2025-07-25", None, None),
+    ("2025-07-26", "WO", None),
+]
+
+
+def test_invoice_totals():
+    data = compute_invoice(JULY, carried_forward_leaves=1.5, invoice_date=datetime.date(2025, 8, 1))
+    assert data["date"] == "Date: 2025-08-01"
+    assert data["salary_description"] == 'Salary for the month of "July 2025" payroll'
+    assert data["details"][2:] == [
+        "Month: July 2025",
+        "Working Days: 21.5",  # 21 P + half an HL
+        "Cumulative Leaves Taken: 2.5 days",  # L + A + half an HL
+        "Balance Leaves: 1 days",  # 1.5 carried + 2 accrued - 2.5 taken
+    ]
+    assert data["total"] == "22,292/-"  # 21.5 x 1036.8571, rounded half up
+    assert data["total_words"] == "Rs. Twenty Two Thousand Two Hundred Ninety Two Only"
+
+
+def test_profile_overrides_and_empty_timesheets():
+    data = compute_invoice([], profile={"name": "A N OTHER"}, invoice_date=datetime.date(2025, 9, 3))
+    assert data["name"] == "NAME: A N OTHER"
+    assert "Month: September 2025" in data["details"]
+    assert data["total"] == "0/-"
+
+
+@pytest.mark.parametrize("amount, text", [
+    (0, "0"), (999, "999"), (21774, "21,774"), (2177400, "21,77,400"), (123456789, "12,34,56,789"),
+])
+def test_indian_digit_grouping(amount, text):
+    assert format_inr(Decimal(amount)) == text
+
+
+def test_amounts_in_words():
+    assert number_to_words(2177400) == "Twenty One Lakh Seventy Seven Thousand Four Hundred"
+    assert number_to_words(15) == "Fifteen"
+    assert amount_in_words(Decimal("21774")) == "Rs. Twenty One Thousand Seven Hundred Seventy Four Only"
+
+
+def test_helpers():
+    assert format_days(Decimal("21.50")) == "21.5"
+    assert format_days(Decimal("20.0")) == "20"
+    assert parse_date("2025-07-01 00:00:00") == datetime.date(2025, 7, 1)
+    assert parse_date(datetime.datetime(2025, 7, 1, 9)) == datetime.date(2025, 7, 1)
+    assert parse_date("Total") is None
+    assert invoice_period([("2025-08-02", "P"), ("2025-07-31", "P")]) == "July 2025"
+    assert count_statuses(JULY)["A"] == 1
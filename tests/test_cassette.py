@@ -0,0 +1,221 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+import cassette
+from cassette import CassetteMiss, CassetteTransport, request_key
+from outbox import LocalMailServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class ScriptedServer:
+    """Chat completions endpoint answering with `replies` in turn (content and/or tool calls), plain or streamed."""
+
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.requests = []
+        outer = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                outer.requests.append(body)
+                reply = outer.replies.pop(0) if len(outer.replies) > 1 else outer.replies[0]
+                if body.get("stream"):
+                    data = outer.events(body["model"], reply).encode()
+                    content_type = "text/event-stream"
+                else:
+                    message = {"role": "assistant", "content": reply.get("content")}
+                    data = json.dumps({
+                        "id": "x", "object": "chat.completion", "created": 0, "model": body["model"],
+                        "choices": [{"index": 0, "message": message, "finish_reason": "stop"}],
+                    }).encode()
+                    content_type = "application/json"
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}/v1"
+
+    @staticmethod
+    def events(model, reply):
+        chunk = {"id": "x", "object": "chat.completion.chunk", "created": 0, "model": model}
+        delta = {"role": "assistant", "content": reply.get("content") or ""}
+        if reply.get("tool_calls"):
+            delta["tool_calls"] = [
+                {"index": i, "id": f"call_{i}", "type": "function",
+                 "function": {"name": name, "arguments": json.dumps(args)}}
+                for i, (name, args) in enumerate(reply["tool_calls"])
+            ]
+        finish = "tool_calls" if reply.get("tool_calls") else "stop"
+        lines = [
+            {**chunk, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]},
+            {**chunk, "choices": [{"index": 0, "delta": {}, "finish_reason": finish}]},
+            {**chunk, "choices": [], "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2}},
+        ]
+        return "".join(f"data: {json.dumps(line)}\n\n" for line in lines) + "data: [DONE]\n\n"
+
+    def __enter__(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def _chat(client, url, text, model="gemini-1.5-flash"):
+    payload = {"model": model, "messages": [{"role": "user", "content": text}]}
+    return client.post(f"{url}/chat/completions", json=payload).json()["choices"][0]["message"]["content"]
+
+
+def _record(path, replies, prompts):
+    with ScriptedServer(replies) as server:
+        with httpx.Client(transport=CassetteTransport(path, mode="record")) as client:
+            for text in prompts:
+                _chat(client, server.url, text)
+    return server.url
+
+
+def test_replay_answers_offline_in_recorded_order(tmp_path):
+    path = str(tmp_path / "session.jsonl")
+    url = _record(path, [{"content": "one"}, {"content": "two"}], ["hi", "hi"])
+
+    transport = CassetteTransport(path, mode="replay", latency="0")
+    with httpx.Client(transport=transport) as client:
+        assert [_chat(client, url, "hi") for _ in range(3)] == ["one", "two", "two"]
+        transport.rewind()
+        assert _chat(client, url, "hi") == "one"
+    assert transport.mismatches == []
+
+
+def test_duplicate_in_flight_request_gets_the_same_recording(tmp_path):
+    path = str(tmp_path / "session.jsonl")
+    url = _record(path, [{"content": "one"}, {"content": "two"}], ["hi", "hi"])
+    transport = CassetteTransport(path, mode="replay", latency="0.2")
+
+    async def primary_and_hedge():
+        async with httpx.AsyncClient(transport=transport) as client:
+            payload = {"model": "gemini-1.5-flash", "messages": [{"role": "user", "content": "hi"}]}
+            first = asyncio.ensure_future(client.post(f"{url}/chat/completions", json=payload))
+            await asyncio.sleep(0.05)
+            hedge = await client.post(f"{url}/chat/completions", json=payload)
+            await first
+            after = await client.post(f"{url}/chat/completions", json=payload)
+            return [r.json()["choices"][0]["message"]["content"] for r in (first.result(), hedge, after)]
+
+    assert asyncio.run(primary_and_hedge()) == ["one", "one", "two"]
+
+
+def test_drifted_request_gets_the_nearest_recording_and_is_reported(tmp_path):
+    path = str(tmp_path / "session.jsonl")
+    url = _record(path, [{"content": "logged"}], ["Mark today as present"])
+
+    transport = CassetteTransport(path, mode="replay", latency="0")
+    with httpx.Client(transport=transport) as client:
+        assert _chat(client, url, "Mark today as present, please") == "logged"
+    (mismatch,) = transport.mismatches
+    assert mismatch["difference"]["message"] == 0
+    report = json.load(open(transport.write_report()))
+    assert report["mismatches"][0]["nearest"] == mismatch["nearest"]
+
+    strict = CassetteTransport(path, mode="replay", latency="0", on_miss="error")
+    with httpx.Client(transport=strict) as client, pytest.raises(CassetteMiss):
+        _chat(client, url, "Mark today as present, please")
+
+
+def test_request_key_ignores_todays_date():
+    def payload(date):
+        return {"model": "m", "messages": [{"role": "system", "content": f"For your information, today's date is {date}."}]}
+
+    assert request_key(payload("2025-07-01")) == request_key(payload("2025-08-15"))
+    assert request_key(payload("2025-07-01")) != request_key({**payload("2025-07-01"), "model": "other"})
+
+
+def test_request_key_ignores_outbox_job_numbers():
+    def payload(job):
+        return {"model": "m", "messages": [{"role": "tool", "content": f"Success: queued as job #{job}."}]}
+
+    assert request_key(payload(1)) == request_key(payload(42))
+
+
+def test_parse_latency():
+    assert cassette.parse_latency("recorded") == (1.0, None)
+    assert cassette.parse_latency("recorded*0.5") == (0.5, None)
+    assert cassette.parse_latency("0") == (None, 0.0)
+
+
+EMAIL_TURN = "Email the July files to review@example.com"
+
+RECORD_SCRIPT = f"""
+import asyncio
+import app
+
+async def main():
+    async for _ in app.graph.astream(
+        {{"messages": [{{"role": "user", "content": {EMAIL_TURN!r}}}]}},
+        config={{"configurable": {{"thread_id": "record"}}}},
+        stream_mode=["messages", "updates"],
+    ):
+        pass
+    from outbox import get_outbox
+    get_outbox().flush(timeout=5)
+
+asyncio.run(main())
+"""
+
+
+def _env(**overrides):
+    env = {k: v for k, v in os.environ.items() if not k.startswith(("LLM_CASSETTE", "MAIL_API_HOST", "OUTBOX_"))}
+    env.update(PYTHONPATH=ROOT, FROM_EMAIL="me@example.com", TO_EMAIL="boss@example.com", OUTBOX_RATE_PER_SEC="0")
+    env.update(overrides)
+    return env
+
+
+def test_replayed_email_turn_stays_offline(workdir):
+    path = str(workdir / "session.jsonl")
+    replies = [
+        {"tool_calls": [("send_email_with_attachments", {
+            "xlsx_filename": "timesheet_july.xlsx", "docx_filename": "invoice_july.docx", "to_email": "review@example.com",
+        })]},
+        {"content": "The email is queued."},
+    ]
+    with ScriptedServer(replies) as server, LocalMailServer() as recorded_mail:
+        subprocess.run(
+            [sys.executable, "-c", RECORD_SCRIPT], cwd=workdir, check=True, timeout=120,
+            env=_env(LLM_CASSETTE=path, LLM_CASSETTE_MODE="record", GEMINI_BASE_URL=server.url,
+                     MAIL_API_HOST=recorded_mail.url, OUTBOX_DB=str(workdir / "record_outbox.db")),
+        )
+    assert len(recorded_mail.received) == 1
+    assert len(cassette.load(path)) == 2
+
+    # The endpoint is gone; a mail host from the environment must not be used either.
+    with LocalMailServer() as configured_mail:
+        replay = subprocess.run(
+            [sys.executable, os.path.join(ROOT, "cassette.py"), "replay", path, "--repeat", "2", "--latency", "0",
+             "--data-dir", str(workdir)],
+            cwd=workdir, capture_output=True, text=True, timeout=120,
+            env=_env(GEMINI_BASE_URL="http://127.0.0.1:9/v1", MAIL_API_HOST=configured_mail.url),
+        )
+    assert replay.returncode == 0, replay.stderr
+    assert "0 request(s) did not match the cassette." in replay.stdout
+    # Warm-up, two timed runs and the allocation run each send the email once.
+    assert "Local mail stub received 4 request(s)." in replay.stdout
+    assert configured_mail.received == []
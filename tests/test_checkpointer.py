@@ -0,0 +1,152 @@
+import operator
+import threading
+from typing import Annotated, List, TypedDict
+
+from langgraph.graph import StateGraph, START, END
+
+from checkpointer import BoundedMemorySaver, SqliteCheckpointSaver, publish_stats
+from telemetry import Metrics
+import checkpointer
+
+
+class Notes(TypedDict):
+    notes: Annotated[List[str], operator.add]
+
+
+def _graph(saver):
+    builder = StateGraph(Notes)
+    builder.add_node("echo", lambda state: {"notes": [f"seen {len(state['notes'])}"]})
+    builder.add_edge(START, "echo")
+    builder.add_edge("echo", END)
+    return builder.compile(checkpointer=saver)
+
+
+def _turn(graph, thread, note="hi"):
+    return graph.invoke({"notes": [note]}, config={"configurable": {"thread_id": thread}})
+
+
+def test_keeps_only_the_newest_checkpoints_of_a_thread():
+    saver = BoundedMemorySaver(max_checkpoints_per_thread=3)
+    graph = _graph(saver)
+    for i in range(5):
+        state = _turn(graph, "a", f"turn {i}")
+    assert len(state["notes"]) == 10  # the whole conversation survives pruning
+    stats = saver.stats()
+    assert stats["checkpoints"] == 3
+    assert stats["pruned_checkpoints"] > 0
+    assert graph.get_state({"configurable": {"thread_id": "a"}}).values["notes"][-1] == "seen 9"
+
+
+def test_evicts_least_recently_used_threads_over_the_cap():
+    saver = BoundedMemorySaver(max_threads=2)
+    graph = _graph(saver)
+    for thread in ("a", "b"):
+        _turn(graph, thread)
+    graph.get_state({"configurable": {"thread_id": "a"}})  # "b" is now the least recently used
+    _turn(graph, "c")
+    assert saver.stats()["resident_threads"] == 2
+    assert saver.evicted_threads == 1
+    assert graph.get_state({"configurable": {"thread_id": "b"}}).values == {}
+    assert graph.get_state({"configurable": {"thread_id": "a"}}).values["notes"]
+
+
+def test_evicts_idle_threads():
+    saver = BoundedMemorySaver(idle_ttl=0)
+    graph = _graph(saver)
+    _turn(graph, "a")
+    _turn(graph, "b")
+    assert saver.stats()["resident_threads"] == 1
+
+
+def test_stats_are_published_as_gauges(monkeypatch):
+    registry = Metrics()
+    monkeypatch.setattr(checkpointer, "metrics", registry)
+    saver = BoundedMemorySaver()
+    publish_stats(saver, "memory")
+    _turn(_graph(saver), "a")
+
+    rendered = registry.render()
+    assert "# TYPE invoice_checkpoint_resident_threads gauge" in rendered
+    assert registry.value("invoice_checkpoint_resident_threads", checkpointer="memory") == 1
+    assert registry.value("invoice_checkpoint_bytes", checkpointer="memory") == saver.stats()["bytes"] > 0
+
+
+def _sqlite(tmp_path, **kwargs):
+    return SqliteCheckpointSaver(str(tmp_path / "checkpoints.db"), **kwargs)
+
+
+def _notes(graph, thread):
+    return graph.get_state({"configurable": {"thread_id": thread}}).values["notes"]
+
+
+def test_conversations_survive_reopening(tmp_path):
+    graph = _graph(_sqlite(tmp_path))
+    for i in range(3):
+        _turn(graph, "a", f"turn {i}")
+    _turn(graph, "b")
+
+    reopened = _graph(_sqlite(tmp_path))
+    assert _notes(reopened, "a") == ["turn 0", "seen 1", "turn 1", "seen 3", "turn 2", "seen 5"]
+    state = _turn(reopened, "a", "turn 3")  # appends on top of the reloaded history
+    assert state["notes"][-2:] == ["turn 3", "seen 7"]
+    assert _notes(_graph(_sqlite(tmp_path)), "b") == ["hi", "seen 1"]
+
+
+def test_appended_lists_are_stored_as_deltas(tmp_path, monkeypatch):
+    monkeypatch.setattr(checkpointer, "MAX_DELTA_CHAIN", 3)
+    saver = _sqlite(tmp_path, compact_every=0)
+    graph = _graph(saver)
+    for i in range(6):
+        _turn(graph, "a", f"turn {i}")
+    stats = saver.stats()
+    assert 0 < stats["delta_blobs"] < stats["blobs"]
+    assert saver._conn.execute("SELECT MAX(depth) FROM blobs").fetchone()[0] == 3  # chains are capped
+    assert _notes(_graph(_sqlite(tmp_path)), "a")[-2:] == ["turn 5", "seen 11"]
+
+
+def test_compaction_keeps_the_newest_checkpoints_and_their_delta_bases(tmp_path):
+    saver = _sqlite(tmp_path, keep_per_thread=2, compact_every=0)
+    graph = _graph(saver)
+    for i in range(5):
+        _turn(graph, "a", f"turn {i}")
+    blobs = saver.stats()["blobs"]
+    saver.compact()
+
+    stats = saver.stats()
+    assert stats["checkpoints"] == 2
+    assert stats["blobs"] < blobs
+    assert len(list(saver.list({"configurable": {"thread_id": "a"}}))) == 2
+    assert _notes(_graph(_sqlite(tmp_path)), "a")[-2:] == ["turn 4", "seen 9"]
+
+
+def test_compaction_runs_every_n_puts(tmp_path):
+    saver = _sqlite(tmp_path, keep_per_thread=2, compact_every=4)
+    graph = _graph(saver)
+    for i in range(4):
+        _turn(graph, "a", f"turn {i}")
+    assert saver.stats()["checkpoints"] <= 4
+    assert _notes(graph, "a")[-1] == "seen 7"
+
+
+def test_writes_are_not_blocked_by_a_paused_listing(tmp_path):
+    saver = _sqlite(tmp_path)
+    graph = _graph(saver)
+    _turn(graph, "a")
+    listing = saver.list({"configurable": {"thread_id": "a"}})
+    next(listing)
+
+    writer = threading.Thread(target=_turn, args=(graph, "b"), daemon=True)
+    writer.start()
+    writer.join(timeout=5)
+    assert not writer.is_alive()
+    assert len(list(listing)) >= 1
+
+
+def test_deleting_a_thread_removes_its_rows(tmp_path):
+    saver = _sqlite(tmp_path)
+    graph = _graph(saver)
+    _turn(graph, "a")
+    _turn(graph, "b")
+    saver.delete_thread("a")
+    assert graph.get_state({"configurable": {"thread_id": "a"}}).values == {}
+    assert saver.stats()["threads"] == 1
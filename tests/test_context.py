@@ -0,0 +1,71 @@
+from langchain_core.messages import AIMessage, HumanMessage, RemoveMessage, SystemMessage, ToolMessage
+
+from context import build_context, estimate_tokens
+
+
+def _turn(n, tool_output="ok"):
+    return [
+        HumanMessage(content=f"question {n}", id=f"h{n}"),
+        AIMessage(content="", id=f"c{n}", tool_calls=[{"name": "read_invoice_data", "args": {}, "id": f"t{n}"}]),
+        ToolMessage(content=tool_output, tool_call_id=f"t{n}", id=f"r{n}"),
+        AIMessage(content=f"answer {n}", id=f"a{n}"),
+    ]
+
+
+def _conversation(turns, **kwargs):
+    return [m for n in range(turns) for m in _turn(n, **kwargs)]
+
+
+def test_short_conversations_are_left_alone():
+    prompt, update = build_context({"messages": _conversation(2)}, "You are helpful.", keep_turns=3)
+    assert prompt[0].content == "You are helpful."
+    assert [m.id for m in prompt[1:]] == [m.id for m in _conversation(2)]
+    assert update == {"messages": []}
+
+
+def test_older_turns_fold_into_a_digest_and_leave_the_thread():
+    prompt, update = build_context({"messages": _conversation(5)}, "You are helpful.", keep_turns=2)
+    assert prompt[0].content.splitlines()[-3:] == [
+        "User: question 2",
+        "Assistant called: read_invoice_data",
+        "Assistant: answer 2",
+    ]
+    assert "Summary of the earlier conversation:\nUser: question 0" in prompt[0].content
+    assert [m.id for m in prompt[1:]] == [m.id for n in (3, 4) for m in _turn(n)]
+    assert [m.id for m in update["messages"]] == [m.id for n in (0, 1, 2) for m in _turn(n)]
+    assert all(isinstance(m, RemoveMessage) for m in update["messages"])
+    assert update["summary"].endswith("Assistant: answer 2")
+
+
+def test_the_digest_rolls_forward():
+    state = {"messages": _conversation(2), "summary": "User: earlier\nAssistant: earlier answer"}
+    _, update = build_context(state, "sys", keep_turns=1)
+    assert update["summary"].splitlines() == [
+        "User: earlier", "Assistant: earlier answer",
+        "User: question 0", "Assistant called: read_invoice_data", "Assistant: answer 0",
+    ]
+
+
+def test_stale_tool_output_is_collapsed_but_the_current_turn_is_not():
+    long_output = "Timesheet Records:\n" + "2025-07-01 | P | Worked\n" * 50
+    prompt, _ = build_context({"messages": _conversation(2, tool_output=long_output)}, "sys", keep_turns=3)
+    earlier, current = prompt[3], prompt[7]
+    assert earlier.content.startswith("Timesheet Records: [")
+    assert "chars of earlier tool output elided" in earlier.content
+    assert current.content == long_output
+
+
+def test_turns_are_folded_to_fit_the_token_budget():
+    messages = _conversation(4, tool_output="x" * 2000)
+    budget = estimate_tokens([SystemMessage(content="sys")] + _turn(3, tool_output="x" * 2000)) + 100
+    prompt, update = build_context({"messages": messages}, "sys", keep_turns=4, token_budget=budget)
+    assert [m.id for m in prompt[1:]] == [m.id for m in _turn(3)]
+    assert estimate_tokens(prompt) <= budget
+    assert "User: question 2" in update["summary"]
+
+
+def test_stray_system_messages_are_removed_from_the_thread():
+    messages = [SystemMessage(content="old prompt", id="s0")] + _conversation(1)
+    prompt, update = build_context({"messages": messages}, "sys")
+    assert [m.content for m in prompt if isinstance(m, SystemMessage)] == ["sys"]
+    assert [m.id for m in update["messages"]] == ["s0"]
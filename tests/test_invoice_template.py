@@ -0,0 +1,104 @@
+import io
+import os
+
+from docx import Document
+from docx.oxml.ns import qn
+from lxml import etree
+
+from billing import compute_invoice
+from invoice_template import get_invoice_template
+from tools import create_invoice_document
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The data behind invoice_july.docx, which the per-call python-docx builder wrote before the template existed.
+JULY = {
+    "name": "NAME: AKASH S",
+    "date": "Date: 2025-07-28",
+    "bill_to": [
+        "PROD SOFTWARE INDIA PRIVATE LIMITED",
+        "Kalyani Platina, Ground Floor, Block I, No 24",
+        "EPIP Zone Phase II, Whitefield",
+        "Bangalore, Karnataka, 560 066",
+    ],
+    "salary_description": 'Salary for the month of "July 2025" payroll',
+    "details": [
+        {"description": "Employee Number", "amount": "50391"},
+        "Department: R&D",
+        "Month: July",
+        "Working Days: 14",
+        "Cumulative Leaves Taken: 0 days",
+        "Balance Leaves: 2 days",
+    ],
+    "total": "14516/-",
+    "total_words": "Rs. Fourteen Thousand Five Hundred Sixteen",
+}
+
+
+def _canonical(element) -> str:
+    return etree.tostring(element, method="c14n").decode() if element is not None else ""
+
+
+def _layout(document):
+    """Every cell's properties and every paragraph's properties, text and bold spans, in document order."""
+    body = document.element.body
+    shape = []
+    for element in body.iter(qn("w:tc"), qn("w:p")):
+        if element.tag == qn("w:tc"):
+            shape.append(("cell", _canonical(element.find(qn("w:tcPr")))))
+            continue
+        spans = []
+        for run in element.iter(qn("w:r")):
+            bold = run.find(f"{qn('w:rPr')}/{qn('w:b')}") is not None
+            text = "".join("\n" if child.tag == qn("w:br") else child.text or ""
+                           for child in run if child.tag in (qn("w:t"), qn("w:br")))
+            if spans and spans[-1][0] == bold:
+                spans[-1] = (bold, spans[-1][1] + text)
+            elif text:
+                spans.append((bold, text))
+        shape.append(("paragraph", _canonical(element.find(qn("w:pPr"))), spans))
+    return shape
+
+
+def _render(data) -> Document:
+    buffer = io.BytesIO()
+    get_invoice_template().render(data, buffer)
+    return Document(io.BytesIO(buffer.getvalue()))
+
+
+def test_renders_the_same_document_as_the_per_call_builder():
+    expected = Document(os.path.join(ROOT, "invoice_july.docx"))
+    rendered = _render(JULY)
+    assert _layout(rendered) == _layout(expected)
+    assert rendered.styles["Normal"].font.name == "Times New Roman"
+    assert rendered.styles["Normal"].font.size == expected.styles["Normal"].font.size
+
+
+def test_renders_are_independent_of_each_other():
+    first = _layout(_render(JULY))
+    _render({**JULY, "details": ["Only: one"], "total": "1/-"})
+    assert _layout(_render(JULY)) == first
+
+
+def test_text_is_escaped_and_line_breaks_kept():
+    document = _render({**JULY, "name": "NAME: A <B> & C", "bill_to": ["Line one", "Line two"]})
+    text = [p.text for table in document.tables for row in table.rows for cell in row.cells
+            for inner in cell.tables for r in inner.rows for c in r.cells for p in c.paragraphs]
+    assert "NAME: A <B> & C" in text
+    bill_to = document.tables[0].rows[2].cells[0].paragraphs[0].text
+    assert bill_to == "Bill To:\n    Line one\n    Line two\n"
+
+
+def test_multi_line_details_keep_every_line():
+    document = _render({**JULY, "details": [{"description": "Basic pay\n14 days", "amount": "1000/-"}]})
+    rows = [[c.text for c in r.cells] for table in document.tables for row in table.rows for cell in row.cells
+            for inner in cell.tables for r in inner.rows]
+    assert ["Basic pay\n14 days", "1000/-"] in rows
+
+
+def test_create_invoice_document_writes_a_computed_invoice(workdir):
+    data = compute_invoice([("2025-08-01", "P", None)], carried_forward_leaves=0)
+    assert create_invoice_document("invoice_august", data) == (
+        f"Invoice successfully written to {workdir / 'invoice_august.docx'}"
+    )
+    assert _layout(Document(str(workdir / "invoice_august.docx"))) == _layout(_render(data))
@@ -0,0 +1,59 @@
+import os
+from decimal import Decimal
+
+import pandas as pd
+import pytest
+
+from leave_ledger import LeaveLedger, month_of
+from timesheet_store import TimesheetStore
+
+
+def _workbook(directory, sheet, rows):
+    path = os.path.join(directory, sheet)
+    pd.DataFrame(rows, columns=["Date", "Status", "Remarks"]).to_excel(path, index=False)
+    later = os.path.getmtime(path) + 2
+    os.utime(path, (later, later))
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    _workbook(tmp_path, "timesheet_june.xlsx", [("2025-06-02", "L", None), ("2025-06-03", "HL", None), ("2025-06-04", "P", "x")])
+    _workbook(tmp_path, "timesheet_august.xlsx", [("2025-08-01", "A", None), ("2025-08-04", "l", None)])
+    store = TimesheetStore(str(tmp_path / "timesheets.db"), str(tmp_path))
+    return LeaveLedger(store, opening_balance=Decimal("1"))
+
+
+def test_balances_carry_forward_month_by_month(ledger):
+    rows = {row["month"]: row for row in ledger.months()}
+    assert list(rows) == ["2025-06", "2025-07", "2025-08"]  # July has no sheet but still accrues
+    assert rows["2025-06"]["taken"] == Decimal("1.5")
+    assert rows["2025-06"]["balance"] == Decimal("1.5")  # 1 opening + 2 accrued - 1.5 taken
+    assert rows["2025-07"]["carried_forward"] == Decimal("1.5")
+    assert rows["2025-08"]["carried_forward"] == Decimal("3.5")
+    assert rows["2025-08"]["balance"] == Decimal("3.5")  # A and a lower-case l count as leave
+    assert ledger.months("2024") == []
+
+
+def test_months_outside_the_entries(ledger):
+    assert ledger.carried_forward("2025-01") == Decimal("1")
+    assert ledger.carried_forward("2025-10") == Decimal("5.5")  # August's balance plus September's accrual
+
+
+def test_writes_recompute_from_the_month_they_touch(ledger):
+    assert ledger.balance("2025-08") == Decimal("3.5")
+    ledger.store.upsert("timesheet_june.xlsx", "2025-06-04", "L", None)
+    assert ledger.balance("2025-06") == Decimal("0.5")
+    assert ledger.carried_forward("2025-08") == Decimal("2.5")
+
+
+def test_edited_and_new_workbooks_are_picked_up(ledger, tmp_path):
+    assert ledger.balance("2025-08") == Decimal("3.5")
+    _workbook(tmp_path, "timesheet_august.xlsx", [("2025-08-01", "P", "back")])
+    assert ledger.balance("2025-08") == Decimal("5.5")
+    _workbook(tmp_path, "timesheet_may.xlsx", [("2025-05-30", "L", None)])
+    assert ledger.carried_forward("2025-06") == Decimal("2")
+
+
+def test_month_of_takes_the_earliest_date():
+    assert month_of([("2025-07-31", "P", None), ("2025-07-01", "P", None)]) == "2025-07"
+    assert month_of([("not a date", "P", None)]) is None
@@ -0,0 +1,70 @@
+import os
+import asyncio
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.outputs import Generation
+
+from bench import scripted_model
+from llm_cache import SqliteLLMCache, normalize_prompt, referenced_sheets
+
+
+def _cache(workdir, **kwargs):
+    return SqliteLLMCache(str(workdir / "llm_cache.db"), data_dir=str(workdir), **kwargs)
+
+
+def _answered(cache, prompt, text="cached", llm_string="model-a"):
+    cache.update(prompt, llm_string, [Generation(text=text)])
+
+
+def test_prompts_are_normalized():
+    assert normalize_prompt("Read   timesheet_july.xlsx\n") == "Read timesheet_july.xlsx"
+    assert normalize_prompt('[{"id": "1", "content": "a  b"}]') == normalize_prompt('[{"id": "2", "content": "a b"}]')
+    assert referenced_sheets("read timesheet_july.xlsx then timesheet_july.xlsx and timesheet_august.xlsx") == [
+        "timesheet_august.xlsx", "timesheet_july.xlsx",
+    ]
+
+
+def test_hits_need_the_same_model_and_unchanged_sheets(workdir):
+    cache = _cache(workdir)
+    _answered(cache, "Summarize timesheet_july.xlsx")
+    assert cache.lookup("Summarize   timesheet_july.xlsx", "model-a")[0].text == "cached"
+    assert cache.lookup("Summarize timesheet_july.xlsx", "model-b") is None
+
+    later = os.path.getmtime(workdir / "timesheet_july.xlsx") + 2
+    os.utime(workdir / "timesheet_july.xlsx", (later, later))
+    assert cache.lookup("Summarize timesheet_july.xlsx", "model-a") is None
+    assert cache.stats() == {"entries": 1, "hits": 1, "misses": 2, "hit_rate": 0.333}
+
+
+def test_writes_invalidate_responses_that_read_the_sheet(workdir):
+    cache = _cache(workdir)
+    _answered(cache, "Summarize timesheet_july.xlsx")
+    _answered(cache, "Summarize timesheet_august.xlsx")
+    assert cache.invalidate_sheet("timesheet_july.xlsx") == 1
+    assert cache.lookup("Summarize timesheet_july.xlsx", "model-a") is None
+    assert cache.lookup("Summarize timesheet_august.xlsx", "model-a") is not None
+
+
+def test_entries_expire_and_are_bounded(workdir):
+    expiring = _cache(workdir, ttl=0.01)
+    _answered(expiring, "hello")
+    asyncio.run(asyncio.sleep(0.02))
+    assert expiring.lookup("hello", "model-a") is None
+
+    bounded = SqliteLLMCache(str(workdir / "bounded.db"), max_entries=2)
+    for prompt in ("one", "two", "three"):
+        _answered(bounded, prompt)
+    assert bounded.stats()["entries"] == 2
+    assert bounded.lookup("one", "model-a") is None
+
+
+def test_a_cached_model_is_not_called_twice(workdir):
+    cache = _cache(workdir)
+    model = scripted_model([AIMessage(content="first"), AIMessage(content="second")])
+    model.cache = cache
+    prompt = [HumanMessage(content="How many leaves in timesheet_july.xlsx?")]
+    assert model.invoke(prompt).content == "first"
+    assert model.invoke(prompt).content == "first"
+    assert model.i == 1
+    cache.invalidate_sheet("timesheet_july.xlsx")
+    assert model.invoke(prompt).content == "second"
@@ -0,0 +1,218 @@
+import base64
+import threading
+import time
+
+import pytest
+
+import outbox
+from outbox import AttachmentCache, Outbox, TransientSendError
+
+
+class RecordingTransport:
+    def __init__(self, fail_first=0):
+        self.fail_first = fail_first
+        self.payloads = []
+        self._lock = threading.Lock()
+
+    def send(self, payload):
+        with self._lock:
+            if self.fail_first > 0:
+                self.fail_first -= 1
+                raise TransientSendError("503")
+            self.payloads.append(payload)
+        return 202
+
+    def recipients(self):
+        return sorted(to["email"] for p in self.payloads for to in p["personalizations"][0]["to"])
+
+
+@pytest.fixture
+def db(tmp_path):
+    return str(tmp_path / "outbox.db")
+
+
+@pytest.fixture
+def invoice(tmp_path):
+    path = tmp_path / "invoice_july.docx"
+    path.write_bytes(b"original")
+    return str(path)
+
+
+def _stopped(transport, db, **kwargs):
+    """An outbox whose worker is stopped, so the test drives claims and sends itself."""
+    box = Outbox(transport, db_path=db, rate_per_second=0, **kwargs)
+    box.close()
+    return box
+
+
+def _send_due(box):
+    for job in box._claim_due():
+        box._send_group([job])
+
+
+def test_transient_failures_are_retried_with_backoff(db, invoice, monkeypatch):
+    monkeypatch.setattr(outbox, "BACKOFF_BASE_SECONDS", 0.01)
+    transport = RecordingTransport(fail_first=2)
+    box = Outbox(transport, db_path=db, rate_per_second=0)
+    try:
+        job_id = box.enqueue("from@x.com", "to@x.com", "Invoice", "Hi", [invoice])
+        deadline = time.monotonic() + 5
+        while box.status(job_id)["status"] != "sent" and time.monotonic() < deadline:
+            box.flush(timeout=1)
+        job = box.status(job_id)
+    finally:
+        box.close()
+    assert job["status"] == "sent"
+    assert job["attempts"] == 3
+    assert transport.recipients() == ["to@x.com"]
+
+
+def test_gives_up_after_max_attempts(db, invoice):
+    box = _stopped(RecordingTransport(fail_first=10), db, max_attempts=2)
+    job_id = box.enqueue("from@x.com", "to@x.com", "Invoice", "Hi", [invoice])
+    for _ in range(2):
+        box._conn.execute("UPDATE jobs SET next_attempt = 0")
+        _send_due(box)
+    assert box.status(job_id)["status"] == "failed"
+
+
+def test_retry_sends_the_attachment_as_it_was_queued(db, invoice):
+    transport = RecordingTransport(fail_first=1)
+    box = _stopped(transport, db)
+    box.enqueue("from@x.com", "to@x.com", "Invoice", "Hi", [invoice])
+    _send_due(box)
+
+    with open(invoice, "wb") as f:
+        f.write(b"edited after queueing")
+    box._conn.execute("UPDATE jobs SET next_attempt = 0")
+    _send_due(box)
+
+    (attachment,) = transport.payloads[0]["attachments"]
+    assert attachment["filename"] == "invoice_july.docx"
+    assert base64.b64decode(attachment["content"]) == b"original"
+    # The copy goes once no unsent job needs it.
+    assert box._conn.execute("SELECT COUNT(*) FROM attachments").fetchone()[0] == 0
+
+
+def test_permanent_failures_are_not_retried(db, invoice):
+    class Rejecting(RecordingTransport):
+        def send(self, payload):
+            self.payloads.append(payload)
+            raise ValueError("400 Bad Request")
+
+    transport = Rejecting()
+    box = _stopped(transport, db)
+    job_id = box.enqueue("from@x.com", "to@x.com", "Invoice", "Hi", [invoice])
+    _send_due(box)
+    box._conn.execute("UPDATE jobs SET next_attempt = 0")
+    _send_due(box)
+    assert len(transport.payloads) == 1
+    assert box.status(job_id)["status"] == "failed"
+
+
+def test_rejected_group_is_sent_per_recipient(db, invoice):
+    class RejectingOne(RecordingTransport):
+        def send(self, payload):
+            if "bad@x.com" in [to["email"] for p in payload["personalizations"] for to in p["to"]]:
+                raise ValueError("400 Bad Request")
+            return super().send(payload)
+
+    transport = RejectingOne()
+    box = _stopped(transport, db)
+    ids = [box.enqueue("from@x.com", to, "Invoice", "Hi", [invoice]) for to in ("a@x.com", "bad@x.com", "b@x.com")]
+    box._send_group(box._claim_due())
+    assert [box.status(job_id)["status"] for job_id in ids] == ["sent", "failed", "sent"]
+    assert transport.recipients() == ["a@x.com", "b@x.com"]
+    assert box._conn.execute("SELECT COUNT(*) FROM attachments").fetchone()[0] == 0
+
+
+def test_giving_up_drops_the_attachment_copy(db, invoice):
+    box = _stopped(RecordingTransport(fail_first=10), db, max_attempts=1)
+    job_id = box.enqueue("from@x.com", "to@x.com", "Invoice", "Hi", [invoice])
+    _send_due(box)
+    assert box.status(job_id)["status"] == "failed"
+    assert box._conn.execute("SELECT COUNT(*) FROM attachments").fetchone()[0] == 0
+
+
+def test_sent_jobs_are_not_sent_again_after_a_restart(db, invoice):
+    transport = RecordingTransport()
+    box = _stopped(transport, db)
+    box.enqueue("from@x.com", "to@x.com", "Invoice", "Hi", [invoice])
+    _send_due(box)
+
+    reopened = _stopped(transport, db)
+    reopened._conn.execute("UPDATE jobs SET next_attempt = 0")
+    _send_due(reopened)
+    assert transport.recipients() == ["to@x.com"]
+    assert reopened.pending() == 0
+
+
+class _ClaimRace:
+    """Connection proxy that lets another outbox claim right after this one selected its due jobs."""
+
+    def __init__(self, conn, other):
+        self._conn = conn
+        self._other = other
+
+    def execute(self, sql, *args):
+        cursor = self._conn.execute(sql, *args)
+        if sql.startswith("SELECT id, attempts"):
+            rows = cursor.fetchall()
+            self._other._claim_due()
+            return _Rows(rows)
+        return cursor
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+class _Rows:
+    def __init__(self, rows):
+        self._rows = rows
+
+    def fetchall(self):
+        return self._rows
+
+
+def test_a_job_is_claimed_by_one_outbox_only(db, invoice):
+    first = _stopped(RecordingTransport(), db)
+    second = _stopped(RecordingTransport(), db)
+    first.enqueue("from@x.com", "to@x.com", "Invoice", "Hi", [invoice])
+
+    first._conn = _ClaimRace(first._conn, second)
+    assert first._claim_due() == []
+
+
+def test_outboxes_sharing_a_database_send_each_job_once(db, invoice):
+    transports = [RecordingTransport(), RecordingTransport()]
+    boxes = [Outbox(t, db_path=db, rate_per_second=0, batch_size=1) for t in transports]
+    try:
+        for i in range(40):
+            boxes[i % 2].enqueue("from@x.com", f"to{i:02}@x.com", f"Invoice {i}", "Hi", [invoice])
+        for box in boxes:
+            assert box.flush(timeout=10)
+        while any(box.pending() for box in boxes):
+            time.sleep(0.02)
+    finally:
+        for box in boxes:
+            box.close()
+    sent = transports[0].recipients() + transports[1].recipients()
+    assert sorted(sent) == [f"to{i:02}@x.com" for i in range(40)]
+
+
+def test_stale_claims_are_queued_again(db, invoice, monkeypatch):
+    box = _stopped(RecordingTransport(), db)
+    job_id = box.enqueue("from@x.com", "to@x.com", "Invoice", "Hi", [invoice])
+    box._claim_due()
+    assert box._claim_due() == []  # still leased to the first claim
+
+    monkeypatch.setattr(outbox, "CLAIM_LEASE_SECONDS", -1)
+    assert [job["id"] for job in box._claim_due()] == [job_id]
+
+
+def test_attachment_cache_is_bounded():
+    cache = AttachmentCache(max_entries=2)
+    for digest in ("a", "b", "a", "c"):
+        cache.encoded(digest, lambda d: d.encode())
+    assert list(cache._encoded) == ["a", "c"]
+    assert (cache.hits, cache.misses) == (1, 3)
@@ -0,0 +1,145 @@
+import asyncio
+import time
+
+import pytest
+from langchain_core.runnables import RunnableLambda
+
+import resilient_llm
+from resilient_llm import CircuitBreaker, CircuitOpenError, ResilientModel
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(resilient_llm, "_breakers", {})
+    monkeypatch.setattr(resilient_llm, "_trackers", {})
+
+
+def _model(delay=0.0, fail=False, reply="ok"):
+    async def call(_):
+        await asyncio.sleep(delay)
+        if fail:
+            raise ValueError("boom")
+        return reply
+    return RunnableLambda(call)
+
+
+def _open(breaker):
+    for _ in range(breaker.failures):
+        breaker.record_failure()
+
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failures=2, cooldown=60)
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+
+def test_breaker_lets_one_trial_through_after_cooldown():
+    breaker = CircuitBreaker(failures=1, cooldown=0)
+    _open(breaker)
+    assert breaker.state == "half-open"
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+def test_cancelled_trial_releases_the_breaker():
+    breaker = resilient_llm.breaker_for("slow")
+    breaker.failures, breaker.cooldown = 1, 0
+    _open(breaker)
+    model = ResilientModel(_model(delay=5), name="slow", hedge=False, retries=0, default_deadline=10)
+
+    async def cancel_trial():
+        task = asyncio.ensure_future(model.ainvoke("hi"))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel_trial())
+    assert breaker.state == "half-open"
+
+    # The next call gets the trial, and its success closes the breaker.
+    model.primary = _model()
+    assert asyncio.run(model.ainvoke("hi")) == "ok"
+    assert breaker.state == "closed"
+
+
+def test_open_breaker_without_fallback_refuses_calls():
+    _open(resilient_llm.breaker_for("down"))
+    model = ResilientModel(_model(), name="down", hedge=False)
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(model.ainvoke("hi"))
+
+
+def test_timeout_falls_back():
+    model = ResilientModel(
+        _model(delay=5), name="primary", fallback=_model(reply="fallback"), fallback_name="secondary",
+        hedge=False, retries=0, default_deadline=0.05,
+    )
+    assert asyncio.run(model.ainvoke("hi")) == "fallback"
+    assert resilient_llm.breaker_for("primary")._consecutive == 1
+
+
+def test_fallback_stays_within_the_deadline():
+    model = ResilientModel(
+        _model(delay=5), name="primary", fallback=_model(delay=5), fallback_name="secondary",
+        hedge=False, retries=0, default_deadline=0.2,
+    )
+    started = time.perf_counter()
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(model.ainvoke("hi"))
+    assert time.perf_counter() - started < 0.3
+
+
+def test_no_fallback_once_the_deadline_is_spent(monkeypatch):
+    monkeypatch.setattr(resilient_llm, "LLM_PRIMARY_SHARE", 1.0)
+    fallback_calls = []
+
+    async def fallback(_):
+        fallback_calls.append(1)
+        return "fallback"
+
+    model = ResilientModel(
+        _model(delay=5), name="primary", fallback=RunnableLambda(fallback), fallback_name="secondary",
+        hedge=False, retries=0, default_deadline=0.05,
+    )
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(model.ainvoke("hi"))
+    assert fallback_calls == []
+
+
+class Unavailable(Exception):
+    status_code = 503
+
+
+def test_transient_error_is_retried():
+    calls = []
+
+    async def flaky(_):
+        calls.append(1)
+        if len(calls) == 1:
+            raise Unavailable()
+        return "ok"
+
+    model = ResilientModel(RunnableLambda(flaky), name="flaky", hedge=False, retries=1)
+    assert asyncio.run(model.ainvoke("hi")) == "ok"
+    assert len(calls) == 2
+
+
+def test_hedge_answers_when_the_first_request_stalls(monkeypatch):
+    delays = iter([5, 0])
+
+    async def call(_):
+        await asyncio.sleep(next(delays))
+        return "ok"
+
+    monkeypatch.setattr(resilient_llm, "LLM_HEDGE_DELAY", 0.05)
+    model = ResilientModel(RunnableLambda(call), name="hedged", retries=0, default_deadline=2)
+    started = time.perf_counter()
+    assert asyncio.run(model.ainvoke("hi")) == "ok"
+    assert time.perf_counter() - started < 1
@@ -0,0 +1,108 @@
+import asyncio
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+
+import llm
+import nodes
+import router
+from bench import scripted_model
+from router import Router, classify, parse_stages, plan_stages, route_from_tools, routing_mode
+from telemetry import metrics
+
+
+@pytest.mark.parametrize("text, category", [
+    ("Mark 2025-07-03 as leave", "attendance"),
+    ("Today I worked on the login page", "attendance"),
+    ("Create the invoice for July", "invoice"),
+    ("Email it to review@example.com", "email"),
+])
+def test_obvious_requests_are_classified_locally(text, category):
+    assert classify(text)[0] == category
+
+
+def test_ambiguous_requests_are_left_to_the_model():
+    assert classify("hello there")[0] is None
+    assert classify("timesheet invoice")[0] is None
+
+
+def test_plans_several_stages_in_workflow_order():
+    assert plan_stages("Email the July invoice after you generate it") == ["invoice", "email"]
+    assert plan_stages("Create the invoice for July") is None
+    assert parse_stages("email, attendance") == ["email", "attendance"]
+
+
+def test_fast_route_memoizes_model_decisions():
+    local = Router(memo_size=2)
+    assert local.fast_route("hmm, what about that thing") is None
+    local.remember("hmm, what about that thing", "invoice")
+    assert local.fast_route("Hmm what about that thing?") == "invoice"
+    assert local.stats()["memo_hits"] == 1
+
+
+def test_split_mode_is_stable_per_thread():
+    assert routing_mode("thread-1", "split") == routing_mode("thread-1", "split")
+    assert {routing_mode(f"t{i}", "split") for i in range(20)} == {"single", "two_hop"}
+    assert route_from_tools([{"name": "generate_invoice"}]) == "invoice"
+
+
+def _route(text, monkeypatch, reply="unknown"):
+    monkeypatch.setattr(router, "router", Router())
+    monkeypatch.setattr(nodes, "router", router.router)
+    monkeypatch.setattr(llm, "llm", scripted_model([AIMessage(content=reply)]), raising=False)
+    return asyncio.run(nodes.route_task({"messages": [HumanMessage(content=text)]}))
+
+
+def test_route_task_counts_routes_without_printing(monkeypatch, capsys):
+    before = metrics.value("invoice_routes_total", source="local", next="generate_invoice_worker")
+    assert _route("Create the invoice for July", monkeypatch)["next"] == "generate_invoice_worker"
+    assert metrics.value("invoice_routes_total", source="local", next="generate_invoice_worker") == before + 1
+    assert capsys.readouterr().out == ""
+
+
+def test_route_task_asks_the_model_when_the_rules_cannot_tell(monkeypatch):
+    before = metrics.value("invoice_routes_total", source="llm", next="email_worker")
+    assert _route("hmm, the usual please", monkeypatch, reply="email")["next"] == "email_worker"
+    assert metrics.value("invoice_routes_total", source="llm", next="email_worker") == before + 1
+    assert router.router.fast_route("hmm, the usual please") == "email"
+
+
+def _single_mode(monkeypatch, worker_replies):
+    monkeypatch.setattr(router, "ROUTING_MODE", "single")
+    monkeypatch.setattr(router, "router", Router())
+    monkeypatch.setattr(nodes, "router", router.router)
+    # Spare replies at the end keep `i` counting the calls (the fake wraps around after its last reply).
+    classifier = scripted_model([AIMessage(content="attendance"), AIMessage(content="spare")])
+    worker = scripted_model(worker_replies + [AIMessage(content="spare")])
+    monkeypatch.setattr(llm, "llm", classifier, raising=False)
+    monkeypatch.setattr(llm, "llm_with_tools", worker, raising=False)
+    return classifier, worker
+
+
+def test_single_mode_skips_the_classifier_call(monkeypatch):
+    classifier, _ = _single_mode(monkeypatch, [])
+    before = metrics.value("invoice_routes_total", source="single", next="unified_worker")
+    update = asyncio.run(nodes.route_task({"messages": [HumanMessage(content="hmm, the thing from before")]}))
+    assert update["next"] == "unified_worker"
+    assert classifier.i == 0
+    assert metrics.value("invoice_routes_total", source="single", next="unified_worker") == before + 1
+
+
+def test_single_mode_hands_the_tool_loop_to_the_worker_it_picked(workdir, monkeypatch):
+    import app
+
+    save = AIMessage(content="", tool_calls=[{
+        "name": "save_or_update_timesheet", "id": "s1",
+        "args": {"filename": "timesheet_august.xlsx", "date": "2025-08-04", "status": "P", "remarks": "Fixed login bug"},
+    }])
+    classifier, worker = _single_mode(monkeypatch, [save, AIMessage(content="Saved 2025-08-04.")])
+    text = "put down the login bug fix for 4 Aug"
+    state = asyncio.run(app.graph.ainvoke(
+        {"messages": [HumanMessage(content=text)]}, {"configurable": {"thread_id": "single-mode"}},
+    ))
+
+    assert state["messages"][-1].content == "Saved 2025-08-04."
+    assert (classifier.i, worker.i) == (0, 2)  # two model calls instead of three
+    assert state["messages"][-2].content.startswith("Success: The entry for 2025-08-04")
+    assert router.router.fast_route(text, "single") == "attendance"  # remembered for the next time
+    assert router.router.fast_route(text, "two_hop") is None  # but not used to route the other mode
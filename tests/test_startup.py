@@ -0,0 +1,47 @@
+import os
+import sys
+import json
+import subprocess
+
+import startup
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY = ["langchain_openai", "openai", "docx", "sendgrid", "openpyxl", "pandas", "gradio"]
+
+_PROBE = f"""
+import json, sys
+import app, llm
+loaded = sorted(m for m in {HEAVY!r} if m in sys.modules)
+built = bool(llm._clients)
+llm.get_llm()
+print(json.dumps({{"after_import": loaded, "clients_built": built,
+                  "after_first_use": "langchain_openai" in sys.modules}}))
+"""
+
+
+def test_importing_the_app_defers_clients_and_heavy_packages(workdir):
+    env = {**os.environ, "PYTHONPATH": ROOT}
+    out = subprocess.run([sys.executable, "-c", _PROBE], cwd=workdir, env=env, capture_output=True, text=True, check=True)
+    report = json.loads(out.stdout.strip().splitlines()[-1])
+    assert report == {"after_import": [], "clients_built": False, "after_first_use": True}
+
+
+def test_cold_import_is_within_budget():
+    assert startup.measure_import(ROOT) <= startup.STARTUP_BUDGET_SECONDS
+
+
+def test_budget_check():
+    assert startup.check_budget(10.0, 12.5, budget=3.0) == {"seconds": 2.5, "budget": 3.0, "within_budget": True}
+    assert startup.check_budget(10.0, 14.0, budget=3.0)["within_budget"] is False
+
+
+def test_import_breakdown_sums_self_time_per_package(monkeypatch):
+    stderr = "\n".join([
+        "import time: self [us] | cumulative | imported package",
+        "import time:       500 |        500 |   langgraph.graph",
+        "import time:      1500 |       2000 | langgraph",
+        "import time:      2000 |       2000 | app",
+    ])
+    monkeypatch.setattr(subprocess, "run", lambda *a, **k: subprocess.CompletedProcess(a, 0, "", stderr))
+    assert startup.import_breakdown(ROOT) == {"langgraph": 0.002, "app": 0.002}
@@ -0,0 +1,99 @@
+import json
+import socket
+import asyncio
+import logging
+import urllib.request
+
+from langchain_core.messages import AIMessage
+
+import app
+import llm
+import telemetry
+from bench import scripted_model
+from telemetry import JsonFormatter, Metrics, span, start_metrics_server
+from turn_telemetry import TurnTelemetry
+
+
+def test_renders_counters_gauges_and_histograms():
+    registry = Metrics(buckets=(0.1, 1.0))
+    registry.inc("calls_total", 2, "Calls", model="flash")
+    registry.set("threads", 3, "Threads")
+    registry.observe("latency_seconds", 0.5, "Latency", node="tools")
+    registry.observe("latency_seconds", 2.0, "Latency", node="tools")
+    assert registry.render().splitlines() == [
+        "# HELP calls_total Calls",
+        "# TYPE calls_total counter",
+        'calls_total{model="flash"} 2',
+        "# HELP threads Threads",
+        "# TYPE threads gauge",
+        "threads 3",
+        "# HELP latency_seconds Latency",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{node="tools",le="0.1"} 0',
+        'latency_seconds_bucket{node="tools",le="1.0"} 1',
+        'latency_seconds_bucket{node="tools",le="+Inf"} 2',
+        'latency_seconds_sum{node="tools"} 2.5',
+        'latency_seconds_count{node="tools"} 2',
+    ]
+    assert registry.value("calls_total", model="flash") == 2
+
+
+def test_a_failing_collector_does_not_break_the_scrape(caplog):
+    registry = Metrics()
+    registry.add_collector(lambda: 1 / 0)
+    registry.add_collector(lambda: registry.set("up", 1))
+    with caplog.at_level(logging.WARNING, logger="invoice_assistant.telemetry"):
+        assert "up 1" in registry.render()
+    assert any(r.getMessage() == "metrics collector failed" for r in caplog.records)
+
+
+def test_spans_record_latency_and_bytes(monkeypatch):
+    registry = Metrics()
+    monkeypatch.setattr(telemetry, "metrics", registry)
+    with span("io", "xlsx_export") as fields:
+        fields["bytes_written"] = 512
+    assert 'invoice_span_seconds_count{kind="io",name="xlsx_export"} 1' in registry.render()
+    assert registry.value("invoice_io_bytes_total", name="xlsx_export", direction="written") == 512
+
+
+def test_log_lines_are_json():
+    record = logging.LogRecord("t", logging.INFO, __file__, 1, "turn", None, None)
+    record.fields = {"route": "attendance_worker"}
+    line = json.loads(JsonFormatter().format(record))
+    assert (line["event"], line["level"], line["route"]) == ("turn", "info", "attendance_worker")
+
+
+def test_serves_metrics_over_http():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    assert start_metrics_server(port=0) is None
+    server = start_metrics_server(port=port)
+    try:
+        telemetry.metrics.inc("invoice_test_scrapes_total", 1, "Test scrapes")
+        body = urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics").read().decode()
+        assert "invoice_test_scrapes_total 1" in body
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_a_turn_is_summarized(workdir, monkeypatch, caplog):
+    read = AIMessage(content="", tool_calls=[
+        {"name": "read_invoice_data", "args": {"filename": "timesheet_july.xlsx", "date": "2025-07-05"}, "id": "c1"},
+    ], usage_metadata={"input_tokens": 100, "output_tokens": 10, "total_tokens": 110})
+    answer = AIMessage(content="A week off.", usage_metadata={"input_tokens": 150, "output_tokens": 5, "total_tokens": 155})
+    monkeypatch.setattr(llm, "llm_with_tools", scripted_model([read, answer]), raising=False)
+    monkeypatch.setattr(llm, "llm", scripted_model([AIMessage(content="unexpected router call")]), raising=False)
+
+    turn = TurnTelemetry("telemetry-test", routing_mode="two_hop")
+    config = {"configurable": {"thread_id": "telemetry-test"}, "callbacks": [turn]}
+    asyncio.run(app.graph.ainvoke({"messages": [{"role": "user", "content": "Show the timesheet entry for 2025-07-05"}]}, config))
+    with caplog.at_level(logging.INFO, logger="invoice_assistant.telemetry"):
+        summary = turn.finish()
+
+    assert summary["route"] == "attendance_worker"
+    assert (summary["llm_calls"], summary["prompt_tokens"], summary["completion_tokens"]) == (2, 250, 15)
+    assert (summary["tool_calls"], summary["tool_errors"], summary["tool_iterations"]) == (1, 0, 1)
+    assert set(summary["node_seconds"]) == {"route_task", "attendance_worker", "tools"}
+    assert any(r.getMessage() == "turn" and r.fields["thread_id"] == "telemetry-test" for r in caplog.records)
@@ -0,0 +1,81 @@
+import os
+
+from timesheet_cache import TimesheetCache, estimate_bytes, file_stamp
+from timesheet_store import TimesheetStore
+
+ROWS = [("2025-07-01", "P", "Worked"), ("2025-07-02", "L", None)]
+
+
+def test_a_changed_stamp_is_a_miss():
+    cache = TimesheetCache()
+    cache.put("july", (1, 100), ROWS)
+    assert cache.get("july", (1, 100)) is ROWS
+    assert cache.get("july", (2, 100)) is None
+    assert cache.stats()["hit_rate"] == 0.5
+
+
+def test_evicts_the_least_recently_used_entry():
+    cache = TimesheetCache(max_entries=2)
+    cache.put("june", 1, ROWS)
+    cache.put("july", 1, ROWS)
+    cache.get("june", 1)
+    cache.put("august", 1, ROWS)
+    assert cache.get("july", 1) is None
+    assert cache.get("june", 1) is ROWS
+    assert cache.stats()["evictions"] == 1
+
+
+def test_is_bounded_by_bytes():
+    size = estimate_bytes(ROWS)
+    cache = TimesheetCache(max_bytes=size * 2)
+    for key in ("june", "july", "august"):
+        cache.put(key, 1, ROWS)
+    assert cache.stats()["entries"] == 2
+    assert cache.stats()["bytes"] == size * 2
+
+    cache.put("huge", 1, ROWS * 10)  # larger than the whole cache: not kept, and evicts nothing
+    assert cache.peek("huge") is None
+    assert cache.stats()["entries"] == 2
+
+
+def test_restamp_keeps_rows_valid_after_a_rewrite():
+    cache = TimesheetCache()
+    cache.put("july", 1, ROWS)
+    cache.restamp("july", 2)
+    assert cache.peek("july") == (2, ROWS)
+    cache.invalidate("july")
+    assert cache.peek("july") is None
+
+
+def test_file_stamp(tmp_path):
+    path = tmp_path / "timesheet_july.xlsx"
+    assert file_stamp(str(path)) is None
+    path.write_bytes(b"12345")
+    assert file_stamp(str(path))[1] == 5
+
+
+def test_store_reads_are_served_from_the_cache(workdir):
+    store = TimesheetStore(str(workdir / "timesheets.db"), str(workdir))
+    rows = store.read("timesheet_august.xlsx")
+    assert store.read("timesheet_august.xlsx") is rows
+    assert store.cache.stats()["hits"] == 1
+
+    # A write goes through to the cached rows, without reloading the sheet.
+    store.upsert("timesheet_august.xlsx", "2025-08-02", "P", "Saturday shift")
+    assert ("2025-08-02", "P", "Saturday shift") in store.cache.peek((store.employee, "timesheet_august.xlsx"))[1]
+    misses = store.cache.stats()["misses"]
+    assert ("2025-08-02", "P", "Saturday shift") in store.read("timesheet_august.xlsx")
+    assert store.cache.stats()["misses"] == misses
+
+    # Exporting rewrites the workbook and trims the journal; the cached rows stay valid.
+    store.export("timesheet_august.xlsx")
+    hits = store.cache.stats()["hits"]
+    assert ("2025-08-02", "P", "Saturday shift") in store.read("timesheet_august.xlsx")
+    assert store.cache.stats()["hits"] == hits + 1
+    assert store.cache.stats()["misses"] == misses
+
+    # Editing the workbook on disk changes its stamp.
+    later = os.path.getmtime(workdir / "timesheet_august.xlsx") + 2
+    os.utime(workdir / "timesheet_august.xlsx", (later, later))
+    store.read("timesheet_august.xlsx")
+    assert store.cache.stats()["misses"] == misses + 1
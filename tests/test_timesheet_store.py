@@ -0,0 +1,175 @@
+import os
+import time
+import logging
+import threading
+
+import pandas as pd
+import pytest
+
+import timesheet_store
+from timesheet_store import TimesheetStore, _apply
+
+
+def _workbook(directory, sheet, rows):
+    path = os.path.join(directory, sheet)
+    pd.DataFrame(rows, columns=["Date", "Status", "Remarks"]).to_excel(path, index=False)
+    return path
+
+
+def _touch_later(path):
+    # Import decisions compare mtimes; make sure an edit is seen as one.
+    later = os.path.getmtime(path) + 2
+    os.utime(path, (later, later))
+
+
+@pytest.fixture
+def store(tmp_path):
+    _workbook(tmp_path, "timesheet_july.xlsx", [
+        ("2025-07-01", "P", "Built the login page"),
+        ("2025-07-02", "L", None),
+        ("2025-07-03", "P", "Fixed invoice totals"),
+    ])
+    return TimesheetStore(str(tmp_path / "timesheets.db"), str(tmp_path))
+
+
+def test_imports_on_first_read_and_filters_by_date(store):
+    assert [r[0] for r in store.read("timesheet_july.xlsx")] == ["2025-07-01", "2025-07-02", "2025-07-03"]
+    assert store.read("timesheet_july.xlsx", start="2025-07-02", end="2025-07-02") == [("2025-07-02", "L", None)]
+    assert store.read("timesheet_missing.xlsx") == []
+
+
+def test_writes_are_read_back_and_exported(store, tmp_path):
+    store.read("timesheet_july.xlsx")
+    assert store.upsert_many("timesheet_july.xlsx", [
+        ("2025-07-02", "P", "Wrote tests"), ("2025-07-04", "WO", None),
+    ]) == [("2025-07-02", "updated"), ("2025-07-04", "added")]
+    assert store.read("timesheet_july.xlsx")[1] == ("2025-07-02", "P", "Wrote tests")
+    assert store.dirty_sheets() == ["timesheet_july.xlsx"]
+
+    store.export("timesheet_july.xlsx")
+    exported = pd.read_excel(tmp_path / "timesheet_july.xlsx")
+    assert list(exported["Date"].astype(str)) == ["2025-07-01", "2025-07-02", "2025-07-03", "2025-07-04"]
+    assert store.dirty_sheets() == []
+
+
+def test_external_edits_are_reimported(store, tmp_path):
+    store.read("timesheet_july.xlsx")
+    path = _workbook(tmp_path, "timesheet_july.xlsx", [("2025-07-01", "A", None)])
+    _touch_later(path)
+    assert store.read("timesheet_july.xlsx") == [("2025-07-01", "A", None)]
+
+
+def test_unexported_writes_win_over_the_file(store, tmp_path):
+    store.upsert("timesheet_july.xlsx", "2025-07-05", "P", "Kept")
+    path = _workbook(tmp_path, "timesheet_july.xlsx", [("2025-07-01", "A", None)])
+    _touch_later(path)
+    assert ("2025-07-05", "P", "Kept") in store.read("timesheet_july.xlsx")
+
+
+def test_importing_a_date_from_another_sheet_moves_it_visibly(store, tmp_path, caplog):
+    store.read("timesheet_july.xlsx")
+    _workbook(tmp_path, "timesheet_august.xlsx", [("2025-07-03", "H", None), ("2025-08-01", "P", "Planning")])
+
+    with caplog.at_level(logging.WARNING, logger="invoice_assistant.telemetry"):
+        store.read("timesheet_august.xlsx")
+
+    assert [r[0] for r in store.read("timesheet_july.xlsx")] == ["2025-07-01", "2025-07-02"]
+    assert "timesheet_july.xlsx" in store.dirty_sheets()
+    removed = store._conn.execute("SELECT sheet, date FROM journal WHERE removed = 1").fetchall()
+    assert removed == [("timesheet_july.xlsx", "2025-07-03")]
+    assert any(r.getMessage() == "dates moved between sheets" for r in caplog.records)
+
+    store.export("timesheet_july.xlsx")
+    assert "2025-07-03" not in set(pd.read_excel(tmp_path / "timesheet_july.xlsx")["Date"].astype(str))
+
+
+def test_listeners_hear_which_months_changed(store):
+    heard = []
+    store.listeners.append(heard.append)
+    store.read("timesheet_july.xlsx")
+    store.upsert("timesheet_july.xlsx", "2025-08-01", "P", "Planning")
+    assert heard == [{"2025-07"}, {"2025-08"}]
+
+
+def test_read_range_spans_sheets(store, tmp_path):
+    _workbook(tmp_path, "timesheet_august.xlsx", [("2025-08-01", "P", "Planning")])
+    store.read("timesheet_july.xlsx")
+    store.read("timesheet_august.xlsx")
+    assert [r[0] for r in store.read_range("2025-07-03", "2025-08-31")] == ["2025-07-03", "2025-08-01"]
+
+
+def test_two_stores_on_one_database_see_each_others_writes(store, tmp_path):
+    other = TimesheetStore(store.db_path, store.data_dir)
+    store.read("timesheet_july.xlsx")
+    other.upsert("timesheet_july.xlsx", "2025-07-02", "P", "From the other process")
+    assert store.read("timesheet_july.xlsx")[1] == ("2025-07-02", "P", "From the other process")
+
+
+def _journal(store):
+    return store._conn.execute("SELECT COUNT(*) FROM journal").fetchone()[0]
+
+
+def test_writes_go_to_the_journal_not_the_workbook(store, tmp_path):
+    store.read("timesheet_july.xlsx")
+    stamp = os.stat(tmp_path / "timesheet_july.xlsx").st_mtime_ns
+    store.upsert_many("timesheet_july.xlsx", [("2025-07-04", "P", "A"), ("2025-07-05", "WO", None)])
+    assert os.stat(tmp_path / "timesheet_july.xlsx").st_mtime_ns == stamp
+    assert _journal(store) == 2
+
+    store.export("timesheet_july.xlsx")
+    assert _journal(store) == 0
+    assert store.dirty_sheets() == []
+    assert store.export("timesheet_july.xlsx") == str(tmp_path / "timesheet_july.xlsx")  # clean: nothing to write
+    assert os.stat(tmp_path / "timesheet_july.xlsx").st_mtime_ns != stamp
+
+
+def test_concurrent_writers_lose_nothing(store, tmp_path):
+    store.read("timesheet_july.xlsx")
+    writers = [TimesheetStore(store.db_path, store.data_dir) for _ in range(4)]
+
+    def write(n, writer):
+        for day in range(n * 5 + 4, n * 5 + 9):
+            writer.upsert("timesheet_july.xlsx", f"2025-07-{day:02d}", "P", f"writer {n}")
+
+    threads = [threading.Thread(target=write, args=(n, w)) for n, w in enumerate(writers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(store.read("timesheet_july.xlsx")) == 3 + 20
+    store.export("timesheet_july.xlsx")
+    assert len(pd.read_excel(tmp_path / "timesheet_july.xlsx")) == 23
+
+
+def test_the_compactor_exports_idle_sheets(store, tmp_path):
+    store.upsert("timesheet_july.xlsx", "2025-07-04", "P", "Compacted")
+    store.start_compactor(interval=0.05, idle=0)
+    deadline = time.time() + 5
+    while store.dirty_sheets() and time.time() < deadline:
+        time.sleep(0.05)
+    assert store.dirty_sheets() == []
+    assert "2025-07-04" in set(pd.read_excel(tmp_path / "timesheet_july.xlsx")["Date"].astype(str))
+
+
+def test_journal_changes_apply_in_order():
+    rows = [("2025-07-01", "P", None), ("2025-07-03", "L", None)]
+    changes = [
+        ("2025-07-02", "P", "new", 0),
+        ("2025-07-03", "A", None, 0),
+        ("2025-07-01", None, None, 1),
+        ("2025-07-09", None, None, 1),  # removing a date that is not there is a no-op
+    ]
+    assert _apply(rows, changes) == [("2025-07-02", "P", "new"), ("2025-07-03", "A", None)]
+    assert rows == [("2025-07-01", "P", None), ("2025-07-03", "L", None)]
+
+
+def test_a_failed_export_on_exit_is_logged(store, monkeypatch, caplog):
+    store.upsert("timesheet_july.xlsx", "2025-07-04", "P", "Unsaved")
+    monkeypatch.setattr(timesheet_store, "_stores", {"test": store})
+    monkeypatch.setattr(store, "export", lambda sheet: 1 / 0)
+    with caplog.at_level(logging.ERROR, logger="invoice_assistant.telemetry"):
+        timesheet_store._export_on_exit()
+    (record,) = [r for r in caplog.records if r.getMessage() == "export on exit failed"]
+    assert record.fields == {"sheet": "timesheet_july.xlsx"}
+    assert record.exc_info[0] is ZeroDivisionError
@@ -0,0 +1,77 @@
+import asyncio
+
+from langchain_core.messages import AIMessage
+
+import tools
+from timesheet_store import TimesheetStore
+from tool_node import make_tool_node
+
+
+def _call(name, id, **args):
+    return {"name": name, "args": args, "id": id}
+
+
+def _run(calls, monkeypatch):
+    writes = []
+    upsert_many = TimesheetStore.upsert_many
+
+    def counted(self, sheet, entries):
+        entries = list(entries)
+        writes.append((sheet, [e[0] for e in entries]))
+        return upsert_many(self, sheet, entries)
+
+    monkeypatch.setattr(TimesheetStore, "upsert_many", counted)
+    node = make_tool_node(tools.tools)
+    state = {"messages": [AIMessage(content="", tool_calls=calls)]}
+    return asyncio.run(node(state, {})), writes
+
+
+def test_saves_on_one_file_are_one_write(workdir, monkeypatch):
+    update, writes = _run([
+        _call("save_or_update_timesheet", "a", filename="timesheet_august.xlsx", date="2025-08-04", status="P", remarks="x"),
+        _call("save_or_update_timesheet", "b", filename="timesheet_august.xlsx", date="2025-08-05", status="L", remarks=""),
+        _call("save_or_update_timesheet_bulk", "c", filename="timesheet_august.xlsx",
+              start_date="2025-08-06", end_date="2025-08-07", status="P"),
+    ], monkeypatch)
+
+    assert writes == [("timesheet_august.xlsx", ["2025-08-04", "2025-08-05", "2025-08-06", "2025-08-07"])]
+    assert [m.tool_call_id for m in update["messages"]] == ["a", "b", "c"]
+    assert update["messages"][0].content == "Success: The entry for 2025-08-04 was added in timesheet_august.xlsx."
+    assert update["messages"][2].content.startswith("Success: 2 entries saved in timesheet_august.xlsx.")
+
+
+def test_a_read_between_saves_sees_the_first_save(workdir, monkeypatch):
+    update, writes = _run([
+        _call("save_or_update_timesheet", "a", filename="timesheet_august.xlsx", date="2025-08-04", status="P", remarks="x"),
+        _call("read_invoice_data", "b", filename="timesheet_august.xlsx", date="2025-08-04"),
+        _call("save_or_update_timesheet", "c", filename="timesheet_august.xlsx", date="2025-08-05", status="P", remarks=""),
+    ], monkeypatch)
+    assert len(writes) == 2
+    assert update["messages"][1].content == "Timesheet Records:\n2025-08-04 | P | x"
+
+
+def test_files_are_handled_separately_and_results_keep_call_order(workdir, monkeypatch):
+    update, writes = _run([
+        _call("save_or_update_timesheet", "a", filename="timesheet_july.xlsx", date="2025-07-04", status="P", remarks=""),
+        _call("save_or_update_timesheet", "b", filename="timesheet_august.xlsx", date="2025-08-04", status="P", remarks=""),
+        _call("get_leave_balance", "c", month="2025-07"),
+        _call("save_or_update_timesheet", "d", filename="timesheet_july.xlsx", date="2025-07-07", status="P", remarks=""),
+    ], monkeypatch)
+    assert sorted(writes) == [
+        ("timesheet_august.xlsx", ["2025-08-04"]),
+        ("timesheet_july.xlsx", ["2025-07-04", "2025-07-07"]),
+    ]
+    assert [m.tool_call_id for m in update["messages"]] == ["a", "b", "c", "d"]
+
+
+def test_bad_calls_fail_alone(workdir, monkeypatch):
+    update, writes = _run([
+        _call("save_or_update_timesheet", "a", filename="timesheet_august.xlsx", date="2025-08-04", status="P", remarks=""),
+        _call("save_or_update_timesheet_bulk", "b", filename="timesheet_august.xlsx", start_date="2025-08-05"),
+        _call("no_such_tool", "c"),
+    ], monkeypatch)
+    assert writes == [("timesheet_august.xlsx", ["2025-08-04"])]
+    assert update["messages"][0].content.startswith("Success")
+    assert update["messages"][1].content == "Error: A date range needs 'start_date', 'end_date' and 'status'."
+    assert update["messages"][2].status == "error"
+    assert "no_such_tool is not a valid tool" in update["messages"][2].content
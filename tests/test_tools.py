@@ -0,0 +1,140 @@
+import time
+import asyncio
+import threading
+import contextvars
+
+import outbox
+import tools
+
+
+class QueuedMail:
+    def __init__(self):
+        self.jobs = []
+
+    def enqueue(self, from_email, to_email, subject, body, attachments):
+        self.jobs.append({"to": to_email, "subject": subject, "body": body, "attachments": attachments})
+        return len(self.jobs)
+
+
+def _send(monkeypatch, xlsx):
+    mail = QueuedMail()
+    monkeypatch.setattr(outbox, "get_outbox", lambda: mail)
+    monkeypatch.setenv("FROM_EMAIL", "me@example.com")
+    monkeypatch.setenv("TO_EMAIL", "boss@example.com")
+    result = tools.send_email_with_attachments(xlsx, "invoice_missing.docx")
+    return result, mail.jobs
+
+
+def test_email_names_the_invoiced_month(workdir, monkeypatch):
+    result, jobs = _send(monkeypatch, "timesheet_august.xlsx")
+    assert "queued as job #1" in result
+    assert "for the month of August 2025." in jobs[0]["body"]
+    assert [p.endswith("timesheet_august.xlsx") for p in jobs[0]["attachments"]] == [True]
+
+
+def test_email_without_a_timesheet_fails_cleanly(workdir, monkeypatch):
+    result, jobs = _send(monkeypatch, "timesheet_march.xlsx")
+    assert result == "Failure: No valid files found in the current directory to attach."
+    assert jobs == []
+
+
+def test_bulk_save_mixes_entries_and_a_weekday_range(workdir):
+    result = tools.save_or_update_timesheet_bulk(
+        "timesheet_august.xlsx",
+        entries=[{"date": "2025-08-01", "status": "L", "remarks": "Sick"}],
+        start_date="2025-08-08", end_date="2025-08-12", status="P", remarks="Worked",
+    )
+    assert result.splitlines() == [
+        "Success: 4 entries saved in timesheet_august.xlsx.",
+        "2025-08-01: updated",
+        "2025-08-08: added",  # Friday; the weekend is skipped
+        "2025-08-11: added",
+        "2025-08-12: added",
+    ]
+    records = tools.read_invoice_data("timesheet_august.xlsx", start_date="2025-08-01", end_date="2025-08-12")
+    assert "2025-08-01 | L | Sick" in records
+    assert "2025-08-09" not in records
+
+
+def test_bulk_save_can_include_weekends(workdir):
+    result = tools.save_or_update_timesheet_bulk(
+        "timesheet_august.xlsx", start_date="2025-08-09", end_date="2025-08-10", status="WO", include_weekends=True,
+    )
+    assert result.startswith("Success: 2 entries saved")
+
+
+def test_bulk_save_rejects_incomplete_arguments(workdir):
+    assert tools.save_or_update_timesheet_bulk("timesheet_august.xlsx") == (
+        "Error: No entries to save. Provide 'entries' or a date range."
+    )
+    assert tools.save_or_update_timesheet_bulk("timesheet_august.xlsx", start_date="2025-08-04") == (
+        "Error: A date range needs 'start_date', 'end_date' and 'status'."
+    )
+    assert tools.save_or_update_timesheet_bulk("timesheet_august.xlsx", entries=[{"date": "2025-08-04"}]).startswith(
+        "Error: Every entry needs a 'date' and a 'status'"
+    )
+
+
+def test_read_filters_by_date_range_and_status(workdir):
+    assert tools.read_invoice_data("timesheet_july.xlsx", status="wo", start_date="2025-07-01", end_date="2025-07-14") == (
+        "Timesheet Records:\n2025-07-05 | WO | \n2025-07-06 | WO | \n2025-07-12 | WO | \n2025-07-13 | WO | "
+    )
+    assert tools.read_invoice_data("timesheet_august.xlsx", date="2025-08-13") == (
+        "Timesheet Records:\n2025-08-13 | P | Marked as Present"
+    )
+    assert tools.read_invoice_data("timesheet_august.xlsx", date="2025-08-14") == (
+        "No timesheet records match the given filters."
+    )
+
+
+def test_read_summarizes_an_iso_week(workdir):
+    assert tools.read_invoice_data("timesheet_july.xlsx", week="2025-W28", summary=True).splitlines() == [
+        "Timesheet Summary (2025-07-07 to 2025-07-13, 7 records):",
+        "-: 5",
+        "WO: 2",
+        "Runs:",
+        "2025-07-07 to 2025-07-11 | - (5 days)",
+        "2025-07-12 to 2025-07-13 | WO (2 days)",
+    ]
+
+
+def test_read_reports_a_missing_file(workdir):
+    assert tools.read_invoice_data("timesheet_march.xlsx") == (
+        "Error reading Excel timesheet: timesheet_march.xlsx does not exist."
+    )
+
+
+def test_blocking_work_runs_off_the_event_loop():
+    request = contextvars.ContextVar("request")
+
+    def blocking(seconds):
+        time.sleep(seconds)
+        return threading.current_thread().name, request.get()
+
+    async def main():
+        request.set("turn-1")
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        beat = asyncio.create_task(ticker())
+        started = time.perf_counter()
+        results = await asyncio.gather(*(tools.run_blocking(blocking)(0.2) for _ in range(3)))
+        elapsed = time.perf_counter() - started
+        beat.cancel()
+        return results, elapsed, ticks
+
+    results, elapsed, ticks = asyncio.run(main())
+    assert all(name.startswith("tool") and value == "turn-1" for name, value in results)
+    assert elapsed < 0.5  # the three calls overlapped
+    assert ticks >= 5  # and the loop kept running meanwhile
+
+
+def test_every_tool_has_an_async_path(workdir):
+    assert all(tool.coroutine is not None for tool in tools.tools)
+    result = asyncio.run(tools.tool_read_timesheet.ainvoke({"filename": "timesheet_august.xlsx", "date": "2025-08-01"}))
+    assert result == "Timesheet Records:\n2025-08-01 | P | Marked as Present"
@@ -0,0 +1,88 @@
+import asyncio
+import datetime
+
+import pytest
+
+import workflow
+from workflow import resolve_month, resolve_recipient, run_stages, summarize
+
+TODAY = datetime.date(2025, 1, 15)
+
+
+@pytest.mark.parametrize("text, month", [
+    ("Generate the July invoice", "july"),
+    ("the march invoice", "march"),
+    ("invoice for may", "may"),
+    ("generate the may 2025 invoice", "may"),
+    ("timesheet for 3rd of May", "may"),
+    ("email the jul 2025 invoice", "july"),
+    ("Dec 5th", "december"),
+    ("sept '24 please", "september"),
+    ("May I get the invoice for August?", "august"),
+])
+def test_named_months(text, month):
+    assert resolve_month(text, TODAY) == month
+
+
+@pytest.mark.parametrize("text", [
+    "may I get the invoice",
+    "May I have it emailed?",
+    "mar the plan",
+    "jan said to send the invoice",
+])
+def test_words_that_look_like_months_are_not_months(text):
+    assert resolve_month(text, TODAY) == "january"
+
+
+@pytest.mark.parametrize("text, month", [
+    ("email the invoice for last month", "december"),
+    ("the previous month please", "december"),
+    ("this month's invoice", "january"),
+    ("plan next month", "february"),
+])
+def test_relative_months(text, month):
+    assert resolve_month(text, TODAY) == month
+
+
+def test_recipient():
+    assert resolve_recipient("send it to boss@example.com.") == "boss@example.com"
+    assert resolve_recipient("send it to my manager") is None
+
+
+def _steps(calls, failing=()):
+    def step(name):
+        async def run(ctx, results, config):
+            calls.append((name, sorted(results)))
+            output = f"Error: {name} broke" if name in failing else f"{name} done"
+            return {"output": output}
+        return run
+
+    return {
+        "invoice": ((), step("invoice")),
+        "recipient": ((), step("recipient")),
+        "email": (("recipient", "invoice"), step("email")),
+    }
+
+
+def test_steps_run_after_the_steps_they_need(monkeypatch):
+    calls = []
+    monkeypatch.setattr(workflow, "STEPS", _steps(calls))
+    results = asyncio.run(run_stages(["invoice", "email"], "July invoice"))
+    assert [name for name, _ in calls[:2]] == ["invoice", "recipient"]
+    assert calls[2] == ("email", ["invoice", "recipient"])
+    assert summarize(["invoice", "email"], results) == "invoice done\n\nrecipient done\n\nemail done"
+
+
+def test_a_failed_step_skips_the_steps_that_need_it(monkeypatch):
+    calls = []
+    monkeypatch.setattr(workflow, "STEPS", _steps(calls, failing={"invoice"}))
+    results = asyncio.run(run_stages(["invoice", "email"], "July invoice"))
+    assert "email" not in [name for name, _ in calls]
+    assert results["email"] == {"output": "Error: Skipped because invoice failed.", "skipped": True}
+
+
+def test_results_already_present_are_not_run_again(monkeypatch):
+    calls = []
+    monkeypatch.setattr(workflow, "STEPS", _steps(calls))
+    asyncio.run(run_stages(["email"], "July", results={"recipient": {"to_email": None, "output": "cached"}}))
+    assert [name for name, _ in calls] == ["email"]
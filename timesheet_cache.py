@@ -0,0 +1,96 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Hashable, List, Optional, Tuple
+
+ROW_OVERHEAD_BYTES = 64
+
+
+def file_stamp(path: str) -> Optional[Tuple[int, int]]:
+    """(mtime_ns, size) of a file, or None if it does not exist."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def estimate_bytes(rows: List[tuple]) -> int:
+    return sum(ROW_OVERHEAD_BYTES + sum(len(v) for v in row if v) for row in rows)
+
+
+class TimesheetCache:
+    """
+    In-process LRU cache of parsed timesheet rows.
+
+    Entries are validated against a stamp (the workbook's mtime and size plus the
+    store's journal position) and the cache is bounded both by entry count and
+    by an estimate of the bytes held.
+    """
+
+    def __init__(self, max_entries: int = 64, max_bytes: int = 32 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (stamp, rows, nbytes)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, stamp) -> Optional[List[tuple]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != stamp:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Hashable, stamp, rows: List[tuple]) -> None:
+        nbytes = estimate_bytes(rows)
+        with self._lock:
+            self._discard(key)
+            if nbytes > self.max_bytes:
+                return
+            self._entries[key] = (stamp, rows, nbytes)
+            self._bytes += nbytes
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._discard(oldest)
+                self.evictions += 1
+
+    def restamp(self, key: Hashable, stamp) -> None:
+        """Keeps an entry valid after its backing file was rewritten from the cached rows."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries[key] = (stamp, entry[1], entry[2])
+
+    def peek(self, key: Hashable):
+        """Returns (stamp, rows) without touching LRU order or counters, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            return (entry[0], entry[1]) if entry else None
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._discard(key)
+
+    def _discard(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
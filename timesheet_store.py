@@ -0,0 +1,477 @@
+import os
+import json
+import time
+import sqlite3
+import atexit
+import bisect
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import List, Optional, Tuple
+
+from timesheet_cache import TimesheetCache, file_stamp
+from telemetry import span, logger, metrics
+
+DEFAULT_EMPLOYEE = os.getenv("EMPLOYEE_ID", "50391")
+CACHE_MAX_ENTRIES = int(os.getenv("TIMESHEET_CACHE_ENTRIES", "64"))
+CACHE_MAX_BYTES = int(os.getenv("TIMESHEET_CACHE_BYTES", str(32 * 1024 * 1024)))
+COMPACT_INTERVAL = float(os.getenv("TIMESHEET_COMPACT_INTERVAL", "30"))
+COMPACT_IDLE = float(os.getenv("TIMESHEET_COMPACT_IDLE", "5"))
+COLUMNS = ["Date", "Status", "Remarks"]
+
+Row = Tuple[str, Optional[str], Optional[str]]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    employee TEXT NOT NULL,
+    date     TEXT NOT NULL,
+    sheet    TEXT NOT NULL,
+    status   TEXT,
+    remarks  TEXT,
+    PRIMARY KEY (employee, date)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS entries_by_sheet ON entries (employee, sheet, date);
+CREATE TABLE IF NOT EXISTS sheets (
+    employee     TEXT NOT NULL,
+    sheet        TEXT NOT NULL,
+    synced_mtime REAL,
+    dirty        INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (employee, sheet)
+);
+CREATE TABLE IF NOT EXISTS journal (
+    seq      INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts       REAL NOT NULL,
+    employee TEXT NOT NULL,
+    sheet    TEXT NOT NULL,
+    date     TEXT NOT NULL,
+    status   TEXT,
+    remarks  TEXT,
+    removed  INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS journal_by_sheet ON journal (employee, sheet, seq);
+"""
+
+
+def _clean(value) -> Optional[str]:
+    """Turns pandas NaN/None and blank cells into None, everything else into a stripped string."""
+    if value is None or value != value:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def _normalize_date(value) -> str:
+    return str(value).split(" ")[0]
+
+
+@contextmanager
+def file_lock(path: str):
+    """Exclusive lock on `path`, shared with other processes (fcntl on POSIX, msvcrt on Windows)."""
+    with open(path, "a+b") as f:
+        if os.name == "nt":
+            import msvcrt
+
+            while True:
+                try:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue  # LK_LOCK gives up after ~10 seconds; keep waiting
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def _apply(rows: List[Row], changes) -> List[Row]:
+    """Returns a copy of the date-sorted `rows` with (date, status, remarks, removed) changes applied in order."""
+    rows = list(rows)
+    for date, status, remarks, removed in changes:
+        i = bisect.bisect_left(rows, date, key=lambda r: r[0])
+        present = i < len(rows) and rows[i][0] == date
+        if removed:
+            if present:
+                del rows[i]
+        elif present:
+            rows[i] = (date, status, remarks)
+        else:
+            rows.insert(i, (date, status, remarks))
+    return rows
+
+
+class TimesheetStore:
+    """
+    Timesheet entries keyed by (employee, date) in SQLite. A date belongs to
+    one sheet: writing or importing it into another sheet moves it there, and
+    the move is journaled as a removal from the old sheet.
+
+    The `timesheet_<month>.xlsx` files are only an import/export format: a sheet
+    is imported the first time it is touched (or when the file changes on disk)
+    and exported again on demand, e.g. right before it is emailed.
+
+    Every write is also appended to a journal. Whole-sheet reads are served
+    from a `TimesheetCache` validated by the workbook's mtime/size and the
+    journal position. Writes are applied to the cached copy as they commit;
+    journal entries from other processes are merged in on the next read
+    instead of reloading the sheet. Writes cost O(log n) and never rewrite the
+    workbook; a background compactor exports idle dirty sheets and trims their
+    journal.
+
+    File work (import/export) holds a per-sheet lock and a cross-process lock
+    file next to the workbook; database writes are serialized by SQLite.
+
+    Callables in `listeners` are told which months ('YYYY-MM') an import or a
+    write touched, e.g. so the leave ledger can recompute just those.
+    """
+
+    def __init__(self, db_path: str, data_dir: str, employee: str = DEFAULT_EMPLOYEE):
+        self.db_path = db_path
+        self.data_dir = data_dir
+        self.employee = employee
+        self._lock = threading.RLock()  # guards the shared connection
+        self._sheet_locks = defaultdict(threading.Lock)
+        self._compactor = None
+        self.listeners = []
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self.cache = TimesheetCache(CACHE_MAX_ENTRIES, CACHE_MAX_BYTES)
+
+    # --- Import / Export ---
+
+    def path_for(self, sheet: str) -> str:
+        return os.path.join(self.data_dir, sheet)
+
+    def lock_path(self, sheet: str) -> str:
+        return self.path_for(sheet) + ".lock"
+
+    def _needs_import(self, sheet: str, mtime: float) -> bool:
+        with self._lock:
+            state = self._conn.execute(
+                "SELECT synced_mtime, dirty FROM sheets WHERE employee = ? AND sheet = ?",
+                (self.employee, sheet),
+            ).fetchone()
+        # Local changes that have not been exported yet win over the file.
+        return not (state and (state[0] == mtime or state[1]))
+
+    def sync(self, sheet: str) -> None:
+        """Imports the sheet's .xlsx file if the store has not seen this version of it yet."""
+        path = self.path_for(sheet)
+        if not os.path.exists(path) or not self._needs_import(sheet, os.path.getmtime(path)):
+            return
+        with self._sheet_locks[sheet], file_lock(self.lock_path(sheet)):
+            mtime = os.path.getmtime(path)
+            # Another thread or process may have imported or exported it while we waited.
+            if self._needs_import(sheet, mtime):
+                self._import(sheet, path, mtime)
+
+    def _import(self, sheet: str, path: str, mtime: float) -> None:
+        import pandas as pd
+
+        with span("io", "xlsx_import", sheet=sheet, bytes_read=os.path.getsize(path)) as fields:
+            df = pd.read_excel(path)
+            fields["rows"] = len(df)
+        rows = [
+            (self.employee, _normalize_date(r.get("Date")), sheet, _clean(r.get("Status")), _clean(r.get("Remarks")))
+            for r in df.to_dict("records")
+            if _clean(r.get("Date"))
+        ]
+        months = {r[1][:7] for r in rows}
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # A write that landed while the file was being parsed makes the sheet dirty; keep it.
+                if not self._needs_import(sheet, mtime):
+                    self._conn.execute("ROLLBACK")
+                    return
+                months.update(m for (m,) in self._conn.execute(
+                    "SELECT DISTINCT substr(date, 1, 7) FROM entries WHERE employee = ? AND sheet = ?",
+                    (self.employee, sheet),
+                ))
+                moved = self._conn.execute(
+                    "SELECT date, sheet FROM entries WHERE employee = ? AND sheet != ? "
+                    "AND date IN (SELECT value FROM json_each(?))",
+                    (self.employee, sheet, json.dumps([r[1] for r in rows])),
+                ).fetchall()
+                self._conn.executemany(
+                    "INSERT INTO journal (ts, employee, sheet, date, removed) VALUES (?, ?, ?, ?, 1)",
+                    [(time.time(), self.employee, other, date) for date, other in moved],
+                )
+                for other in {other for _, other in moved}:
+                    self._mark(other, dirty=1)
+                self._conn.execute("DELETE FROM entries WHERE employee = ? AND sheet = ?", (self.employee, sheet))
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO entries (employee, date, sheet, status, remarks) VALUES (?, ?, ?, ?, ?)",
+                    rows,
+                )
+                self._conn.execute("DELETE FROM journal WHERE employee = ? AND sheet = ?", (self.employee, sheet))
+                self._mark(sheet, synced_mtime=mtime, dirty=0)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            finally:
+                self.cache.invalidate((self.employee, sheet))
+        if moved:
+            metrics.inc("invoice_timesheet_moved_dates_total", len(moved), "Dates moved to another sheet by an import")
+            logger.warning("dates moved between sheets", extra={"fields": {
+                "sheet": sheet, "from": sorted({other for _, other in moved}), "dates": len(moved),
+                "first": min(date for date, _ in moved),
+            }})
+        self._notify(months)
+
+    def export(self, sheet: str, force: bool = False) -> str:
+        """
+        Writes the sheet back to its .xlsx file if it changed since the last sync
+        and trims the journal it folded in. Returns the path.
+        """
+        import pandas as pd
+
+        path = self.path_for(sheet)
+        self.sync(sheet)
+        with self._sheet_locks[sheet], file_lock(self.lock_path(sheet)):
+            with self._lock:
+                state = self._conn.execute(
+                    "SELECT dirty FROM sheets WHERE employee = ? AND sheet = ?", (self.employee, sheet)
+                ).fetchone()
+                if not force and os.path.exists(path) and not (state and state[0]):
+                    return path
+                head = self._head(sheet)
+                cached = self.cache.peek((self.employee, sheet))
+                if cached is not None and cached[0] == (file_stamp(path), head):
+                    rows = cached[1]
+                else:
+                    rows = self._conn.execute(
+                        "SELECT date, status, remarks FROM entries WHERE employee = ? AND sheet = ? ORDER BY date",
+                        (self.employee, sheet),
+                    ).fetchall()
+
+            # Writes may continue while the file is written; they stay in the journal.
+            with span("io", "xlsx_export", sheet=sheet) as fields:
+                tmp = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.{os.getpid()}.tmp.xlsx")
+                pd.DataFrame(rows, columns=COLUMNS).to_excel(tmp, index=False)
+                os.replace(tmp, path)
+                fields.update(rows=len(rows), bytes_written=os.path.getsize(path))
+
+            with self._lock:
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    self._conn.execute(
+                        "DELETE FROM journal WHERE employee = ? AND sheet = ? AND seq <= ?", (self.employee, sheet, head)
+                    )
+                    later = self._conn.execute(
+                        "SELECT EXISTS (SELECT 1 FROM journal WHERE employee = ? AND sheet = ?)", (self.employee, sheet)
+                    ).fetchone()[0]
+                    self._mark(sheet, synced_mtime=os.path.getmtime(path), dirty=int(later))
+                    self._conn.execute("COMMIT")
+                except Exception:
+                    self._conn.execute("ROLLBACK")
+                    raise
+                cached = self.cache.peek((self.employee, sheet))
+                if cached is not None and cached[0][1] == head:
+                    # With the journal trimmed the sheet's head drops back to 0; writes made
+                    # during the export stay after `head` and are merged on the next read.
+                    self.cache.restamp((self.employee, sheet), (file_stamp(path), head if later else 0))
+        return path
+
+    def dirty_sheets(self, idle: float = 0.0) -> List[str]:
+        """Sheets with unexported changes whose last write is at least `idle` seconds old."""
+        with self._lock:
+            return [
+                s for (s,) in self._conn.execute(
+                    "SELECT s.sheet FROM sheets s WHERE s.employee = ? AND s.dirty = 1 AND COALESCE(("
+                    "SELECT MAX(j.ts) FROM journal j WHERE j.employee = s.employee AND j.sheet = s.sheet), 0) <= ?",
+                    (self.employee, time.time() - idle),
+                )
+            ]
+
+    def export_dirty(self) -> List[str]:
+        return [self.export(s) for s in self.dirty_sheets()]
+
+    def start_compactor(self, interval: float = COMPACT_INTERVAL, idle: float = COMPACT_IDLE) -> None:
+        """Exports dirty sheets in the background once they have been idle for `idle` seconds."""
+        if self._compactor is not None or interval <= 0:
+            return
+
+        def run():
+            while True:
+                time.sleep(interval)
+                for sheet in self.dirty_sheets(idle):
+                    try:
+                        self.export(sheet)
+                    except Exception as e:
+                        logger.warning("compaction failed", extra={"fields": {"sheet": sheet, "error": str(e)}})
+
+        self._compactor = threading.Thread(target=run, name="timesheet-compactor", daemon=True)
+        self._compactor.start()
+
+    def _notify(self, months) -> None:
+        for listener in self.listeners:
+            listener(months)
+
+    def _mark(self, sheet: str, synced_mtime=None, dirty: int = 0) -> None:
+        self._conn.execute(
+            "INSERT INTO sheets (employee, sheet, synced_mtime, dirty) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (employee, sheet) DO UPDATE SET "
+            "synced_mtime = COALESCE(excluded.synced_mtime, sheets.synced_mtime), dirty = excluded.dirty",
+            (self.employee, sheet, synced_mtime, dirty),
+        )
+
+    # --- Reads ---
+
+    def _head(self, sheet: str) -> int:
+        """Sequence number of the sheet's latest journal entry (0 if none)."""
+        return self._conn.execute(
+            "SELECT COALESCE(MAX(seq), 0) FROM journal WHERE employee = ? AND sheet = ?", (self.employee, sheet)
+        ).fetchone()[0]
+
+    def _catch_up(self, sheet: str, stamp) -> int:
+        """
+        Merges the journal entries newer than the cached copy of `sheet` into it
+        instead of reloading the sheet. Call with the lock held; returns the head.
+        """
+        head = self._head(sheet)
+        cached = self.cache.peek((self.employee, sheet))
+        if cached is not None and cached[0][0] == stamp and cached[0][1] < head:
+            changes = self._conn.execute(
+                "SELECT date, status, remarks, removed FROM journal "
+                "WHERE employee = ? AND sheet = ? AND seq > ? ORDER BY seq",
+                (self.employee, sheet, cached[0][1]),
+            ).fetchall()
+            self.cache.put((self.employee, sheet), (stamp, head), _apply(cached[1], changes))
+        return head
+
+    def read(self, sheet: str, start: Optional[str] = None, end: Optional[str] = None) -> List[Row]:
+        """Returns (date, status, remarks) rows of a sheet ordered by date, optionally within [start, end]."""
+        key = (self.employee, sheet)
+        path = self.path_for(sheet)
+        stamp = file_stamp(path)
+        with self._lock:
+            head = self._catch_up(sheet, stamp)
+            rows = self.cache.get(key, (stamp, head))
+        if rows is None:
+            self.sync(sheet)
+            with self._lock:
+                stamp = file_stamp(path)
+                head = self._head(sheet)
+                rows = self._conn.execute(
+                    "SELECT date, status, remarks FROM entries WHERE employee = ? AND sheet = ? ORDER BY date",
+                    (self.employee, sheet),
+                ).fetchall()
+                self.cache.put(key, (stamp, head), rows)
+        if start or end:
+            lo = bisect.bisect_left(rows, start, key=lambda r: r[0]) if start else 0
+            hi = bisect.bisect_right(rows, end, key=lambda r: r[0]) if end else len(rows)
+            return rows[lo:hi]
+        return rows
+
+    def read_range(self, start: str, end: str) -> List[Row]:
+        """Returns the employee's rows across all sheets between two dates (inclusive)."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT date, status, remarks FROM entries WHERE employee = ? AND date BETWEEN ? AND ? ORDER BY date",
+                (self.employee, start, end),
+            ).fetchall()
+
+    def status_counts_since(self, month: Optional[str] = None) -> List[Tuple[str, str, int]]:
+        """
+        (month 'YYYY-MM', upper-cased status, entries) for every month from
+        `month` on (all months when None), across all sheets.
+        """
+        with self._lock:
+            return self._conn.execute(
+                "SELECT substr(date, 1, 7), UPPER(status), COUNT(*) FROM entries "
+                "WHERE employee = ? AND date GLOB '[0-9][0-9][0-9][0-9]-[0-1][0-9]-*' AND date >= ? "
+                "GROUP BY 1, 2",
+                (self.employee, month or ""),
+            ).fetchall()
+
+    # --- Writes ---
+
+    def upsert(self, sheet: str, date: str, status: str, remarks: str = None) -> str:
+        """Adds or updates the entry for `date`. Returns 'added' or 'updated'."""
+        return self.upsert_many(sheet, [(date, status, remarks)])[0][1]
+
+    def upsert_many(self, sheet: str, entries) -> List[Tuple[str, str]]:
+        """
+        Adds or updates several (date, status, remarks) entries in one transaction.
+        Returns (date, 'added' | 'updated') for each entry, in input order.
+        """
+        entries = [(_normalize_date(d), _clean(s), _clean(r)) for d, s, r in entries]
+        self.sync(sheet)
+        now = time.time()
+        with self._lock:
+            results = []
+            moved_from = set()
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for date, status, remarks in entries:
+                    exists = self._conn.execute(
+                        "SELECT sheet FROM entries WHERE employee = ? AND date = ?", (self.employee, date)
+                    ).fetchone()
+                    if exists and exists[0] != sheet:
+                        # The date moves to this sheet; the old sheet's copy is removed.
+                        moved_from.add(exists[0])
+                        self._conn.execute(
+                            "INSERT INTO journal (ts, employee, sheet, date, removed) VALUES (?, ?, ?, ?, 1)",
+                            (now, self.employee, exists[0], date),
+                        )
+                    self._conn.execute(
+                        "INSERT INTO entries (employee, date, sheet, status, remarks) VALUES (?, ?, ?, ?, ?) "
+                        "ON CONFLICT (employee, date) DO UPDATE SET "
+                        "sheet = excluded.sheet, status = excluded.status, remarks = excluded.remarks",
+                        (self.employee, date, sheet, status, remarks),
+                    )
+                    self._conn.execute(
+                        "INSERT INTO journal (ts, employee, sheet, date, status, remarks) VALUES (?, ?, ?, ?, ?, ?)",
+                        (now, self.employee, sheet, date, status, remarks),
+                    )
+                    results.append((date, "updated" if exists else "added"))
+                for name in moved_from | {sheet}:
+                    self._mark(name, dirty=1)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            # Write-through: cached copies of the touched sheets take the new rows now.
+            for name in moved_from | {sheet}:
+                self._catch_up(name, file_stamp(self.path_for(name)))
+        self._notify({date[:7] for date, _, _ in entries})
+        return results
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(data_dir: str = None) -> TimesheetStore:
+    """Returns the process-wide store for `data_dir` (defaults to the current directory)."""
+    data_dir = data_dir or os.getcwd()
+    db_path = os.getenv("TIMESHEET_DB") or os.path.join(data_dir, "timesheets.db")
+    with _stores_lock:
+        store = _stores.get((db_path, data_dir))
+        if store is None:
+            store = _stores[(db_path, data_dir)] = TimesheetStore(db_path, data_dir)
+            store.start_compactor()
+        return store
+
+
+@atexit.register
+def _export_on_exit():
+    # Keep the .xlsx files on disk current for anyone opening them after a session.
+    for store in list(_stores.values()):
+        for sheet in store.dirty_sheets():
+            try:
+                store.export(sheet)
+            except Exception:
+                logger.exception("export on exit failed", extra={"fields": {"sheet": sheet}})
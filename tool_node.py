@@ -0,0 +1,96 @@
+import asyncio
+from typing import Dict, List
+
+from langchain_core.messages import AIMessage, ToolMessage
+from langchain_core.runnables import RunnableConfig
+
+from tools import tool_save_timesheet_calls
+
+# The argument naming the timesheet a tool works on; calls on the same file run in order.
+FILE_ARGS = {
+    "read_invoice_data": "filename",
+    "save_or_update_timesheet": "filename",
+    "save_or_update_timesheet_bulk": "filename",
+    "generate_invoice": "timesheet_filename",
+    "send_email_with_attachments": "xlsx_filename",
+}
+
+# Consecutive calls to these on one file are applied as a single store write.
+COALESCED = {"save_or_update_timesheet", "save_or_update_timesheet_bulk"}
+
+
+def _error_message(call: dict, error: Exception) -> ToolMessage:
+    return ToolMessage(
+        content=f"Error: {error!r}\n Please fix your mistakes.",
+        name=call["name"],
+        tool_call_id=call["id"],
+        status="error",
+    )
+
+
+def make_tool_node(tools: List):
+    """
+    Builds the graph's tool-execution node. Like the prebuilt ToolNode it
+    returns one ToolMessage per tool call of the last AI message, in call
+    order, but calls are grouped by the timesheet they target: each file's
+    calls run in order (runs of save calls as one batched write through
+    `save_timesheet_calls`), and different files are handled in parallel.
+    """
+    tools_by_name = {tool.name: tool for tool in tools}
+
+    async def invoke(call: dict, config: RunnableConfig) -> List[ToolMessage]:
+        tool = tools_by_name.get(call["name"])
+        if tool is None:
+            return [_error_message(call, ValueError(f"{call['name']} is not a valid tool, try one of {list(tools_by_name)}."))]
+        try:
+            return [await tool.ainvoke({**call, "type": "tool_call"}, config)]
+        except Exception as e:
+            return [_error_message(call, e)]
+
+    async def save_batch(filename: str, calls: List[dict], config: RunnableConfig) -> List[ToolMessage]:
+        try:
+            contents = await tool_save_timesheet_calls.ainvoke(
+                {"filename": filename, "calls": [{"name": c["name"], "args": c["args"]} for c in calls]}, config
+            )
+        except Exception as e:
+            return [_error_message(call, e) for call in calls]
+        return [
+            ToolMessage(content=content, name=call["name"], tool_call_id=call["id"])
+            for call, content in zip(calls, contents)
+        ]
+
+    async def run_file(filename: str, calls: List[dict], config: RunnableConfig) -> List[ToolMessage]:
+        messages = []
+        i = 0
+        while i < len(calls):
+            j = i
+            while j < len(calls) and calls[j]["name"] in COALESCED:
+                j += 1
+            if j - i > 1:
+                messages += await save_batch(filename, calls[i:j], config)
+                i = j
+            else:
+                messages += await invoke(calls[i], config)
+                i += 1
+        return messages
+
+    async def tools_node(state: dict, config: RunnableConfig) -> dict:
+        last = next((m for m in reversed(state["messages"]) if isinstance(m, AIMessage)), None)
+        calls = list(last.tool_calls) if last is not None else []
+
+        by_file: Dict[str, List[dict]] = {}
+        jobs = []
+        for call in calls:
+            filename = (call.get("args") or {}).get(FILE_ARGS.get(call["name"], ""))
+            if filename:
+                by_file.setdefault(filename, []).append(call)
+            else:
+                jobs.append(invoke(call, config))
+        jobs += [run_file(filename, file_calls, config) for filename, file_calls in by_file.items()]
+
+        results = [m for group in await asyncio.gather(*jobs) for m in group]
+        order = {call["id"]: i for i, call in enumerate(calls)}
+        results.sort(key=lambda m: order.get(m.tool_call_id, len(order)))
+        return {"messages": results}
+
+    return tools_node
@@ -1,28 +1,34 @@
-import pandas as pd
-from langchain.tools import Tool
 import os
-from docx import Document
-from docx.shared import Pt, Inches
-from docx.enum.table import WD_TABLE_ALIGNMENT
-from docx.enum.text import WD_ALIGN_PARAGRAPH
-from docx.oxml.ns import qn
-from docx.oxml import OxmlElement
-import os
-import base64
-from datetime import datetime
-from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import (
-    Mail, Email, To, Content, 
-    Attachment, FileContent, FileName, FileType, Disposition
-)
-from dotenv import load_dotenv
-from langchain.tools import StructuredTool
-
-load_dotenv(override=True)
+import asyncio
+import functools
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, List
+from collections import Counter
+from langchain_core.tools import StructuredTool
+from billing import compute_invoice, format_days, invoice_period
+from timesheet_store import get_store
+from llm_cache import invalidate_sheet
+from leave_ledger import get_ledger, month_of
+
+# Blocking file and network work (pandas, python-docx, SQLite, SendGrid) runs on
+# this bounded pool so async graph nodes never block the event loop.
+TOOL_WORKERS = int(os.getenv("TOOL_WORKERS", "8"))
+_tool_executor = ThreadPoolExecutor(max_workers=TOOL_WORKERS, thread_name_prefix="tool")
+
+def run_blocking(func):
+    """Wraps a blocking tool function as a coroutine that runs on the tool thread pool."""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        loop = asyncio.get_running_loop()
+        ctx = contextvars.copy_context()
+        return await loop.run_in_executor(_tool_executor, ctx.run, functools.partial(func, *args, **kwargs))
+    return wrapper
 
 def get_greeting():
     """Returns a greeting based on the time of day."""
-    hour = datetime.datetime.now().hour
+    hour = datetime.now().hour
     if hour < 12:
         return "Good Morning"
     elif hour < 17:
@@ -30,42 +36,67 @@ def get_greeting():
     else:
         return "Good Evening"
 
-def set_cell_border(cell, **kwargs):
+def _status_runs(rows) -> list:
+    """Groups consecutive calendar days with the same status into (start, end, status, days) runs."""
+    runs = []
+    for date, status, _ in rows:
+        day = datetime.strptime(date, "%Y-%m-%d").date()
+        status = status or "-"
+        if runs and runs[-1][2] == status and runs[-1][1] + timedelta(days=1) == day:
+            start, _, _, days = runs[-1]
+            runs[-1] = (start, day, status, days + 1)
+        else:
+            runs.append((day, day, status, 1))
+    return runs
+
+def read_invoice_data(
+    filename: str,
+    date: str = None,
+    start_date: str = None,
+    end_date: str = None,
+    week: str = None,
+    status: str = None,
+    summary: bool = False,
+) -> str:
     """
-    Set cell border properties.
-    Usage: set_cell_border(cell, top={"sz": 12, "val": "single", "color": "000000"})
+    Reads timesheet rows, optionally narrowed to a single `date`, a `start_date`/`end_date`
+    range, an ISO `week` ('2025-W30') and/or a comma-separated list of `status` codes.
+    With `summary` set, returns per-status counts and runs of consecutive days instead of rows.
     """
-    tc = cell._tc
-    tcPr = tc.get_or_add_tcPr()
-    tcBorders = OxmlElement('w:tcBorders')
-    for edge in ('top', 'left', 'bottom', 'right', 'insideH', 'insideV'):
-        if edge in kwargs:
-            edge_data = kwargs[edge]
-            element = OxmlElement(f'w:{edge}')
-            for key in ["sz", "val", "color", "space"]:
-                if key in edge_data:
-                    element.set(qn(f'w:{key}'), str(edge_data[key]))
-            tcBorders.append(element)
-    tcPr.append(tcBorders)
-
-def read_invoice_data(filename: str) -> str:
     try:
-        # Resolve the full path
-        filepath = os.path.join(os.getcwd(), filename)
-        
-        # Read the Excel file
-        df = pd.read_excel(filepath)
-
-        if df.empty:
+        if date:
+            start_date = end_date = date
+        if week:
+            year, week_no = week.upper().split("-W")
+            monday = datetime.fromisocalendar(int(year), int(week_no), 1).date()
+            start_date, end_date = monday.isoformat(), (monday + timedelta(days=6)).isoformat()
+
+        store = get_store()
+        rows = store.read(filename, start_date, end_date)
+
+        if status:
+            wanted = {s.strip().upper() for s in status.split(",")}
+            rows = [row for row in rows if (row[1] or "").upper() in wanted]
+
+        if not rows:
+            if not os.path.exists(store.path_for(filename)) and not store.read(filename):
+                return f"Error reading Excel timesheet: {filename} does not exist."
+            if start_date or end_date or status:
+                return "No timesheet records match the given filters."
             return "The Excel file is empty."
 
-        # Convert the DataFrame into a nicely formatted table-like string
-        lines = []
-        for _, row in df.iterrows():
-            date = row.get("Date", "")
-            status = row.get("Status", "")
-            remarks = row.get("Remarks", "")
-            lines.append(f"{date} | {status} | {remarks}")
+        if summary:
+            counts = Counter(row[1] or "-" for row in rows)
+            lines = [f"{s}: {n}" for s, n in sorted(counts.items())]
+            lines.append("Runs:")
+            lines += [
+                f"{start} to {end} | {s} ({days} days)" if days > 1 else f"{start} | {s}"
+                for start, end, s, days in _status_runs(rows)
+            ]
+            return f"Timesheet Summary ({rows[0][0]} to {rows[-1][0]}, {len(rows)} records):\n" + "\n".join(lines)
+
+        # Convert the rows into a nicely formatted table-like string
+        lines = [f"{date} | {status or ''} | {remarks or ''}" for date, status, remarks in rows]
 
         return "Timesheet Records:\n" + "\n".join(lines)
 
@@ -85,140 +116,12 @@ def create_invoice_document(filename: str, data: dict) -> str:
         # Use an absolute path or a designated output directory
         output_dir = os.path.join(os.getcwd())
         file_path = os.path.join(output_dir, filename)
-        
-        doc = Document()
-
-        # --- Set Default Font Style ---
-        style = doc.styles['Normal']
-        font = style.font
-        font.name = 'Times New Roman'
-        font.size = Pt(11)
-
-        # --- Main Table (1 column, used for layout) ---
-        table = doc.add_table(rows=1, cols=1)
-        table.autofit = False
-        table.allow_autofit = False
-        table.columns[0].width = Inches(6.5)
-
-        # --- Row 1: INVOICE Title ---
-        cell = table.cell(0, 0)
-        p = cell.paragraphs[0]
-        run = p.add_run("INVOICE")
-        run.font.name = "Arial Black"
-        run.font.size = Pt(28)
-        p.alignment = WD_ALIGN_PARAGRAPH.CENTER
-        set_cell_border(cell, bottom={"val": "nil"}, left={"sz": 6, "val": "single"}, right={"sz": 6, "val": "single"}, top={"sz": 6, "val": "single"})
-
-        # --- Row 2: Name (left) and Date (right) ---
-        row_cell = table.add_row().cells[0]
-        inner_table = row_cell.add_table(rows=1, cols=2)
-        inner_table.columns[0].width = Inches(4.0)
-        inner_table.columns[1].width = Inches(2.5)
-        
-        left_cell = inner_table.cell(0, 0)
-        left_cell.paragraphs[0].add_run(data["name"]).bold = True
-        left_cell.paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.LEFT
-
-        right_cell = inner_table.cell(0, 1)
-        right_cell.paragraphs[0].add_run(f"{data['date']}")
-        right_cell.paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.RIGHT
-        for cell in inner_table._cells:
-            set_cell_border(cell, top={"val": "nil"}, bottom={"val": "nil"}, left={"val": "nil"}, right={"val": "nil"})
-        set_cell_border(row_cell, bottom={"val": "nil"}, left={"sz": 6, "val": "single"}, right={"sz": 6, "val": "single"}, top={"val": "nil"})
-
-        # --- Row 3: Bill To Block ---
-        cell = table.add_row().cells[0]
-        p = cell.paragraphs[0]
-        p.add_run("Bill To:\n").bold = True
-        for line in data["bill_to"]:
-            p.add_run(f"    {line}\n")
-        p.alignment = WD_ALIGN_PARAGRAPH.LEFT
-        set_cell_border(cell, top={"val": "nil"}, bottom={"val": "nil"}, left={"sz": 6, "val": "single"}, right={"sz": 6, "val": "single"})
-
-        # --- Row 4: Details Table Headers ---
-        row_cell = table.add_row().cells[0]
-        header_table = row_cell.add_table(rows=1, cols=2)
-        header_table.columns[0].width = Inches(5.0)
-        header_table.columns[1].width = Inches(1.5)
-        desc_cell = header_table.cell(0, 0)
-        amt_cell = header_table.cell(0, 1)
-        header_table.alignment = WD_TABLE_ALIGNMENT.LEFT
-        header_table.autofit = False
-
-        desc_cell.text = "DESCRIPTION"
-        amt_cell.text = "AMOUNT"
-
-        for cell in [desc_cell, amt_cell]:
-            p = cell.paragraphs[0]
-            p.alignment = WD_ALIGN_PARAGRAPH.CENTER
-            p.runs[0].bold = True
-            shading_elm = OxmlElement('w:shd')
-            shading_elm.set(qn('w:fill'), "ff99cc")
-            cell._tc.get_or_add_tcPr().append(shading_elm)
-        set_cell_border(row_cell, left={"sz": 6, "val": "single"}, right={"sz": 6, "val": "single"})
-
-        # --- Row 5: Details Table Content ---
-        row_cell = table.add_row().cells[0]
-        details_table = row_cell.add_table(rows=0, cols=2)
-        details_table.columns[0].width = Inches(5.0)
-        details_table.columns[1].width = Inches(1.5)
-
-        cells = details_table.add_row().cells
-        cells[0].text = data["salary_description"]
-        cells[1].text = ""
-
-        # Add itemized details, handling both dict and string formats for robustness
-        for item in data["details"]:
-            cells = details_table.add_row().cells
-            if isinstance(item, dict):
-                # Handle the new, preferred dictionary format
-                cells[0].text = item.get("description", "")
-                cells[1].text = item.get("amount", "")
-            elif isinstance(item, str) and ':' in item:
-                # Handle the old string format for backward compatibility
-                key, value = item.split(":", 1)
-                cells[0].text = key.strip()
-                cells[1].text = value.strip()
-            else:
-                # Handle any other unexpected format
-                cells[0].text = str(item)
-                cells[1].text = ""
-            cells[1].paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.RIGHT
-        
-        set_cell_border(row_cell, top={"val": "nil"}, bottom={"sz": 6, "val": "single"}, left={"sz": 6, "val": "single"}, right={"sz": 6, "val": "single"})
-
-        # --- Row 6: TOTAL Row ---
-        row_cell = table.add_row().cells[0]
-        total_table = row_cell.add_table(rows=1, cols=2)
-        total_table.columns[0].width = Inches(5.0)
-        total_table.columns[1].width = Inches(1.5)
-        left = total_table.cell(0, 0)
-        right = total_table.cell(0, 1)
-
-        left.paragraphs[0].add_run("TOTAL").bold = True
-        left.paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.RIGHT
-        
-        right.paragraphs[0].add_run(data["total"]).bold = True
-        right.paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.RIGHT
-
-        shading_elm = OxmlElement('w:shd')
-        shading_elm.set(qn('w:fill'), "ffcc99")
-        right._tc.get_or_add_tcPr().append(shading_elm)
-        right.alignment = WD_TABLE_ALIGNMENT.LEFT
-        right.autofit = False
-
-        set_cell_border(row_cell, top={"sz": 6, "val": "single"}, bottom={"val": "nil"}, left={"sz": 6, "val": "single"}, right={"sz": 6, "val": "single"})
-        set_cell_border(right, left={"sz": 6, "val": "single"}, bottom={"sz": 6, "val": "single"})
-
-        # --- Row 7: Amount in Words ---
-        cell = table.add_row().cells[0]
-        p = cell.paragraphs[0]
-        p.add_run("Amount in Words: ").bold = True
-        p.add_run(data["total_words"])
-        p.alignment = WD_ALIGN_PARAGRAPH.LEFT
-        set_cell_border(cell, top={"val": "nil"}, bottom={"sz": 6, "val": "single"}, left={"sz": 6, "val": "single"}, right={"sz": 6, "val": "single"})
-
-        doc.save(file_path)
+
+        # python-docx/lxml are only loaded once an invoice is actually written.
+        from invoice_template import get_invoice_template
+
+        # The layout is compiled once; only the variable fields are filled in per invoice
+        get_invoice_template().render(data, file_path)
         return f"Invoice successfully written to {file_path}"
 
     except Exception as e:
@@ -232,47 +135,167 @@ def save_or_update_timesheet(filename: str, date: str, status: str, remarks: str
     The date must be in 'YYYY-MM-DD' format.
     """
     try:
-        filepath = os.path.join(os.getcwd(), filename)
-        
-        # Define the columns to ensure consistency
-        columns = ["Date", "Status", "Remarks"]
-
-        # Check if the file exists and read it; otherwise, create an empty DataFrame
-        if os.path.exists(filepath):
-            df = pd.read_excel(filepath)
-            # Ensure the Date column is treated as string to avoid formatting issues
-            df['Date'] = df['Date'].astype(str).str.split(' ').str[0]
-        else:
-            df = pd.DataFrame(columns=columns)
-
-        # Check if an entry for the given date already exists
-        if date in df['Date'].values:
-            # Update existing entry
-            idx = df.index[df['Date'] == date][0]
-            df.loc[idx, 'Status'] = status
-            df.loc[idx, 'Remarks'] = remarks
-            action = "updated"
-        else:
-            # Add new entry
-            new_entry = pd.DataFrame([{"Date": date, "Status": status, "Remarks": remarks}])
-            df = pd.concat([df, new_entry], ignore_index=True)
-            action = "added"
-            
-        # Save the updated DataFrame back to Excel
-        df.to_excel(filepath, index=False)
-        
+        action = get_store().upsert(filename, date, status, remarks)
+        invalidate_sheet(filename)
         return f"Success: The entry for {date} was {action} in {filename}."
 
     except Exception as e:
         return f"Error modifying Excel timesheet: {str(e)}"
 
+def save_or_update_timesheet_bulk(
+    filename: str,
+    entries: List[Dict[str, str]] = None,
+    start_date: str = None,
+    end_date: str = None,
+    status: str = None,
+    remarks: str = "",
+    include_weekends: bool = False,
+) -> str:
+    """
+    Saves or updates many entries in the Excel timesheet in one write.
+    Either pass `entries` as a list of {"date", "status", "remarks"} dictionaries,
+    or a `start_date`/`end_date` range (inclusive) with a default `status` and `remarks`.
+    Weekends in a range are skipped unless `include_weekends` is True.
+    Dates must be in 'YYYY-MM-DD' format.
+    """
+    try:
+        rows = _bulk_rows(entries, start_date, end_date, status, remarks, include_weekends)
+        results = get_store().upsert_many(filename, rows)
+        invalidate_sheet(filename)
+        return _bulk_message(filename, results)
+
+    except ValueError as e:
+        return f"Error: {e}"
+    except Exception as e:
+        return f"Error modifying Excel timesheet: {str(e)}"
+
+def _bulk_rows(entries=None, start_date=None, end_date=None, status=None, remarks="", include_weekends=False) -> list:
+    """Expands the bulk tool's arguments into (date, status, remarks) rows. Raises ValueError on bad input."""
+    rows = []
+    for entry in entries or []:
+        if not entry.get("date") or not entry.get("status"):
+            raise ValueError(f"Every entry needs a 'date' and a 'status' (got {entry}).")
+        rows.append((entry["date"], entry["status"], entry.get("remarks", "")))
+
+    if start_date or end_date:
+        if not (start_date and end_date and status):
+            raise ValueError("A date range needs 'start_date', 'end_date' and 'status'.")
+        day = datetime.strptime(start_date, "%Y-%m-%d").date()
+        last = datetime.strptime(end_date, "%Y-%m-%d").date()
+        while day <= last:
+            if include_weekends or day.weekday() < 5:
+                rows.append((day.isoformat(), status, remarks))
+            day += timedelta(days=1)
+
+    if not rows:
+        raise ValueError("No entries to save. Provide 'entries' or a date range.")
+    return rows
+
+def _bulk_message(filename: str, results) -> str:
+    lines = [f"{date}: {action}" for date, action in results]
+    return f"Success: {len(results)} entries saved in {filename}.\n" + "\n".join(lines)
+
+def save_timesheet_calls(filename: str, calls: List[dict]) -> List[str]:
+    """
+    Applies several save_or_update_timesheet / save_or_update_timesheet_bulk
+    calls against one file in a single store write, in call order.
+    `calls` are {"name", "args"} dictionaries; returns the result text each
+    call would have produced on its own.
+    """
+    expanded = []  # (call index, rows) for the calls that passed validation
+    results = [None] * len(calls)
+    for i, call in enumerate(calls):
+        args = {k: v for k, v in call["args"].items() if k != "filename"}
+        try:
+            if call["name"] == "save_or_update_timesheet":
+                if not args.get("date") or not args.get("status"):
+                    raise ValueError("'date' and 'status' are required.")
+                expanded.append((i, [(args["date"], args["status"], args.get("remarks", ""))]))
+            else:
+                expanded.append((i, _bulk_rows(**args)))
+        except (ValueError, TypeError) as e:
+            results[i] = f"Error: {e}"
+
+    try:
+        outcome = get_store().upsert_many(filename, [row for _, rows in expanded for row in rows])
+        invalidate_sheet(filename)
+    except Exception as e:
+        for i, _ in expanded:
+            results[i] = f"Error modifying Excel timesheet: {str(e)}"
+        return results
+
+    pos = 0
+    for i, rows in expanded:
+        done, pos = outcome[pos:pos + len(rows)], pos + len(rows)
+        if calls[i]["name"] == "save_or_update_timesheet":
+            _, action = done[0]
+            results[i] = f"Success: The entry for {calls[i]['args']['date']} was {action} in {filename}."
+        else:
+            results[i] = _bulk_message(filename, done)
+    return results
+
+def generate_invoice(
+    timesheet_filename: str,
+    invoice_filename: str = None,
+    carried_forward_leaves: float = None,
+) -> str:
+    """
+    Computes the monthly invoice from a timesheet without any model arithmetic
+    and writes it to a .docx file via `create_invoice_document`. Unless given,
+    the carried-forward leaves come from the leave ledger.
+    """
+    try:
+        rows = get_store().read(timesheet_filename)
+        if not rows:
+            return f"Error: Timesheet {timesheet_filename} has no entries."
+
+        if carried_forward_leaves is None:
+            month = month_of(rows)
+            carried_forward_leaves = get_ledger().carried_forward(month) if month else 0
+
+        data = compute_invoice(rows, carried_forward_leaves=carried_forward_leaves)
+
+        if not invoice_filename:
+            month = os.path.splitext(os.path.basename(timesheet_filename))[0].replace("timesheet_", "")
+            invoice_filename = f"invoice_{month}.docx"
+
+        result = create_invoice_document(invoice_filename, data)
+        return f"{result}\nTotal: {data['total']} ({data['total_words']})\n" + "\n".join(data["details"])
+
+    except Exception as e:
+        return f"Error generating invoice: {str(e)}"
+
+def get_leave_balance(month: str = None, year: str = None) -> str:
+    """
+    Reports leave balances from the leave ledger: one month ('YYYY-MM', defaults
+    to the current month) or, with `year`, every month of that year.
+    """
+    try:
+        ledger = get_ledger()
+        if year:
+            rows = ledger.months(str(year))
+            if not rows:
+                return f"No timesheet entries for {year}."
+        else:
+            rows = [ledger.month(month or datetime.now().strftime("%Y-%m"))]
+        lines = [
+            f"{r['month']}: carried forward {format_days(r['carried_forward'])}, accrued {format_days(r['accrued'])}, "
+            f"taken {format_days(r['taken'])}, balance {format_days(r['balance'])}"
+            for r in rows
+        ]
+        return "Leave Balance (days):\n" + "\n".join(lines)
+
+    except Exception as e:
+        return f"Error reading leave balance: {str(e)}"
+
 def send_email_with_attachments(
     xlsx_filename: str, 
     docx_filename: str, 
     to_email: str = None
 ) -> str:
     """
-    Sends an email with an XLSX and a DOCX file as attachments from the current directory.
+    Queues an email with an XLSX and a DOCX file as attachments from the current directory.
+    The email is sent in the background by the outbox; this returns as soon as the job is stored.
     
     Args:
         xlsx_filename: The filename of the .xlsx file (e.g., 'timesheet_july.xlsx').
@@ -283,6 +306,8 @@ def send_email_with_attachments(
         A string indicating success or failure.
     """
     try:
+        from outbox import get_outbox
+
         sg_api_key = os.getenv("SENDGRID_API_KEY")
         from_email_addr = os.getenv("FROM_EMAIL")
         to_email_addr = to_email or os.getenv("TO_EMAIL")
@@ -290,46 +315,45 @@ def send_email_with_attachments(
         if not all([sg_api_key, from_email_addr, to_email_addr]):
             raise ValueError("Missing required environment variables")
 
-        greeting = get_greeting()
-        message = Mail(
-            from_email=Email(from_email_addr),
-            to_emails=To(to_email_addr),
-            subject=f"Timesheet and Invoice for Approval",
-            plain_text_content=Content("text/plain", f"Hi,\n{greeting}.\n\nI've attached the timesheet and invoice for the month of July. Can review them and approve at your convenience.")
+        # The store holds the live timesheet; write the workbook out before attaching it.
+        rows = get_store().read(xlsx_filename)
+        if rows:
+            get_store().export(xlsx_filename)
+
+        # The month the invoice was computed for, or the one in the file name without entries.
+        month = invoice_period(rows) if rows else (
+            os.path.splitext(os.path.basename(xlsx_filename))[0].replace("timesheet_", "").title()
         )
-        
-        attachments = []
-        file_info = {
-            xlsx_filename: "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            docx_filename: "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-        }
-
-        for filename, mime_type in file_info.items():
-            if os.path.exists(filename):
-                with open(filename, "rb") as f:
-                    data = f.read()
-                encoded_file = base64.b64encode(data).decode()
-                
-                attached_file = Attachment(
-                    FileContent(encoded_file),
-                    FileName(filename),
-                    FileType(mime_type),
-                    Disposition("attachment")
-                )
-                attachments.append(attached_file)
+        greeting = get_greeting()
+        body = f"Hi,\n{greeting}.\n\nI've attached the timesheet and invoice for the month of {month}. Can review them and approve at your convenience."
 
+        attachments = [filename for filename in (xlsx_filename, docx_filename) if os.path.exists(filename)]
         if not attachments:
             return "Failure: No valid files found in the current directory to attach."
 
-        message.attachment = attachments
+        job_id = get_outbox().enqueue(
+            from_email_addr, to_email_addr, "Timesheet and Invoice for Approval", body, attachments
+        )
+        return (
+            f"Success: Email to {to_email_addr} with {len(attachments)} attachment(s) is queued as job #{job_id} "
+            "and will be sent in the background."
+        )
 
-        sg = SendGridAPIClient(sg_api_key)
-        response = sg.send(message)
+    except Exception as e:
+        return f"An error occurred: {e}"
 
-        if 200 <= response.status_code < 300:
-            return f"Success: Email sent to {to_email_addr} with {len(attachments)} attachment(s)."
-        else:
-            return f"Failure: SendGrid responded with status {response.status_code}."
+def check_email_status(job_id: int) -> str:
+    """Reports whether a queued email job has been sent, is still pending, or failed."""
+    try:
+        from outbox import get_outbox
+
+        job = get_outbox().status(int(job_id))
+        if job is None:
+            return f"Error: No email job #{job_id} found."
+        message = f"Email job #{job['id']} to {job['to_email']} is {job['status']} after {job['attempts']} attempt(s)."
+        if job["last_error"]:
+            message += f" Last error: {job['last_error']}"
+        return message
 
     except Exception as e:
         return f"An error occurred: {e}"
@@ -338,6 +362,7 @@ def send_email_with_attachments(
 tool_send_email = StructuredTool.from_function(
     name="send_email_with_attachments",
     func=send_email_with_attachments,
+    coroutine=run_blocking(send_email_with_attachments),
     description=(
         "Use this tool to send an email with an XLSX timesheet and a DOCX invoice attached. "
         "It requires the filename for both documents ('xlsx_filename', 'docx_filename'). "
@@ -346,31 +371,98 @@ tool_send_email = StructuredTool.from_function(
     )
 )
 
+# Not offered to the model: the tool node uses it to coalesce several save calls on one file.
+tool_save_timesheet_calls = StructuredTool.from_function(
+    name="save_timesheet_calls",
+    func=save_timesheet_calls,
+    coroutine=run_blocking(save_timesheet_calls),
+    description="Applies several timesheet save calls against one file in a single write."
+)
+
+tool_check_email_status = StructuredTool.from_function(
+    name="check_email_status",
+    func=check_email_status,
+    coroutine=run_blocking(check_email_status),
+    description=(
+        "Use this to check whether a queued email has been sent. "
+        "It needs the 'job_id' returned by send_email_with_attachments."
+    )
+)
+
 tool_create_invoice_doc = StructuredTool.from_function(
     name="create_invoice_document",
     func=create_invoice_document,
+    coroutine=run_blocking(create_invoice_document),
     description=(
         "Use this to generate and save a formatted invoice as a Word (.docx) file. "
         "Input must be a dictionary with 'filename' and 'data' keys."
     )
 )
 
-tool_read_timesheet = Tool(
+tool_save_or_update_timesheet_bulk = StructuredTool.from_function(
+    name="save_or_update_timesheet_bulk",
+    func=save_or_update_timesheet_bulk,
+    coroutine=run_blocking(save_or_update_timesheet_bulk),
+    description=(
+        "Use this to add or update several timesheet dates in one call instead of calling "
+        "save_or_update_timesheet per date. It needs the filename and either 'entries' "
+        "(a list of {'date', 'status', 'remarks'}) or 'start_date', 'end_date' and 'status' for a range. "
+        "Weekends in a range are skipped unless 'include_weekends' is true."
+    )
+)
+
+tool_generate_invoice = StructuredTool.from_function(
+    name="generate_invoice",
+    func=generate_invoice,
+    coroutine=run_blocking(generate_invoice),
+    description=(
+        "Use this to compute and save the monthly invoice for a timesheet in one step. "
+        "It counts the days, applies the leave rules, computes the total and writes the .docx file. "
+        "It needs the 'timesheet_filename' (e.g., 'timesheet_july.xlsx'); 'invoice_filename' and "
+        "'carried_forward_leaves' are optional (carried-forward leaves default to the leave ledger's balance)."
+    )
+)
+
+tool_get_leave_balance = StructuredTool.from_function(
+    name="get_leave_balance",
+    func=get_leave_balance,
+    coroutine=run_blocking(get_leave_balance),
+    description=(
+        "Use this to look up leave balances across all timesheets. "
+        "Give a 'month' ('YYYY-MM') for that month's carried-forward, accrued, taken and remaining leaves, "
+        "or a 'year' (e.g., '2025') for every month of that year."
+    )
+)
+
+tool_read_timesheet = StructuredTool.from_function(
     name="read_invoice_data",
     func=read_invoice_data,
+    coroutine=run_blocking(read_invoice_data),
     description=(
         "Use this to read invoice data from an Excel timesheet file (XLSX format). "
-        "It returns rows of date, status, and remarks. Input must be the filename (e.g., 'timesheet_july.xlsx')."
+        "It returns rows of date, status, and remarks. It needs the filename (e.g., 'timesheet_july.xlsx'). "
+        "Optionally narrow the rows with 'date', 'start_date'/'end_date', an ISO 'week' (e.g., '2025-W30') "
+        "or 'status' (comma-separated codes), or set 'summary' to get per-status counts and runs instead of rows."
     )
 )
 
 tool_save_or_update_timesheet = StructuredTool.from_function(
     name="save_or_update_timesheet",
     func=save_or_update_timesheet,
+    coroutine=run_blocking(save_or_update_timesheet),
     description=(
         "Use this to data to an Excel timesheet file (XLSX format). "
         "It needs the filename, date, status, and remarks as input. Filename usually be in the format: 'timesheet_<month>.xlsx')."
     )
 )
 
-tools = [tool_read_timesheet, tool_create_invoice_doc, tool_save_or_update_timesheet, tool_send_email]
\ No newline at end of file
+tools = [
+    tool_read_timesheet,
+    tool_create_invoice_doc,
+    tool_save_or_update_timesheet,
+    tool_send_email,
+    tool_generate_invoice,
+    tool_save_or_update_timesheet_bulk,
+    tool_check_email_status,
+    tool_get_leave_balance,
+]
\ No newline at end of file
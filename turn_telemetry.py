@@ -0,0 +1,155 @@
+import time
+import threading
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from telemetry import metrics, record_span, logger
+
+
+def _usage(response) -> tuple:
+    """(prompt tokens, completion tokens) from an LLMResult, from usage metadata or provider token usage."""
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                return usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    return usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+
+
+class TurnTelemetry(BaseCallbackHandler):
+    """
+    Callback handler for one graph turn. Every node, model call and tool call
+    becomes a span in the process-wide metrics; `summary()` describes the turn
+    (model calls, tokens, tool loop iterations, time per node).
+    """
+
+    run_inline = True
+
+    def __init__(self, thread_id: str = None, routing_mode: str = None):
+        self.thread_id = thread_id
+        self.routing_mode = routing_mode
+        self.started = time.perf_counter()
+        self.llm_calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.tool_calls = 0
+        self.tool_errors = 0
+        self.tool_iterations = 0
+        self.route = None
+        self.node_seconds = {}
+        self._open = {}  # run_id -> (kind, name, started, fields)
+        self._lock = threading.Lock()
+
+    def _start(self, run_id, kind: str, name: str, **fields) -> None:
+        with self._lock:
+            self._open[run_id] = (kind, name, time.perf_counter(), fields)
+
+    def _finish(self, run_id, **fields):
+        with self._lock:
+            opened = self._open.pop(run_id, None)
+        if opened is None:
+            return None
+        kind, name, started, start_fields = opened
+        seconds = time.perf_counter() - started
+        record_span(kind, name, seconds, thread_id=self.thread_id, **start_fields, **fields)
+        return kind, name, seconds
+
+    # Graph nodes
+    def on_chain_start(self, serialized, inputs, *, run_id, metadata=None, **kwargs):
+        node = (metadata or {}).get("langgraph_node")
+        if node and kwargs.get("name") == node:
+            self._start(run_id, "node", node)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        finished = self._finish(run_id)
+        if finished is None:
+            return
+        _, node, seconds = finished
+        with self._lock:
+            self.node_seconds[node] = self.node_seconds.get(node, 0.0) + seconds
+            if node == "tools":
+                self.tool_iterations += 1
+            # The single-call router settles the route after route_task hands over to it.
+            if node in ("route_task", "unified_worker") and isinstance(outputs, dict) and outputs.get("next"):
+                self.route = outputs["next"]
+        metrics.inc("invoice_node_runs_total", 1, "Graph node executions", node=node)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id, error=type(error).__name__)
+
+    # Model calls
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        model = (
+            (metadata or {}).get("ls_model_name")
+            or (serialized or {}).get("kwargs", {}).get("model_name")
+            or "unknown"
+        )
+        self._start(run_id, "llm", model, node=(metadata or {}).get("langgraph_node"))
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        prompt_tokens, completion_tokens = _usage(response)
+        finished = self._finish(run_id, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+        if finished is None:
+            return
+        model = finished[1]
+        with self._lock:
+            self.llm_calls += 1
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+        metrics.inc("invoice_llm_calls_total", 1, "Model calls", model=model)
+        metrics.inc("invoice_llm_tokens_total", prompt_tokens, "Model tokens", model=model, type="prompt")
+        metrics.inc("invoice_llm_tokens_total", completion_tokens, "Model tokens", model=model, type="completion")
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        finished = self._finish(run_id, error=type(error).__name__)
+        if finished:
+            metrics.inc("invoice_llm_errors_total", 1, "Failed model calls", model=finished[1])
+
+    # Tools
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        name = kwargs.get("name") or (serialized or {}).get("name") or "tool"
+        self._start(run_id, "tool", name, bytes_in=len(str(input_str).encode("utf-8")))
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        content = getattr(output, "content", output)
+        finished = self._finish(run_id, bytes_out=len(str(content).encode("utf-8")))
+        if finished:
+            with self._lock:
+                self.tool_calls += 1
+            metrics.inc("invoice_tool_calls_total", 1, "Tool executions", tool=finished[1], status="ok")
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        finished = self._finish(run_id, error=type(error).__name__)
+        if finished:
+            with self._lock:
+                self.tool_calls += 1
+                self.tool_errors += 1
+            metrics.inc("invoice_tool_calls_total", 1, "Tool executions", tool=finished[1], status="error")
+
+    def summary(self) -> dict:
+        seconds = time.perf_counter() - self.started
+        with self._lock:
+            return {
+                "thread_id": self.thread_id,
+                "route": self.route,
+                "routing_mode": self.routing_mode,
+                "seconds": round(seconds, 4),
+                "llm_calls": self.llm_calls,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "tool_calls": self.tool_calls,
+                "tool_errors": self.tool_errors,
+                "tool_iterations": self.tool_iterations,
+                "node_seconds": {k: round(v, 4) for k, v in self.node_seconds.items()},
+            }
+
+    def finish(self) -> dict:
+        """Records the turn in the metrics, logs its summary at INFO and returns it."""
+        summary = self.summary()
+        mode = summary["routing_mode"] or "none"
+        metrics.observe("invoice_turn_seconds", summary["seconds"], "Latency of whole chat turns", routing_mode=mode)
+        metrics.inc("invoice_turns_total", 1, "Chat turns", route=summary["route"] or "none", routing_mode=mode)
+        metrics.inc("invoice_tool_iterations_total", summary["tool_iterations"], "Worker/tool loop iterations")
+        logger.info("turn", extra={"fields": summary})
+        return summary
@@ -0,0 +1,130 @@
+"""
+Compiled workflow stages.
+
+When the router plans several stages for one message ("log today, generate the
+July invoice and email it"), the graph runs them back to back in one turn. The
+attendance stage needs the model to read the request; the invoice and email
+stages do not, so they are compiled into steps that call the tools directly.
+Each step declares the steps it needs and runs after them, in plan order; their
+outputs are passed on through `results` instead of through the model.
+"""
+import re
+import calendar
+import datetime
+from typing import Dict, List, Optional
+
+from tools import tool_generate_invoice, tool_send_email
+
+# Stages that run without the model, and the steps each one expands into.
+COMPILED_STAGES = {
+    "invoice": ["invoice"],
+    "email": ["recipient", "email"],
+}
+
+_MONTHS = {name.lower(): name.lower() for name in calendar.month_name[1:]}
+_MONTHS.update({name[:3]: name for name in list(_MONTHS)}, sept="september")
+
+# Full month names are taken on their own, except "may", which is also a verb.
+# "may" and the abbreviations ("mar", "jan", ...) only count next to a day or
+# a year ("may 3", "3 may", "jul 2025") or after a preposition ("for may").
+_FULL = [name.lower() for name in calendar.month_name[1:]]
+_NAMES = "|".join(name for name in _FULL if name != "may")
+_SHORT = "|".join(["sept"] + [name[:3] for name in _FULL])
+_MONTH_RES = [
+    re.compile(rf"\b({_NAMES})\b", re.IGNORECASE),
+    re.compile(rf"\b({_SHORT})\b\.?,?\s*(?:'\d{{2}}|\d{{4}}|\d{{1,2}}(?:st|nd|rd|th)?)\b", re.IGNORECASE),
+    re.compile(rf"\b\d{{1,2}}(?:st|nd|rd|th)?\s+(?:of\s+)?({_SHORT})\b", re.IGNORECASE),
+    re.compile(rf"\b(?:for|in|of|during|since|until|from)\s+({_SHORT})\b", re.IGNORECASE),
+]
+_RELATIVE_RE = re.compile(r"\b(last|previous|this|current|next)\s+month\b", re.IGNORECASE)
+_RELATIVE = {"last": -1, "previous": -1, "this": 0, "current": 0, "next": 1}
+_EMAIL_RE = re.compile(r"[\w.+-]+@[\w-]+\.[\w.]+")
+
+
+def resolve_month(text: str, today: datetime.date = None) -> str:
+    """The month named in the request ('july'), one given relative to today ('last month'), or the current month."""
+    today = today or datetime.date.today()
+    matches = [match for pattern in _MONTH_RES for match in [pattern.search(text)] if match]
+    if matches:
+        return _MONTHS[min(matches, key=lambda m: m.start()).group(1).lower()]
+    relative = _RELATIVE_RE.search(text)
+    if relative:
+        index = today.month - 1 + _RELATIVE[relative.group(1).lower()]
+        return calendar.month_name[index % 12 + 1].lower()
+    return today.strftime("%B").lower()
+
+
+def resolve_recipient(text: str) -> Optional[str]:
+    """An email address given in the request; None means the tool's default recipient."""
+    match = _EMAIL_RE.search(text)
+    return match.group(0).rstrip(".") if match else None
+
+
+# --- Steps ---
+
+def _failed(output: str) -> bool:
+    return output.startswith(("Error", "An error occurred"))
+
+
+async def _invoice(ctx: dict, results: dict, config) -> dict:
+    month = ctx["month"]
+    output = await tool_generate_invoice.ainvoke(
+        {"timesheet_filename": f"timesheet_{month}.xlsx", "invoice_filename": f"invoice_{month}.docx"}, config
+    )
+    return {"timesheet": f"timesheet_{month}.xlsx", "invoice": f"invoice_{month}.docx", "output": output}
+
+
+async def _recipient(ctx: dict, results: dict, config) -> dict:
+    return {"to_email": resolve_recipient(ctx["text"])}
+
+
+async def _email(ctx: dict, results: dict, config) -> dict:
+    month = ctx["month"]
+    invoice = results.get("invoice") or {}
+    args = {
+        "xlsx_filename": invoice.get("timesheet", f"timesheet_{month}.xlsx"),
+        "docx_filename": invoice.get("invoice", f"invoice_{month}.docx"),
+    }
+    if results["recipient"]["to_email"]:
+        args["to_email"] = results["recipient"]["to_email"]
+    return {"output": await tool_send_email.ainvoke(args, config)}
+
+
+# name -> (steps it needs if they are part of the plan, coroutine)
+STEPS = {
+    "invoice": ((), _invoice),
+    "recipient": ((), _recipient),
+    "email": (("recipient", "invoice"), _email),
+}
+
+
+async def run_stages(stages: List[str], text: str, results: Dict[str, dict] = None, config=None) -> Dict[str, dict]:
+    """
+    Runs the steps of the compiled `stages` and returns every step's result,
+    including those already in `results`. A step is skipped when a step it
+    needs failed.
+    """
+    results = dict(results or {})
+    ctx = {"text": text, "month": resolve_month(text)}
+    pending = [step for stage in stages for step in COMPILED_STAGES[stage] if step not in results]
+
+    # The steps are cheap or depend on each other (email needs the invoice), so they run one at a time.
+    while pending:
+        step = next(step for step in pending if not any(dep in pending for dep in STEPS[step][0]))
+        pending.remove(step)
+        broken = [dep for dep in STEPS[step][0] if _failed(results.get(dep, {}).get("output", ""))]
+        if broken:
+            results[step] = {"output": f"Error: Skipped because {broken[0]} failed.", "skipped": True}
+        else:
+            results[step] = await STEPS[step][1](ctx, results, config)
+    return results
+
+
+def summarize(stages: List[str], results: Dict[str, dict]) -> str:
+    """The user-facing report of the compiled stages: each step's tool output, in plan order."""
+    lines = [
+        results[step]["output"]
+        for stage in stages for step in COMPILED_STAGES[stage]
+        if "output" in results.get(step, {})
+    ]
+    return "\n\n".join(lines)